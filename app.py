@@ -1,5 +1,9 @@
-from flask import Flask, render_template, request, redirect, make_response, send_file, session, flash, url_for, jsonify, send_from_directory, abort
+from flask import Flask, Response, render_template, request, redirect, make_response, session, flash, url_for, jsonify, send_from_directory, abort, g, has_app_context
 from weasyprint import HTML
+try:
+    from weasyprint.text.fonts import FontConfiguration
+except ImportError:  # WeasyPrint < 53
+    FontConfiguration = None
 import sqlite3
 import os
 import shutil
@@ -7,20 +11,32 @@ import csv
 from io import StringIO
 from datetime import date, datetime, timedelta
 from functools import wraps
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from contextlib import closing
+from werkzeug.http import dump_options_header
 from werkzeug.security import check_password_hash
 import unicodedata
 import uuid
 import zipfile
 from zoneinfo import ZoneInfo
-from io import BytesIO
 from email.message import EmailMessage
 import smtplib
-from urllib import request as urllib_request
-from urllib.error import HTTPError, URLError
+import tempfile
+import random
+import http.client
+from urllib.parse import quote, urlsplit
 import json
 import re
+import click
 import hmac
+import hashlib
+import base64
 import logging
+import socket
+import threading
+import time
 
 
 
@@ -52,6 +68,7 @@ SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "no-reply@integrale-academy.fr")
 BREVO_API_KEY = os.getenv("BREVO_API_KEY", "").strip()
+BREVO_API_BASE_URL = os.getenv("BREVO_API_BASE_URL", "https://api.brevo.com").rstrip("/")
 BREVO_SENDER_EMAIL = os.getenv("BREVO_SENDER_EMAIL", "").strip()
 BREVO_SENDER_NAME = os.getenv("BREVO_SENDER_NAME", "").strip() or "Intégrale Academy"
 BREVO_SMS_SENDER = os.getenv("BREVO_SMS_SENDER", "").strip()
@@ -83,9 +100,40 @@ DEFAULT_FORMATION_SESSIONS = {
 }
 
 DB_NAME = "/mnt/data/cnaps.db"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SCHEMA_MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("SCHEMA_MIGRATION_LOCK_TIMEOUT_MS", "120000"))
 DEBUG_SUMMARY = os.getenv("DEBUG_SUMMARY", "0").strip() == "1"
 UPLOAD_DIR = "/mnt/data/uploads"
 MAX_DOCUMENT_SIZE_BYTES = 5 * 1024 * 1024
+REMINDER_SCHEDULER_ENABLED = os.getenv("REMINDER_SCHEDULER_ENABLED", "1").strip() == "1"
+REMINDER_SCHEDULER_LEASE_SECONDS = int(os.getenv("REMINDER_SCHEDULER_LEASE_SECONDS", "120"))
+REMINDER_SCHEDULER_RETRY_SECONDS = int(os.getenv("REMINDER_SCHEDULER_RETRY_SECONDS", "60"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "4"))
+HTTP_POOL_IDLE_SECONDS = float(os.getenv("HTTP_POOL_IDLE_SECONDS", "30"))
+SMTP_POOL_MAXSIZE = int(os.getenv("SMTP_POOL_MAXSIZE", "2"))
+SMTP_IDLE_CHECK_SECONDS = float(os.getenv("SMTP_IDLE_CHECK_SECONDS", "30"))
+BREVO_BATCH_SIZE = int(os.getenv("BREVO_BATCH_SIZE", "50"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+OUTBOX_CLAIM_TIMEOUT_SECONDS = int(os.getenv("OUTBOX_CLAIM_TIMEOUT_SECONDS", "120"))
+# Pire durée d'un envoi (connexion, envoi, une reconnexion) : le bail d'un lot en est le multiple.
+OUTBOX_SEND_TIMEOUT_SECONDS = int(os.getenv("OUTBOX_SEND_TIMEOUT_SECONDS", "30"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+PUBLIC_JSON_CACHE_TTL_SECONDS = float(os.getenv("PUBLIC_JSON_CACHE_TTL_SECONDS", "10"))
+PUBLIC_JSON_CACHE_WAIT_SECONDS = float(os.getenv("PUBLIC_JSON_CACHE_WAIT_SECONDS", "10"))
+INTEGRATION_BATCH_MAX_ITEMS = int(os.getenv("INTEGRATION_BATCH_MAX_ITEMS", "1000"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "50"))
+ATTESTATION_CACHE_DIR = os.getenv("ATTESTATION_CACHE_DIR", "/mnt/data/attestation_cache")
+ATTESTATION_CACHE_MAX_BYTES = int(os.getenv("ATTESTATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+ATTESTATION_CACHE_RESCAN_SECONDS = float(os.getenv("ATTESTATION_CACHE_RESCAN_SECONDS", "300"))
+# Nombre de rendus WeasyPrint simultanés par worker gunicorn (0 : rendu dans la requête) ;
+# c'est lui qui borne le parallélisme de l'export groupé. 1 par défaut pour tenir en mémoire.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "1"))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "30"))
+SESSION_EXPORT_BATCH_SIZE = int(os.getenv("SESSION_EXPORT_BATCH_SIZE", "50"))
 FRANCE_TZ = ZoneInfo("Europe/Paris")
 
 
@@ -183,6 +231,40 @@ def _cnaps_expiration_label(expiration_dt):
     return expiration_dt.strftime("%d/%m/%Y à %Hh%M")
 
 
+def _connect_db():
+    """Ouvre une connexion SQLite configurée pour les accès concurrents (WAL)."""
+    conn = sqlite3.connect(DB_NAME, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def get_db():
+    """Connexion unique partagée par toute la requête Flask en cours."""
+    if "db" not in g:
+        g.db = _connect_db()
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(exc=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        # La requête a écrit (et committé) : les JSON publics en cache sont périmés,
+        # dans ce processus comme dans les autres workers.
+        if conn.total_changes:
+            _publish_public_json_invalidation(conn)
+            _invalidate_public_json_cache()
+        conn.close()
+    # Messages mis en file pendant la requête : committés à ce stade, on réveille les workers.
+    if g.pop("outbox_enqueued", False):
+        _outbox_wakeup.set()
+
+
 def _load_formation_sessions(conn):
     conn.row_factory = sqlite3.Row
     rows = conn.execute(
@@ -207,8 +289,7 @@ def _load_formation_sessions(conn):
 
 
 def get_formation_sessions():
-    with sqlite3.connect(DB_NAME) as conn:
-        return _load_formation_sessions(conn)
+    return _load_formation_sessions(get_db())
 
 
 def _compute_cnaps_timing(req):
@@ -241,148 +322,492 @@ def _compute_cnaps_timing(req):
 
 
 def init_db():
-    """Crée les structures nécessaires pour historiser les statuts CNAPS."""
+    """Applique une seule fois les migrations de schéma numérotées (table schema_version)."""
     os.makedirs(os.path.dirname(DB_NAME), exist_ok=True)
     os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS statut_cnaps_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                dossier_id INTEGER NOT NULL,
-                statut_cnaps TEXT NOT NULL,
-                changed_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
-                FOREIGN KEY (dossier_id) REFERENCES dossiers(id) ON DELETE CASCADE
-            )
-        """)
-
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS public_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                dossier_id INTEGER,
-                nom TEXT NOT NULL,
-                prenom TEXT NOT NULL,
-                email TEXT NOT NULL,
-                date_naissance TEXT NOT NULL,
-                heberge INTEGER NOT NULL DEFAULT 0,
-                non_francais INTEGER NOT NULL DEFAULT 0,
-                formation TEXT,
-                session_date TEXT,
-                espace_cnaps TEXT NOT NULL DEFAULT 'A créer',
-                espace_cnaps_validation_token TEXT,
-                created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
-                updated_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
-                FOREIGN KEY (dossier_id) REFERENCES dossiers(id) ON DELETE SET NULL
+    latest_version = SCHEMA_MIGRATIONS[-1][0]
+    with closing(_connect_db()) as conn:
+        conn.isolation_level = None
+        conn.execute(f"PRAGMA busy_timeout = {SCHEMA_MIGRATION_LOCK_TIMEOUT_MS}")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
             )
-        """)
-
-        columns = {row[1] for row in conn.execute("PRAGMA table_info(public_requests)").fetchall()}
-        if "espace_cnaps" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps TEXT NOT NULL DEFAULT 'A créer'")
-        if "espace_cnaps_validation_token" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps_validation_token TEXT")
-        if "espace_cnaps_created_at" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps_created_at TEXT")
-        if "cnaps_reminder_4h_sent_at" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN cnaps_reminder_4h_sent_at TEXT")
-        if "cnaps_reminder_2h_sent_at" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN cnaps_reminder_2h_sent_at TEXT")
-        if "espace_cnaps_created_sms_sent_at" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps_created_sms_sent_at TEXT")
-        if "telephone" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN telephone TEXT")
-        if "dracar_password" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN dracar_password TEXT")
-        if "missing_doc_types" not in columns:
-            conn.execute("ALTER TABLE public_requests ADD COLUMN missing_doc_types TEXT")
+            """
+        )
+        # Chemin rapide : les workers gunicorn suivants ne font qu'une lecture.
+        _invalidate_public_json_cache()
+        if _current_schema_version(conn) >= latest_version:
+            _invalidate_schema_cache()
+            _warm_schema_cache(conn)
+            _backfill_lookup_norms_at_startup(conn)
+            _rebuild_search_index_at_startup(conn)
+            return
 
-        if _table_has_column(conn, "dossiers", "telephone"):
-            conn.execute(
-                """
-                UPDATE public_requests
-                SET telephone = (
-                    SELECT d.telephone
-                    FROM dossiers d
-                    WHERE d.id = public_requests.dossier_id
+        conn.execute("BEGIN EXCLUSIVE")
+        try:
+            # Un autre worker a pu migrer pendant l'attente du verrou.
+            current_version = _current_schema_version(conn)
+            for version, migration in SCHEMA_MIGRATIONS:
+                if version <= current_version:
+                    continue
+                migration(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                    (version, migration.__name__),
                 )
-                WHERE (telephone IS NULL OR TRIM(telephone) = '')
-                """
-            )
+                app.logger.info("Migration de schéma %s appliquée (%s)", version, migration.__name__)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            # Les migrations ont pu ajouter des colonnes en cours de route.
+            _invalidate_schema_cache()
+
+        _warm_schema_cache(conn)
+        _backfill_lookup_norms_at_startup(conn)
+        _rebuild_search_index_at_startup(conn)
+
+
+def _backfill_lookup_norms_at_startup(conn):
+    # Lignes écrites hors de l'application depuis le dernier démarrage : les recherches
+    # ne font que lire, c'est ici (ou via la commande lookup-norms) qu'elles sont normalisées.
+    # Démarrage courant : une sonde d'index par table, aucune écriture.
+    pending = False
+    for table_name, specs in LOOKUP_NORM_COLUMNS.items():
+        columns = _table_columns(conn, table_name)
+        if specs[0][1] in columns:
+            pending = pending or conn.execute(
+                f"SELECT 1 FROM {table_name} WHERE {specs[0][1]} IS NULL LIMIT 1"
+            ).fetchone() is not None
+        else:
+            pending = pending or all(source in columns for source, _, _ in specs)
+    if not pending:
+        return
 
-        missing_tokens = conn.execute(
-            "SELECT id FROM public_requests WHERE espace_cnaps_validation_token IS NULL OR espace_cnaps_validation_token = ''"
-        ).fetchall()
-        for row in missing_tokens:
+    conn.execute("BEGIN")
+    try:
+        computed = _backfill_lookup_norms(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if any(computed.values()):
+        app.logger.info("Colonnes de recherche normalisées au démarrage : %s", computed)
+
+
+def _current_schema_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def _migration_001_base_schema(conn):
+    """Tables historiques ; idempotent pour les bases créées avant schema_version."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS statut_cnaps_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dossier_id INTEGER NOT NULL,
+            statut_cnaps TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (dossier_id) REFERENCES dossiers(id) ON DELETE CASCADE
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS public_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dossier_id INTEGER,
+            nom TEXT NOT NULL,
+            prenom TEXT NOT NULL,
+            email TEXT NOT NULL,
+            date_naissance TEXT NOT NULL,
+            heberge INTEGER NOT NULL DEFAULT 0,
+            non_francais INTEGER NOT NULL DEFAULT 0,
+            formation TEXT,
+            session_date TEXT,
+            espace_cnaps TEXT NOT NULL DEFAULT 'A créer',
+            espace_cnaps_validation_token TEXT,
+            created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            updated_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (dossier_id) REFERENCES dossiers(id) ON DELETE SET NULL
+        )
+    """)
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(public_requests)").fetchall()}
+    if "espace_cnaps" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps TEXT NOT NULL DEFAULT 'A créer'")
+    if "espace_cnaps_validation_token" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps_validation_token TEXT")
+    if "espace_cnaps_created_at" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps_created_at TEXT")
+    if "cnaps_reminder_4h_sent_at" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN cnaps_reminder_4h_sent_at TEXT")
+    if "cnaps_reminder_2h_sent_at" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN cnaps_reminder_2h_sent_at TEXT")
+    if "espace_cnaps_created_sms_sent_at" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN espace_cnaps_created_sms_sent_at TEXT")
+    if "telephone" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN telephone TEXT")
+    if "dracar_password" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN dracar_password TEXT")
+    if "missing_doc_types" not in columns:
+        conn.execute("ALTER TABLE public_requests ADD COLUMN missing_doc_types TEXT")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS request_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            doc_type TEXT NOT NULL,
+            original_name TEXT NOT NULL,
+            stored_name TEXT NOT NULL,
+            storage_path TEXT NOT NULL,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            is_conforme INTEGER,
+            non_conformite_reason TEXT,
+            uploaded_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            reviewed_at TEXT,
+            FOREIGN KEY (request_id) REFERENCES public_requests(id) ON DELETE CASCADE
+        )
+    """)
+
+    if not _table_has_column(conn, "request_documents", "review_status"):
+        conn.execute("ALTER TABLE request_documents ADD COLUMN review_status TEXT NOT NULL DEFAULT 'pending'")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS request_non_conformity_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            sent_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (request_id) REFERENCES public_requests(id) ON DELETE CASCADE
+        )
+    """)
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS formation_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            formation_type TEXT NOT NULL,
+            session_label TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            UNIQUE (formation_type, session_label)
+        )
+        """
+    )
+
+
+def _migration_002_backfill_request_telephone(conn):
+    if not _table_has_column(conn, "dossiers", "telephone"):
+        return
+
+    conn.execute(
+        """
+        UPDATE public_requests
+        SET telephone = (
+            SELECT d.telephone
+            FROM dossiers d
+            WHERE d.id = public_requests.dossier_id
+        )
+        WHERE (telephone IS NULL OR TRIM(telephone) = '')
+          AND dossier_id IS NOT NULL
+        """
+    )
+
+
+def _migration_003_backfill_validation_tokens(conn):
+    # Les doublons éventuels sont aussi régénérés : le jeton est indexé en UNIQUE.
+    missing_tokens = conn.execute(
+        """
+        SELECT id FROM public_requests
+        WHERE espace_cnaps_validation_token IS NULL
+           OR espace_cnaps_validation_token = ''
+           OR id NOT IN (
+               SELECT MIN(id) FROM public_requests GROUP BY espace_cnaps_validation_token
+           )
+        """
+    ).fetchall()
+    conn.executemany(
+        "UPDATE public_requests SET espace_cnaps_validation_token = ? WHERE id = ?",
+        [(_new_validation_token(), row[0]) for row in missing_tokens],
+    )
+
+
+def _migration_004_backfill_review_status(conn):
+    conn.execute(
+        """
+        UPDATE request_documents
+        SET review_status = CASE
+            WHEN is_conforme = 1 THEN 'conforme'
+            WHEN is_conforme = 0 THEN 'non_conforme'
+            ELSE 'pending'
+        END
+        WHERE review_status IS NULL OR review_status = ''
+        """
+    )
+
+
+def _migration_005_seed_formation_sessions(conn):
+    existing_count = conn.execute("SELECT COUNT(*) FROM formation_sessions").fetchone()[0]
+    if existing_count:
+        return
+
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO formation_sessions (formation_type, session_label, position)
+        VALUES (?, ?, ?)
+        """,
+        [
+            (formation_type, label, index)
+            for formation_type, labels in DEFAULT_FORMATION_SESSIONS.items()
+            for index, label in enumerate(labels, start=1)
+        ],
+    )
+
+
+def _migration_006_secondary_indexes(conn):
+    _create_indexes(conn)
+
+
+def _migration_007_public_requests_updated_at_index(conn):
+    # Tri / filtre updated_since de /api/a-traiter.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_public_requests_updated_at "
+        "ON public_requests (updated_at)"
+    )
+
+
+def _migration_008_public_request_tombstones(conn):
+    # Demandes supprimées, exposées au flux incrémental de /api/a-traiter.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS public_request_tombstones (
+            request_id INTEGER PRIMARY KEY,
+            dossier_id INTEGER,
+            deleted_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_public_request_tombstones_deleted_at "
+        "ON public_request_tombstones (deleted_at)"
+    )
+
+
+def _migration_009_scheduler_leases(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+
+
+def _migration_010_outbox(conn):
+    # File d'envoi durable des emails / SMS (voir _enqueue_email / _enqueue_sms).
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            subject TEXT,
+            body TEXT NOT NULL,
+            request_id INTEGER,
+            kind TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            last_error TEXT,
+            created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            sent_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt "
+        "ON outbox (status, next_attempt_at)"
+    )
+
+
+def _migration_011_outbox_provider_message_id(conn):
+    # Identifiant renvoyé par Brevo pour chaque destinataire d'un envoi groupé.
+    if not _table_has_column(conn, "outbox", "provider_message_id"):
+        conn.execute("ALTER TABLE outbox ADD COLUMN provider_message_id TEXT")
+
+
+def _migration_012_dashboard_counters(conn):
+    # Compteurs de /data.json et /summary.json, tenus à jour par triggers.
+    counter_columns = ",\n            ".join(
+        f"{name} INTEGER NOT NULL DEFAULT 0" for name in DASHBOARD_COUNTERS
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS dashboard_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            {counter_columns},
+            rebuilt_at TEXT
+        )
+        """
+    )
+    # Sans la table historique dossiers, les endpoints recalculent à chaque appel.
+    if _table_columns(conn, "dossiers"):
+        _rebuild_dashboard_counters(conn)
+
+
+def _migration_013_cnaps_enum_codes(conn):
+    # Codes canoniques (a_creer / cree / valide, accepte / instruction…) en colonnes
+    # générées : SQLite les recalcule à chaque écriture et l'index créé ici couvre
+    # les lignes existantes.
+    if not _table_has_column(conn, "public_requests", "espace_cnaps_code"):
+        conn.execute(
+            "ALTER TABLE public_requests ADD COLUMN espace_cnaps_code TEXT "
+            f"GENERATED ALWAYS AS ({_espace_cnaps_code_expr(frozenset(), alias=None)}) VIRTUAL"
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_public_requests_espace_cnaps_code "
+        "ON public_requests (espace_cnaps_code)"
+    )
+    # La table dossiers est historique : sans elle, les requêtes calculent le code à la volée.
+    if _table_has_column(conn, "dossiers", "statut_cnaps"):
+        if not _table_has_column(conn, "dossiers", "statut_cnaps_code"):
             conn.execute(
-                "UPDATE public_requests SET espace_cnaps_validation_token = ? WHERE id = ?",
-                (str(uuid.uuid4()), row[0]),
+                "ALTER TABLE dossiers ADD COLUMN statut_cnaps_code TEXT "
+                f"GENERATED ALWAYS AS ({_statut_cnaps_code_expr(frozenset({'statut_cnaps'}), alias=None)}) VIRTUAL"
             )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_dossiers_statut_cnaps_code "
+            "ON dossiers (statut_cnaps_code)"
+        )
+    _invalidate_schema_cache()
+    # Les triggers des compteurs lisent désormais les colonnes de codes.
+    if _table_columns(conn, "dossiers"):
+        _rebuild_dashboard_counters(conn)
 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS request_documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                request_id INTEGER NOT NULL,
-                doc_type TEXT NOT NULL,
-                original_name TEXT NOT NULL,
-                stored_name TEXT NOT NULL,
-                storage_path TEXT NOT NULL,
-                is_active INTEGER NOT NULL DEFAULT 1,
-                is_conforme INTEGER,
-                non_conformite_reason TEXT,
-                uploaded_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
-                reviewed_at TEXT,
-                FOREIGN KEY (request_id) REFERENCES public_requests(id) ON DELETE CASCADE
-            )
-        """)
 
-        if not _table_has_column(conn, "request_documents", "review_status"):
-            conn.execute("ALTER TABLE request_documents ADD COLUMN review_status TEXT NOT NULL DEFAULT 'pending'")
+def _migration_014_lookup_norms(conn):
+    # Noms / prénoms / emails normalisés pour les recherches par identité.
+    for table_name in LOOKUP_NORM_COLUMNS:
+        _install_lookup_norms(conn, table_name)
+
 
+def _migration_015_search_index(conn):
+    # Index plein texte de /search.json et du filtre q de /api/a-traiter.
+    _create_search_index(conn)
+    _rebuild_search_index(conn)
+
+
+def _migration_016_dossiers_listing_indexes(conn):
+    # Tri paginé de la liste des dossiers (/) : un index par expression de tri, suivi de
+    # l'id pour le curseur, plus sa version partielle limitée au filtre par défaut pour
+    # ne pas parcourir les dossiers archivés ; (statut_cnaps, id) sert le filtre exact.
+    d_columns = _table_columns(conn, "dossiers")
+    if "statut_cnaps" not in d_columns:
+        return
+    for column in DOSSIERS_SORT_COLUMNS:
+        if column not in d_columns:
+            continue
+        key_sql = "id" if column == "id" else f"COALESCE({column}, ''), id"
+        if column != "id":
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_dossiers_sort_{column} ON dossiers ({key_sql})")
         conn.execute(
-            """
-            UPDATE request_documents
-            SET review_status = CASE
-                WHEN review_status IS NOT NULL AND review_status != '' THEN review_status
-                WHEN is_conforme = 1 THEN 'conforme'
-                WHEN is_conforme = 0 THEN 'non_conforme'
-                ELSE 'pending'
-            END
-            """
+            f"CREATE INDEX IF NOT EXISTS idx_dossiers_active_sort_{column} ON dossiers ({key_sql}) "
+            f"WHERE {_dossiers_active_sql('statut_cnaps')}"
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_dossiers_statut_cnaps_id "
+        "ON dossiers (statut_cnaps, id)"
+    )
+
+
+def _migration_017_public_json_cache_generation(conn):
+    # Génération partagée du cache des JSON publics : chaque écriture la fait avancer,
+    # chaque worker gunicorn la relit avant de servir une réponse en cache.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS public_json_cache_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0
         )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO public_json_cache_state (id, generation) VALUES (1, 0)")
 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS request_non_conformity_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                request_id INTEGER NOT NULL,
-                sent_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
-                FOREIGN KEY (request_id) REFERENCES public_requests(id) ON DELETE CASCADE
-            )
-        """)
 
+def _migration_018_baseline_cnaps_predicates(conn):
+    # Les compteurs publics gardent leurs prédicats d'origine (statut_cnaps = 'INSTRUCTION',
+    # espace_cnaps normalisé = 'a creer') : triggers réinstallés. Le filtre des
+    # notifications est indexé sur son expression exacte.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_public_requests_espace_cnaps_notification "
+        f"ON public_requests ({_espace_cnaps_notification_expr(alias=None)})"
+    )
+    if _table_columns(conn, "dossiers"):
+        _rebuild_dashboard_counters(conn)
+
+
+def _create_indexes(conn):
+    """Index secondaires des jointures et filtres du tableau de bord /a-traiter."""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_request_documents_request_active "
+        "ON request_documents (request_id, is_active)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_request_documents_active_conforme "
+        "ON request_documents (is_active, is_conforme, request_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_request_non_conformity_notifications_request "
+        "ON request_non_conformity_notifications (request_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_public_requests_dossier_id "
+        "ON public_requests (dossier_id)"
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_public_requests_validation_token "
+        "ON public_requests (espace_cnaps_validation_token)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_statut_cnaps_history_dossier "
+        "ON statut_cnaps_history (dossier_id, statut_cnaps, changed_at)"
+    )
+    # La table dossiers est historique et n'est pas créée par init_db().
+    if _table_has_column(conn, "dossiers", "statut_cnaps"):
         conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS formation_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                formation_type TEXT NOT NULL,
-                session_label TEXT NOT NULL,
-                position INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
-                UNIQUE (formation_type, session_label)
-            )
-            """
+            "CREATE INDEX IF NOT EXISTS idx_dossiers_statut_cnaps "
+            "ON dossiers (statut_cnaps)"
         )
 
-        existing_count = conn.execute("SELECT COUNT(*) FROM formation_sessions").fetchone()[0]
-        if existing_count == 0:
-            for formation_type, labels in DEFAULT_FORMATION_SESSIONS.items():
-                for index, label in enumerate(labels, start=1):
-                    conn.execute(
-                        """
-                        INSERT OR IGNORE INTO formation_sessions (formation_type, session_label, position)
-                        VALUES (?, ?, ?)
-                        """,
-                        (formation_type, label, index),
-                    )
+
+SCHEMA_MIGRATIONS = (
+    (1, _migration_001_base_schema),
+    (2, _migration_002_backfill_request_telephone),
+    (3, _migration_003_backfill_validation_tokens),
+    (4, _migration_004_backfill_review_status),
+    (5, _migration_005_seed_formation_sessions),
+    (6, _migration_006_secondary_indexes),
+    (7, _migration_007_public_requests_updated_at_index),
+    (8, _migration_008_public_request_tombstones),
+    (9, _migration_009_scheduler_leases),
+    (10, _migration_010_outbox),
+    (11, _migration_011_outbox_provider_message_id),
+    (12, _migration_012_dashboard_counters),
+    (13, _migration_013_cnaps_enum_codes),
+    (14, _migration_014_lookup_norms),
+    (15, _migration_015_search_index),
+    (16, _migration_016_dossiers_listing_indexes),
+    (17, _migration_017_public_json_cache_generation),
+    (18, _migration_018_baseline_cnaps_predicates),
+)
 
 
 def _record_statut_cnaps_history(conn, dossier_id, nouveau_statut):
@@ -399,6 +824,14 @@ def _record_statut_cnaps_history(conn, dossier_id, nouveau_statut):
     )
 
 
+def _touch_requests_for_dossier(conn, dossier_id):
+    """Fait avancer updated_at des demandes liées à un dossier modifié (flux /api/a-traiter)."""
+    conn.execute(
+        "UPDATE public_requests SET updated_at = datetime('now','localtime') WHERE dossier_id = ?",
+        (dossier_id,),
+    )
+
+
 def _get_statuts_dates(conn, dossier_id):
     """Retourne pour un dossier la dernière date connue pour chaque statut CNAPS."""
     rows = conn.execute(
@@ -414,22 +847,65 @@ def _get_statuts_dates(conn, dossier_id):
     return {row["statut_cnaps"]: row["changed_at"] for row in rows}
 
 
+# Cache par processus des colonnes de tables et des fragments SQL qui en dépendent,
+# indexé par chemin de base. Rempli après les migrations, vidé par init_db().
+_SCHEMA_COLUMNS_CACHE = {}
+_SQL_FRAGMENTS_CACHE = {}
+SCHEMA_CACHED_TABLES = ("public_requests", "dossiers", "request_documents")
+
+
+def _invalidate_schema_cache():
+    _SCHEMA_COLUMNS_CACHE.clear()
+    _SQL_FRAGMENTS_CACHE.clear()
+
+
+def _warm_schema_cache(conn):
+    for table_name in SCHEMA_CACHED_TABLES:
+        _table_columns(conn, table_name)
+
+
+def _table_columns(conn, table_name: str):
+    key = (DB_NAME, table_name)
+    columns = _SCHEMA_COLUMNS_CACHE.get(key)
+    if columns is None:
+        # table_xinfo : table_info masque les colonnes générées (espace_cnaps_code…).
+        columns = frozenset(row[1] for row in conn.execute(f"PRAGMA table_xinfo({table_name})"))
+        # Une table absente (dossiers pas encore créée) est relue au prochain appel.
+        if columns:
+            _SCHEMA_COLUMNS_CACHE[key] = columns
+    return columns
+
+
 def _table_has_column(conn, table_name, column_name):
-    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})").fetchall()}
-    return column_name in columns
+    return column_name in _table_columns(conn, table_name)
+
+
+def _cached_sql_fragment(conn, name, table_names, build):
+    """Construit une seule fois un fragment SQL dépendant des colonnes de `table_names`."""
+    key = (DB_NAME, name)
+    fragment = _SQL_FRAGMENTS_CACHE.get(key)
+    if fragment is None:
+        columns_by_table = {table_name: _table_columns(conn, table_name) for table_name in table_names}
+        fragment = build(columns_by_table)
+        if all(columns_by_table.values()):
+            _SQL_FRAGMENTS_CACHE[key] = fragment
+    return fragment
 
 
 def _request_phone_select_expr(conn):
-    has_public_request_phone = _table_has_column(conn, "public_requests", "telephone")
-    has_dossier_phone = _table_has_column(conn, "dossiers", "telephone")
+    def build(columns_by_table):
+        has_public_request_phone = "telephone" in columns_by_table["public_requests"]
+        has_dossier_phone = "telephone" in columns_by_table["dossiers"]
 
-    if has_public_request_phone and has_dossier_phone:
-        return "COALESCE(NULLIF(pr.telephone, ''), NULLIF(d.telephone, ''))"
-    if has_public_request_phone:
-        return "NULLIF(pr.telephone, '')"
-    if has_dossier_phone:
-        return "NULLIF(d.telephone, '')"
-    return "NULL"
+        if has_public_request_phone and has_dossier_phone:
+            return "COALESCE(NULLIF(pr.telephone, ''), NULLIF(d.telephone, ''))"
+        if has_public_request_phone:
+            return "NULLIF(pr.telephone, '')"
+        if has_dossier_phone:
+            return "NULLIF(d.telephone, '')"
+        return "NULL"
+
+    return _cached_sql_fragment(conn, "request_phone", ("public_requests", "dossiers"), build)
 
 
 
@@ -482,12 +958,279 @@ def _to_json_safe(value):
 def _filter_api_a_traiter_row(row):
     return {field: row.get(field) for field in API_A_TRAITER_ALLOWED_FIELDS if field in row}
 
-def _load_a_traiter_dataset(conn):
-    """Source de vérité partagée avec /a-traiter."""
+
+API_A_TRAITER_MAX_LIMIT = 500
+
+
+def _encode_keyset_cursor(sort, row):
+    raw = json.dumps([sort, row[sort], row["id"]], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_keyset_cursor(sort, cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("cursor invalide")
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise ValueError("cursor invalide pour ce tri")
+    return sort_value, row_id
+
+
+def _parse_api_a_traiter_args(args):
+    """Lit pagination, tri et filtres de /api/a-traiter ; lève ValueError si invalide."""
+    sort = (args.get("sort") or "id").strip()
+    if sort not in A_TRAITER_SORT_COLUMNS:
+        raise ValueError(f"sort doit valoir {', '.join(A_TRAITER_SORT_COLUMNS)}")
+
+    order = (args.get("order") or "desc").strip().lower()
+    if order not in {"asc", "desc"}:
+        raise ValueError("order doit valoir asc ou desc")
+
+    limit = None
+    if args.get("limit"):
+        try:
+            limit = int(args["limit"])
+        except ValueError:
+            raise ValueError("limit doit être un entier")
+        if not 1 <= limit <= API_A_TRAITER_MAX_LIMIT:
+            raise ValueError(f"limit doit être compris entre 1 et {API_A_TRAITER_MAX_LIMIT}")
+
+    cursor = None
+    if args.get("cursor"):
+        cursor = _decode_keyset_cursor(sort, args["cursor"].strip())
+
+    filters = {}
+    for field in ("espace_cnaps", "statut_cnaps", "formation", "session_date"):
+        values = [value.strip() for value in args.getlist(field) if value.strip()]
+        if values:
+            filters[field] = values
+
+    if args.get("has_pending_docs"):
+        filters["has_pending_docs"] = _coerce_bool(args["has_pending_docs"])
+
+    view = (args.get("view") or "").strip()
+    if view:
+        if view not in A_TRAITER_VIEWS:
+            raise ValueError(f"view doit valoir {', '.join(A_TRAITER_VIEWS)}")
+        filters["view"] = view
+
+    if args.get("q"):
+        match = _search_match_expression(args["q"])
+        if match:
+            filters["q"] = match
+
+    for field in ("updated_since", "since"):
+        if args.get(field):
+            parsed = _parse_db_datetime(args[field])
+            if parsed is None:
+                raise ValueError(f"{field} doit être une date ISO 8601")
+            filters["updated_since"] = max(filters.get("updated_since", ""), _to_db_datetime(parsed))
+
+    since = filters["updated_since"] if args.get("since") else None
+
+    return {
+        "filters": filters,
+        "sort": sort,
+        "descending": order == "desc",
+        "cursor": cursor,
+        "limit": limit,
+        "since": since,
+    }
+
+
+def _load_a_traiter_tombstones(conn, since):
+    rows = conn.execute(
+        """
+        SELECT request_id, dossier_id, deleted_at
+        FROM public_request_tombstones
+        WHERE deleted_at >= ?
+        ORDER BY deleted_at ASC, request_id ASC
+        """,
+        (since,),
+    ).fetchall()
+    return [
+        {"id": row["request_id"], "dossier_id": row["dossier_id"], "deleted_at": row["deleted_at"]}
+        for row in rows
+    ]
+
+
+def _api_a_traiter_etag(payload):
+    """Empreinte des données renvoyées, hors compte à rebours et horodatage de la réponse."""
+    stable = dict(payload)
+    stable.pop("watermark", None)
+    stable["requests"] = [
+        {field: value for field, value in row.items() if field != "cnaps_remaining"}
+        for row in payload["requests"]
+    ]
+    encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+A_TRAITER_SORT_COLUMNS = {
+    "id": "pr.id",
+    "created_at": "pr.created_at",
+    "updated_at": "pr.updated_at",
+}
+
+# Onglets du récapitulatif de /a-traiter, filtrés côté serveur (paramètre view).
+A_TRAITER_VIEWS = ("nouveau", "demande", "compte", "compte-en-attente-validation", "instruction")
+
+
+def _a_traiter_view_predicates(conn):
+    """Conditions SQL (alias pr / d) des onglets, mêmes règles que les badges de la page."""
+    def build(columns_by_table):
+        pr_columns = columns_by_table["public_requests"]
+        d_columns = columns_by_table["dossiers"]
+        espace_code = _espace_cnaps_code_expr(pr_columns)
+        statut = _sql_stripped("d.statut_cnaps") if "statut_cnaps" in d_columns else "''"
+        active_docs = "SELECT 1 FROM request_documents rd WHERE rd.request_id = pr.id AND rd.is_active = 1"
+        doc_types = ", ".join(f"'{doc_type}'" for doc_type in DOC_LABELS)
+        # missing_docs_pending de _load_a_traiter_dataset : pièces réclamées et notification envoyée.
+        missing_doc_types = (
+            "CASE WHEN json_valid(pr.missing_doc_types) THEN "
+            "CASE WHEN json_type(pr.missing_doc_types) = 'array' THEN pr.missing_doc_types END END"
+        )
+        missing_docs_pending = (
+            f"(EXISTS (SELECT 1 FROM json_each({missing_doc_types}) WHERE value IN ({doc_types}))"
+            " AND EXISTS (SELECT 1 FROM request_non_conformity_notifications n WHERE n.request_id = pr.id))"
+        )
+        return {
+            "nouveau": "NOT (COALESCE(pr.formation, '') <> '' AND COALESCE(pr.session_date, '') <> '')",
+            "demande": (
+                f"({espace_code} = 'valide' AND {statut} IN ('', '--')"
+                f" AND EXISTS ({active_docs})"
+                f" AND NOT EXISTS ({active_docs} AND rd.is_conforme IS NOT 1)"
+                f" AND NOT {missing_docs_pending})"
+            ),
+            "compte": f"{espace_code} = 'a_creer'",
+            "compte-en-attente-validation": f"{espace_code} = 'cree'",
+            "instruction": f"{_statut_cnaps_code_expr(d_columns)} = 'instruction'",
+        }
+
+    return _cached_sql_fragment(conn, "a_traiter_views", ("public_requests", "dossiers"), build)
+
+
+def _load_a_traiter_counts(conn):
+    """Badges du récapitulatif de /a-traiter, calculés en SQL sur toutes les demandes."""
+    views = _a_traiter_view_predicates(conn)
+    row = conn.execute(
+        f"""
+        SELECT {", ".join(f"COALESCE(SUM({predicate}), 0)" for predicate in views.values())}
+        FROM public_requests pr
+        LEFT JOIN dossiers d ON d.id = pr.dossier_id
+        """
+    ).fetchone()
+    counts = dict(zip(views, row))
+    documents, non_conformes = conn.execute(
+        """
+        SELECT
+            COALESCE(SUM(rd.is_conforme IS NULL), 0),
+            COALESCE(SUM(rd.review_status = 'notified_expected'), 0)
+        FROM request_documents rd
+        JOIN public_requests pr ON pr.id = rd.request_id
+        WHERE rd.is_active = 1
+        """
+    ).fetchone()
+    counts["documents"] = documents
+    counts["non-conformes"] = non_conformes
+    return counts
+
+
+def _a_traiter_filter_clauses(conn, filters):
+    """Traduit les filtres de /api/a-traiter en conditions SQL paramétrées."""
+    clauses = []
+    params = []
+    filters = filters or {}
+
+    if filters.get("view"):
+        clauses.append(_a_traiter_view_predicates(conn)[filters["view"]])
+
+    for field, column in (
+        ("espace_cnaps", "pr.espace_cnaps"),
+        ("statut_cnaps", "d.statut_cnaps"),
+        ("formation", "pr.formation"),
+        ("session_date", "pr.session_date"),
+    ):
+        values = filters.get(field)
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+
+    has_pending_docs = filters.get("has_pending_docs")
+    if has_pending_docs is not None:
+        clauses.append(
+            ("" if has_pending_docs else "NOT ")
+            + "EXISTS (SELECT 1 FROM request_documents rd"
+            " WHERE rd.request_id = pr.id AND rd.is_active = 1 AND rd.is_conforme IS NULL)"
+        )
+
+    if filters.get("q"):
+        # Expression MATCH déjà normalisée par _search_match_expression.
+        clauses.append(
+            "pr.id IN (SELECT rowid / 2 FROM search_index WHERE search_index MATCH ? AND rowid % 2 = 0)"
+        )
+        params.append(filters["q"])
+
+    if filters.get("updated_since"):
+        clauses.append("pr.updated_at >= ?")
+        params.append(filters["updated_since"])
+
+    return clauses, params
+
+
+def _count_a_traiter_dataset(conn, filters=None):
+    clauses, params = _a_traiter_filter_clauses(conn, filters)
+    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return conn.execute(
+        f"""
+        SELECT COUNT(*)
+        FROM public_requests pr
+        LEFT JOIN dossiers d ON d.id = pr.dossier_id
+        {where_sql}
+        """,
+        params,
+    ).fetchone()[0]
+
+
+def _load_a_traiter_dataset(conn, filters=None, sort="id", descending=True, cursor=None, limit=None):
+    """Source de vérité partagée avec /a-traiter.
+
+    `cursor` est un couple (valeur de tri, pr.id) : seules les lignes situées après
+    ce couple dans l'ordre demandé sont renvoyées (pagination par clé).
+    """
     conn.row_factory = sqlite3.Row
     telephone_expr = _request_phone_select_expr(conn)
+    sort_column = A_TRAITER_SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+
+    clauses, params = _a_traiter_filter_clauses(conn, filters)
+    if cursor is not None:
+        comparator = "<" if descending else ">"
+        if sort == "id":
+            clauses.append(f"pr.id {comparator} ?")
+            params.append(cursor[1])
+        else:
+            clauses.append(f"({sort_column}, pr.id) {comparator} (?, ?)")
+            params.extend(cursor)
+    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(limit)
+
+    order_sql = f"{sort_column} {direction}, pr.id {direction}" if sort != "id" else f"pr.id {direction}"
     rows = conn.execute(
         f"""
+        WITH page AS (
+            SELECT pr.id
+            FROM public_requests pr
+            LEFT JOIN dossiers d ON d.id = pr.dossier_id
+            {where_sql}
+            ORDER BY {order_sql}
+            {limit_sql}
+        )
         SELECT
             pr.*,
             d.statut_cnaps,
@@ -498,8 +1241,13 @@ def _load_a_traiter_dataset(conn):
             COALESCE(doc_stats.non_conformes, 0) AS non_conformes,
             COALESCE(doc_stats.en_attente, 0) AS en_attente,
             COALESCE(doc_stats.notified_expected, 0) AS notified_expected,
-            COALESCE(notification_stats.notification_count, 0) AS notification_count
-        FROM public_requests pr
+            (
+                SELECT COUNT(*)
+                FROM request_non_conformity_notifications n
+                WHERE n.request_id = pr.id
+            ) AS notification_count
+        FROM page
+        JOIN public_requests pr ON pr.id = page.id
         LEFT JOIN dossiers d ON d.id = pr.dossier_id
         LEFT JOIN (
             SELECT
@@ -511,15 +1259,12 @@ def _load_a_traiter_dataset(conn):
                 SUM(CASE WHEN review_status = 'notified_expected' THEN 1 ELSE 0 END) AS notified_expected
             FROM request_documents
             WHERE is_active = 1
+              AND request_id IN (SELECT id FROM page)
             GROUP BY request_id
         ) doc_stats ON doc_stats.request_id = pr.id
-        LEFT JOIN (
-            SELECT request_id, COUNT(*) AS notification_count
-            FROM request_non_conformity_notifications
-            GROUP BY request_id
-        ) notification_stats ON notification_stats.request_id = pr.id
-        ORDER BY pr.id DESC
-        """
+        ORDER BY {order_sql}
+        """,
+        params,
     ).fetchall()
 
     dataset = []
@@ -571,8 +1316,6 @@ def _new_validation_token():
     return str(uuid.uuid4())
 
 
-init_db()
-
 def login_required(view):
     @wraps(view)
     def wrapped(*args, **kwargs):
@@ -592,65 +1335,181 @@ def make_session_persistent():
 
 
 def get_stagiaire_by_id(id):
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    stagiaire = conn.execute("SELECT * FROM dossiers WHERE id = ?", (id,)).fetchone()
-    conn.close()
-    return stagiaire
+    return get_db().execute("SELECT * FROM dossiers WHERE id = ?", (id,)).fetchone()
+
+# --- Liste des dossiers (/) ---
+# Pagination par curseur (keyset) sur une expression de tri indexée puis l'id ; les
+# valeurs NULL sont triées comme des chaînes vides pour que le curseur reste comparable.
+DOSSIERS_PAGE_SIZE = 100
+DOSSIERS_SORT_COLUMNS = {
+    "id": "d.id",
+    "nom": "COALESCE(d.nom, '')",
+    "prenom": "COALESCE(d.prenom, '')",
+    "formation": "COALESCE(d.formation, '')",
+    "session": "COALESCE(d.session, '')",
+    "statut_cnaps": "COALESCE(d.statut_cnaps, '')",
+}
+# Statuts masqués par le filtre par défaut "SansAcceptes".
+DOSSIERS_HIDDEN_STATUTS = ("ACCEPTÉ", "REFUSÉ")
 
-@app.route("/")
-@login_required
-def index():
-    # 👉 Filtre sélectionné par l’utilisateur (ou filtre par défaut)
-    filtre_cnaps = request.args.get('filtre_cnaps', 'SansAcceptes')
-
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
-        # Liste des statuts disponibles
-        cur_statuts = conn.execute("SELECT DISTINCT statut_cnaps FROM dossiers")
-        statuts_disponibles = sorted([row['statut_cnaps'] for row in cur_statuts if row['statut_cnaps']])
-
-        # 👉 Logique du filtre
-        if filtre_cnaps == 'SansAcceptes':
-            # ⛔️ On masque ACCEPTÉ et REFUSÉ
-            cur = conn.execute("""
-                SELECT * FROM dossiers
-                WHERE statut_cnaps NOT IN ('ACCEPTÉ', 'REFUSÉ')
-                ORDER BY id DESC
-            """)
-        elif filtre_cnaps != 'Tous':
-            # Filtre précis choisi par l'utilisateur
-            cur = conn.execute("""
-                SELECT * FROM dossiers
-                WHERE statut_cnaps = ?
-                ORDER BY id DESC
-            """, (filtre_cnaps,))
+
+def _dossiers_active_sql(column: str) -> str:
+    # Littéraux et non paramètres : SQLite n'utilise un index partiel que si la requête
+    # reprend sa clause WHERE à l'identique.
+    literals = ", ".join("'" + statut.replace("'", "''") + "'" for statut in DOSSIERS_HIDDEN_STATUTS)
+    return f"{column} NOT IN ({literals})"
+
+
+def _parse_index_args(args):
+    """Lit filtre, recherche, tri et curseur de la liste des dossiers ; lève ValueError si invalide."""
+    sort = (args.get("sort") or "id").strip()
+    if sort not in DOSSIERS_SORT_COLUMNS:
+        raise ValueError(f"sort doit valoir {', '.join(DOSSIERS_SORT_COLUMNS)}")
+
+    # Plus récents d'abord par défaut ; ordre alphabétique pour les autres colonnes.
+    order = (args.get("order") or ("desc" if sort == "id" else "asc")).strip().lower()
+    if order not in {"asc", "desc"}:
+        raise ValueError("order doit valoir asc ou desc")
+
+    cursor = None
+    if args.get("cursor"):
+        cursor = _decode_keyset_cursor(sort, args["cursor"].strip())
+
+    return {
+        "filtre_cnaps": args.get("filtre_cnaps") or "SansAcceptes",
+        "q": (args.get("q") or "").strip(),
+        "sort": sort,
+        "order": order,
+        "cursor": cursor,
+    }
+
+
+def _dossiers_filter_clauses(filtre_cnaps, match=None):
+    clauses, params = [], []
+    if filtre_cnaps == "SansAcceptes":
+        # Comme avant : NOT IN écarte aussi les dossiers sans statut CNAPS.
+        clauses.append(_dossiers_active_sql("d.statut_cnaps"))
+    elif filtre_cnaps != "Tous":
+        clauses.append("d.statut_cnaps = ?")
+        params.append(filtre_cnaps)
+    if match:
+        clauses.append(
+            "d.id IN (SELECT rowid / 2 FROM search_index WHERE search_index MATCH ? AND rowid % 2 = 1)"
+        )
+        params.append(match)
+    return clauses, params
+
+
+def _load_dossiers_page(conn, filtre_cnaps, match=None, sort="id", descending=True, cursor=None, limit=None):
+    """Lignes de dossiers (SELECT * puis sort_key) d'une page, dans l'ordre demandé."""
+    sort_sql = DOSSIERS_SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+
+    clauses, params = _dossiers_filter_clauses(filtre_cnaps, match)
+    if cursor is not None:
+        comparator = "<" if descending else ">"
+        if sort == "id":
+            clauses.append(f"d.id {comparator} ?")
+            params.append(cursor[1])
+        else:
+            clauses.append(f"({sort_sql}, d.id) {comparator} (?, ?)")
+            params.extend(cursor)
+    where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(limit)
+
+    order_sql = f"{sort_sql} {direction}, d.id {direction}" if sort != "id" else f"d.id {direction}"
+    return conn.execute(
+        f"""
+        SELECT d.*, {sort_sql} AS sort_key
+        FROM dossiers d
+        {where_sql}
+        ORDER BY {order_sql}
+        {limit_sql}
+        """,
+        params,
+    ).fetchall()
+
+
+def _load_dossiers_statut_counts(conn) -> dict:
+    """Nombre de dossiers par statut CNAPS, en une requête groupée (index idx_dossiers_statut_cnaps)."""
+    cur = conn.execute("SELECT statut_cnaps, COUNT(*) FROM dossiers GROUP BY statut_cnaps")
+    return {statut: count for statut, count in cur.fetchall()}
+
+
+def _dossiers_filter_total(statut_counts, filtre_cnaps) -> int:
+    if filtre_cnaps == "Tous":
+        return sum(statut_counts.values())
+    if filtre_cnaps == "SansAcceptes":
+        return sum(
+            count for statut, count in statut_counts.items()
+            if statut is not None and statut not in DOSSIERS_HIDDEN_STATUTS
+        )
+    return statut_counts.get(filtre_cnaps, 0)
+
+
+@app.route("/")
+@login_required
+def index():
+    try:
+        listing = _parse_index_args(request.args)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    filtre_cnaps = listing["filtre_cnaps"]
+    match = _search_match_expression(listing["q"]) if listing["q"] else None
+
+    with get_db() as conn:
+        # Comptes par statut : alimentent aussi la liste déroulante des statuts.
+        statut_counts = _load_dossiers_statut_counts(conn)
+        statuts_disponibles = sorted(statut for statut in statut_counts if statut)
+
+        if match:
+            clauses, params = _dossiers_filter_clauses(filtre_cnaps, match)
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM dossiers d WHERE {' AND '.join(clauses)}", params
+            ).fetchone()[0]
         else:
-            # Tout afficher
-            cur = conn.execute("SELECT * FROM dossiers ORDER BY id DESC")
+            total = _dossiers_filter_total(statut_counts, filtre_cnaps)
 
-        dossiers = cur.fetchall()
+        dossiers = _load_dossiers_page(
+            conn,
+            filtre_cnaps,
+            match=match,
+            sort=listing["sort"],
+            descending=listing["order"] == "desc",
+            cursor=listing["cursor"],
+            limit=DOSSIERS_PAGE_SIZE + 1,
+        )
 
-        a_traiter_count = conn.execute("SELECT COUNT(*) FROM public_requests").fetchone()[0]
+        a_traiter_count = _read_dashboard_counters(conn)["request_count"]
 
-        # (Tu peux laisser ta partie recent_acceptes ici si tu veux)
-        sept_jours = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-        cur_acceptes = conn.execute("""
-            SELECT nom, prenom, session
-            FROM dossiers
-            WHERE statut_cnaps = 'ACCEPTE'
-            AND (session >= ?)
-            ORDER BY session DESC
-        """, (sept_jours,))
-        recent_acceptes = cur_acceptes.fetchall()
+    next_cursor = None
+    if len(dossiers) > DOSSIERS_PAGE_SIZE:
+        dossiers = dossiers[:DOSSIERS_PAGE_SIZE]
+        last = dossiers[-1]
+        next_cursor = _encode_keyset_cursor(listing["sort"], {listing["sort"]: last["sort_key"], "id": last["id"]})
+
+    # Paramètres repris par les liens de tri et de pagination.
+    listing_args = {key: listing[key] for key in ("filtre_cnaps", "q", "sort", "order") if listing[key]}
 
     return render_template(
         "index.html",
         dossiers=dossiers,
-        recent_acceptes=recent_acceptes,
         filtre_cnaps=filtre_cnaps,
         statuts_disponibles=statuts_disponibles,
+        statut_counts=statut_counts,
+        total_dossiers=sum(statut_counts.values()),
+        total=total,
+        q=listing["q"],
+        sort=listing["sort"],
+        order=listing["order"],
+        listing_args=listing_args,
+        is_first_page=listing["cursor"] is None,
+        next_cursor=next_cursor,
         public_form_url=PUBLIC_FORM_URL,
         a_traiter_count=a_traiter_count,
         formation_sessions=get_formation_sessions(),
@@ -672,7 +1531,7 @@ def add_formation_session():
         flash("La date/session est obligatoire.", "error")
         return redirect("/")
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         max_position = conn.execute(
             "SELECT COALESCE(MAX(position), 0) FROM formation_sessions WHERE formation_type = ?",
             (formation,),
@@ -706,7 +1565,7 @@ def delete_formation_session():
         flash("Type de formation invalide.", "error")
         return redirect("/")
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute(
             "DELETE FROM formation_sessions WHERE formation_type = ? AND session_label = ?",
             (formation, session_label),
@@ -730,9 +1589,10 @@ def add():
     formation = request.form["formation"]
     session = request.form["session"]
     lien = request.form["lien"]
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.execute("INSERT INTO dossiers (nom, prenom, formation, session, lien, statut) VALUES (?, ?, ?, ?, ?, ?)",
+    with get_db() as conn:
+        cur = conn.execute("INSERT INTO dossiers (nom, prenom, formation, session, lien, statut) VALUES (?, ?, ?, ?, ?, ?)",
                     (nom, prenom, formation, session, lien, "INCOMPLET"))
+        _store_lookup_norms(conn, "dossiers", [cur.lastrowid])
     return redirect("/")
 
 @app.route("/edit/<int:id>", methods=["POST"])
@@ -744,13 +1604,13 @@ def edit(id):
     if request.is_json:
         data = request.get_json(silent=True) or {}
         lien = data.get("lien", "")
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             conn.execute("UPDATE dossiers SET lien = ? WHERE id = ?", (lien, id))
         return ("", 204)  # aucune redirection
 
     # --- Mode ancien formulaire (fallback sécurité) ---
     lien = request.form.get("lien", "")
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("UPDATE dossiers SET lien = ? WHERE id = ?", (lien, id))
     return redirect("/")
 
@@ -758,8 +1618,9 @@ def edit(id):
 @app.route("/delete/<int:id>", methods=["POST"])
 @login_required
 def delete(id):
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("DELETE FROM dossiers WHERE id = ?", (id,))
+        _touch_requests_for_dossier(conn, id)
     return redirect("/")
 
 @app.route("/commentaire/<int:id>", methods=["POST"])
@@ -771,16 +1632,18 @@ def update_commentaire(id):
         data = request.get_json(silent=True) or {}
         commentaire = data.get("commentaire", "")
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             conn.execute("UPDATE dossiers SET commentaire = ? WHERE id = ?", (commentaire, id))
+            _touch_requests_for_dossier(conn, id)
 
         return ("", 204)
 
     # --- Mode formulaire classique ---
     commentaire = request.form.get("commentaire", "")
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("UPDATE dossiers SET commentaire = ? WHERE id = ?", (commentaire, id))
+        _touch_requests_for_dossier(conn, id)
 
     return redirect("/")
 
@@ -796,8 +1659,9 @@ def update_nub(id):
     else:
         nub = request.form.get("nub", "")
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("UPDATE dossiers SET commentaire = ? WHERE id = ?", (nub, id))
+        _touch_requests_for_dossier(conn, id)
 
     if request.is_json:
         return ("", 204)
@@ -820,8 +1684,7 @@ def update_request_identity(request_id):
     if not value:
         return jsonify({"ok": False, "error": "Le nom et le prénom sont obligatoires"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute(
             "SELECT id, dossier_id FROM public_requests WHERE id = ?",
             (request_id,),
@@ -843,6 +1706,10 @@ def update_request_identity(request_id):
                 f"UPDATE dossiers SET {field} = ? WHERE id = ?",
                 (value, req["dossier_id"]),
             )
+            _store_lookup_norms(conn, "dossiers", [req["dossier_id"]])
+
+    # Nom et prénom sont imprimés sur l'attestation.
+    _queue_attestation_prerender(get_db(), request_id)
 
     return jsonify({"ok": True, "field": field, "value": value})
 
@@ -859,8 +1726,7 @@ def update_request_telephone(request_id):
     if telephone and not _normalize_phone_number(telephone):
         return jsonify({"ok": False, "error": "Numéro de téléphone invalide"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute(
             "SELECT id, dossier_id FROM public_requests WHERE id = ?",
             (request_id,),
@@ -898,8 +1764,7 @@ def update_request_email(request_id):
     if email and "@" not in email:
         return jsonify({"ok": False, "error": "Email invalide"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute(
             "SELECT id, dossier_id FROM public_requests WHERE id = ?",
             (request_id,),
@@ -921,6 +1786,7 @@ def update_request_email(request_id):
                 "UPDATE dossiers SET email = ? WHERE id = ?",
                 (email, req["dossier_id"]),
             )
+        _store_lookup_norms(conn, "public_requests", [request_id])
 
     return jsonify({"ok": True, "email": email})
 
@@ -943,8 +1809,7 @@ def update_request_dracar_credentials(request_id):
     if not password:
         return jsonify({"ok": False, "error": "Le mot de passe est obligatoire"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute(
             "SELECT id FROM public_requests WHERE id = ?",
             (request_id,),
@@ -960,6 +1825,7 @@ def update_request_dracar_credentials(request_id):
             """,
             (email, password, request_id),
         )
+        _store_lookup_norms(conn, "public_requests", [request_id])
 
     return jsonify({"ok": True, "email": email, "password": password})
 
@@ -967,7 +1833,7 @@ def update_request_dracar_credentials(request_id):
 @app.route("/statut/<int:id>/<string:new_status>", methods=["POST"])
 @login_required
 def update_statut(id, new_status):
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("UPDATE dossiers SET statut = ? WHERE id = ?", (new_status, id))
     return ("", 204)
 
@@ -979,8 +1845,7 @@ def update_statut_cnaps(id):
     if request.is_json:
         data = request.get_json(silent=True) or {}
         nouveau_statut = data.get("statut_cnaps", "")
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_db() as conn:
             dossier = conn.execute(
                 """
                 SELECT d.*, pr.email AS request_email, pr.date_naissance
@@ -996,26 +1861,14 @@ def update_statut_cnaps(id):
             old_statut = dossier["statut_cnaps"] if dossier else ""
             conn.execute("UPDATE dossiers SET statut_cnaps = ? WHERE id = ?", (nouveau_statut, id))
             _record_statut_cnaps_history(conn, id, nouveau_statut)
-
-        if dossier and old_statut != "TRANSMIS" and nouveau_statut == "TRANSMIS":
-            email = (dossier["request_email"] or "").strip().lower()
-            if email:
-                formation_name = _formation_full_name(dossier["formation"])
-                html = render_template(
-                    "emails/statut_transmis.html",
-                    prenom=dossier["prenom"],
-                    formation_name=formation_name,
-                    login=email,
-                    password=(dossier["request_dracar_password"] or "").strip() or _dracar_password(dossier["nom"], dossier["date_naissance"]),
-                    dracar_app_url=DRACAR_APP_URL,
-                )
-                _send_email_html(email, "Votre dossier CNAPS a été transmis", html)
+            _touch_requests_for_dossier(conn, id)
+            if dossier and old_statut != "TRANSMIS" and nouveau_statut == "TRANSMIS":
+                _enqueue_statut_transmis_email(conn, dossier)
         return ("", 204)   # aucun rechargement de page
 
     # --- Mode ancien formulaire (fallback) ---
     nouveau_statut = request.form.get("statut_cnaps", "")
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         dossier = conn.execute(
             """
             SELECT d.*, pr.email AS request_email, pr.date_naissance
@@ -1031,21 +1884,366 @@ def update_statut_cnaps(id):
         old_statut = dossier["statut_cnaps"] if dossier else ""
         conn.execute("UPDATE dossiers SET statut_cnaps = ? WHERE id = ?", (nouveau_statut, id))
         _record_statut_cnaps_history(conn, id, nouveau_statut)
+        _touch_requests_for_dossier(conn, id)
+        if dossier and old_statut != "TRANSMIS" and nouveau_statut == "TRANSMIS":
+            _enqueue_statut_transmis_email(conn, dossier)
+    return redirect("/")
+
+
+def _enqueue_statut_transmis_email(conn, dossier):
+    email = (dossier["request_email"] or "").strip().lower()
+    if not email:
+        return
+    formation_name = _formation_full_name(dossier["formation"])
+    html = render_template(
+        "emails/statut_transmis.html",
+        prenom=dossier["prenom"],
+        formation_name=formation_name,
+        login=email,
+        password=(dossier["request_dracar_password"] or "").strip() or _dracar_password(dossier["nom"], dossier["date_naissance"]),
+        dracar_app_url=DRACAR_APP_URL,
+    )
+    _enqueue_email(conn, email, "Votre dossier CNAPS a été transmis", html, kind="statut_transmis")
+
+
+# --- Cache des attestations PDF ---
+# Adressé par contenu : la clé couvre le HTML rendu, le gabarit et les fichiers de
+# static/ (signature, logos). Un PDF déjà produit pour le même contenu est resservi
+# depuis le disque ; l'éviction LRU suit la mtime, rafraîchie à chaque lecture.
+
+
+# static/ ne change qu'au déploiement (nouveaux processus) : empreinte calculée une
+# fois par processus et par dossier.
+_STATIC_ASSETS_VERSIONS = {}
+
+
+def _static_assets_version() -> str:
+    """Empreinte (chemin, taille, mtime) des fichiers de static/."""
+    static_dir = app.static_folder
+    version = _STATIC_ASSETS_VERSIONS.get(static_dir)
+    if version is not None:
+        return version
+
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(static_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, static_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    version = _STATIC_ASSETS_VERSIONS[static_dir] = digest.hexdigest()
+    return version
+
+
+def _attestation_cache_key(template_name: str, html: str) -> str:
+    digest = hashlib.sha256()
+    for part in (template_name, _static_assets_version(), html):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _attestation_cache_relpath(key: str) -> str:
+    return os.path.join(key[:2], f"{key}.pdf")
+
+
+def _attestation_cache_path(key: str, cache_dir=None) -> str:
+    return os.path.join(cache_dir or ATTESTATION_CACHE_DIR, _attestation_cache_relpath(key))
+
+
+# Taille estimée du cache par dossier : dernier parcours complet + PDF écrits depuis par
+# ce processus. Les écritures des autres processus n'y figurent pas ; d'où un nouveau
+# parcours au plus tard toutes les ATTESTATION_CACHE_RESCAN_SECONDS.
+_ATTESTATION_CACHE_USAGE_LOCK = threading.Lock()
+_attestation_cache_usage = {}
+
+
+def _note_attestation_cache_write(path, cache_dir=None) -> int:
+    """Compte un PDF ajouté au cache ; ne parcourt le cache que si l'estimation dépasse la limite."""
+    cache_dir = cache_dir or ATTESTATION_CACHE_DIR
+    size = os.path.getsize(path)
+    with _ATTESTATION_CACHE_USAGE_LOCK:
+        usage = _attestation_cache_usage.get(cache_dir)
+        if usage is not None and time.monotonic() - usage["scanned_at"] < ATTESTATION_CACHE_RESCAN_SECONDS:
+            usage["bytes"] += size
+            if usage["bytes"] <= ATTESTATION_CACHE_MAX_BYTES:
+                return 0
+    return _evict_attestation_cache(keep=path, cache_dir=cache_dir)
+
 
-    if dossier and old_statut != "TRANSMIS" and nouveau_statut == "TRANSMIS":
-        email = (dossier["request_email"] or "").strip().lower()
-        if email:
-            formation_name = _formation_full_name(dossier["formation"])
-            html = render_template(
-                "emails/statut_transmis.html",
-                prenom=dossier["prenom"],
-                formation_name=formation_name,
-                login=email,
-                password=(dossier["request_dracar_password"] or "").strip() or _dracar_password(dossier["nom"], dossier["date_naissance"]),
-                dracar_app_url=DRACAR_APP_URL,
+def _evict_attestation_cache(keep=None, cache_dir=None) -> int:
+    """Supprime les PDF les moins récemment servis au-delà de ATTESTATION_CACHE_MAX_BYTES."""
+    cache_dir = cache_dir or ATTESTATION_CACHE_DIR
+    entries, total = [], 0
+    for root, _dirs, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(".pdf"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+
+    removed = 0
+    for _mtime, size, path in sorted(entries):
+        if total <= ATTESTATION_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    with _ATTESTATION_CACHE_USAGE_LOCK:
+        _attestation_cache_usage[cache_dir] = {"bytes": total, "scanned_at": time.monotonic()}
+    return removed
+
+
+def _request_attestation_source(conn, request_id):
+    """(gabarit, HTML) de l'attestation d'une demande, ou None sans formation prise en charge."""
+    req = conn.execute("SELECT * FROM public_requests WHERE id = ?", (request_id,)).fetchone()
+    if not req:
+        return None
+    dossier = None
+    if req["dossier_id"] and _table_columns(conn, "dossiers"):
+        dossier = conn.execute("SELECT * FROM dossiers WHERE id = ?", (req["dossier_id"],)).fetchone()
+    formation = _formation_code(dossier["formation"] if dossier else req["formation"])
+    if not formation:
+        return None
+    template_name = f"attestation_{formation.lower()}.html"
+    return template_name, render_template(template_name, stagiaire=dossier or req)
+
+
+# --- Service de rendu PDF ---
+# Pool de processus WeasyPrint de longue durée, chauffés au démarrage : fontconfig et
+# Pango initialisés, gabarits d'attestation rendus une fois, images de static/ gardées
+# dans le cache d'images de WeasyPrint. Le worker gunicorn n'envoie que le HTML et
+# attend au plus PDF_RENDER_TIMEOUT_SECONDS ; avec PDF_RENDER_WORKERS=0, le rendu
+# reste dans le processus courant.
+ATTESTATION_TEMPLATES = ("attestation_aps.html", "attestation_a3p.html")
+_pdf_render_lock = threading.Lock()
+_pdf_render_executor = None
+_pdf_render_pid = None
+# Options de write_pdf d'un processus de rendu chauffé (vide ailleurs).
+_pdf_render_options = {}
+
+
+def _write_pdf(html, target=None):
+    return HTML(string=html, base_url=os.getcwd()).write_pdf(target=target, **_pdf_render_options)  # ✅ Signature fonctionnelle
+
+
+def _pdf_worker_init():
+    """Initialiseur des processus du pool : polices, images et gabarits chauffés une fois."""
+    _pdf_render_options["cache"] = {}
+    if FontConfiguration is not None:
+        _pdf_render_options["font_config"] = FontConfiguration()
+    try:
+        with app.app_context():
+            for template_name in ATTESTATION_TEMPLATES:
+                _write_pdf(render_template(template_name, stagiaire={"nom": "", "prenom": "", "session": ""}))
+    except Exception:
+        # Un processus mal chauffé reste utilisable : il rendra à froid.
+        app.logger.exception("Préchauffage du rendu PDF en échec")
+
+
+def _pdf_worker_ready():
+    return os.getpid()
+
+
+def _timed_pdf_render(html):
+    started = time.perf_counter()
+    _write_pdf(html)
+    return time.perf_counter() - started
+
+
+def _pdf_render_pool(reset=False, start_method="forkserver"):
+    """Pool de rendu de ce processus (créé au premier besoin, recréé s'il est cassé).
+
+    Seul start_pdf_render_pool, appelé avant le démarrage des threads du worker,
+    passe par fork : un pool créé ou recréé plus tard (pool cassé, premier rendu
+    hors gunicorn) démarre via forkserver, car un fork depuis un processus qui a
+    déjà des threads (envoi outbox, rappels, requêtes) peut hériter d'un verrou
+    tenu (logging, _TRANSPORT_LOCK...) et bloquer le fils dans _pdf_worker_init.
+    """
+    global _pdf_render_executor, _pdf_render_pid
+    with _pdf_render_lock:
+        if reset or _pdf_render_pid != os.getpid():
+            mp_context = multiprocessing.get_context(start_method)
+            if start_method == "forkserver":
+                # Le serveur importe l'app une fois ; ses fils en héritent comme avec fork.
+                mp_context.set_forkserver_preload([__name__])
+            _pdf_render_executor = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=mp_context,
+                initializer=_pdf_worker_init,
             )
-            _send_email_html(email, "Votre dossier CNAPS a été transmis", html)
-    return redirect("/")
+            _pdf_render_pid = os.getpid()
+        return _pdf_render_executor
+
+
+def _submit_pdf_job(fn, *args):
+    try:
+        return _pdf_render_pool().submit(fn, *args)
+    except BrokenProcessPool:
+        app.logger.error("Pool de rendu PDF cassé, recréé via forkserver")
+        return _pdf_render_pool(reset=True).submit(fn, *args)
+
+
+def start_pdf_render_pool():
+    """Démarre et chauffe le pool de rendu de ce processus (idempotent).
+
+    À appeler avant tout thread (post_worker_init) : les fils sont forkés et
+    héritent des gabarits et de WeasyPrint déjà importés.
+    """
+    if PDF_RENDER_WORKERS <= 0 or _pdf_render_pid == os.getpid():
+        return
+    # Avec fork, la première soumission lance tous les processus et leur initialiseur.
+    _pdf_render_pool(start_method="fork").submit(_pdf_worker_ready)
+
+
+def _render_attestation_to_cache(cache_dir, template_name, html, key=None) -> str:
+    """Rend le PDF dans le cache depuis le processus courant ; renvoie sa clé."""
+    key = key or _attestation_cache_key(template_name, html)
+    path = _attestation_cache_path(key, cache_dir)
+    if os.path.exists(path):
+        # Rendu entre-temps par une autre soumission.
+        return key
+
+    # Écriture atomique : un autre processus peut rendre la même clé en parallèle.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            _write_pdf(html, target=handle)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _note_attestation_cache_write(path, cache_dir=cache_dir)
+    return key
+
+
+def _submit_attestation_render(template_name, html) -> Future:
+    """Future de la clé du PDF en cache : résolue d'emblée si le PDF existe déjà."""
+    key = _attestation_cache_key(template_name, html)
+    future = Future()
+    try:
+        os.utime(_attestation_cache_path(key))
+        future.set_result(key)
+        return future
+    except FileNotFoundError:
+        pass
+    if PDF_RENDER_WORKERS > 0:
+        return _submit_pdf_job(_render_attestation_to_cache, ATTESTATION_CACHE_DIR, template_name, html, key)
+    try:
+        future.set_result(_render_attestation_to_cache(ATTESTATION_CACHE_DIR, template_name, html, key))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def _cached_attestation_pdf(template_name: str, html: str, timeout=None) -> str:
+    """Clé du PDF de l'attestation en cache, rendu seulement s'il manque.
+
+    Lève TimeoutError si le pool n'a pas fini à temps ; le rendu se poursuit et
+    alimente le cache pour la tentative suivante.
+    """
+    future = _submit_attestation_render(template_name, html)
+    return future.result(timeout=PDF_RENDER_TIMEOUT_SECONDS if timeout is None else timeout)
+
+
+# --- Pré-rendu des attestations ---
+# Dès qu'une demande devient téléchargeable (ou que ses champs imprimés changent), le
+# PDF est rendu par le pool et déposé dans le cache : le clic sur "télécharger" le
+# trouve déjà sur disque.
+_attestation_prerender_futures = set()
+
+
+def _attestation_prerender_done(future):
+    _attestation_prerender_futures.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        app.logger.error("Pré-rendu d'attestation en échec", exc_info=future.exception())
+
+
+def _queue_attestation_prerender(conn, request_id):
+    """Met en file le rendu du PDF si la demande est téléchargeable et son PDF absent du cache."""
+    # Sans pool, pas de rendu en tâche de fond : le téléchargement rendra le PDF.
+    if PDF_RENDER_WORKERS <= 0:
+        return None
+    try:
+        return _submit_attestation_prerender(conn, request_id)
+    except Exception:
+        # Le pré-rendu est une optimisation : le téléchargement rendra le PDF au besoin.
+        app.logger.exception("Pré-rendu d'attestation non planifié request_id=%s", request_id)
+        return None
+
+
+def _submit_attestation_prerender(conn, request_id):
+    total, conformes = conn.execute(
+        """
+        SELECT COUNT(*), COALESCE(SUM(is_conforme = 1), 0)
+        FROM request_documents
+        WHERE request_id = ? AND is_active = 1
+        """,
+        (request_id,),
+    ).fetchone()
+    if not total or conformes != total:
+        return None
+    source = _request_attestation_source(conn, request_id)
+    if source is None:
+        return None
+    template_name, html = source
+    key = _attestation_cache_key(template_name, html)
+    if os.path.exists(_attestation_cache_path(key)):
+        return None
+
+    future = _submit_pdf_job(_render_attestation_to_cache, ATTESTATION_CACHE_DIR, template_name, html, key)
+    _attestation_prerender_futures.add(future)
+    future.add_done_callback(_attestation_prerender_done)
+    return future
+
+
+def _wait_for_attestation_prerenders(timeout=None):
+    return wait_futures(list(_attestation_prerender_futures), timeout=timeout)
+
+
+@app.cli.command("pdf-render-benchmark")
+@click.option("--runs", default=20, show_default=True, help="Rendus mesurés par mode.")
+@click.option(
+    "--template", "template_name", default=ATTESTATION_TEMPLATES[0], show_default=True,
+    type=click.Choice(ATTESTATION_TEMPLATES),
+)
+def pdf_render_benchmark_command(runs, template_name):
+    """Latence de rendu d'une attestation : processus neuf (froid) contre pool chauffé."""
+    # Un HTML différent par mesure : aucune entrée du cache d'attestations n'est réutilisée.
+    htmls = [
+        render_template(template_name, stagiaire={"nom": f"Dupont{index}", "prenom": "Jean", "session": "12/03/2026"})
+        for index in range(runs)
+    ]
+    context = multiprocessing.get_context("fork")
+    timings = {"froid": [], "chaud": [], "chaud (soumission)": []}
+    for html in htmls:
+        # Un processus neuf par mesure : initialisation des polices et des images comprise.
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            timings["froid"].append(executor.submit(_timed_pdf_render, html).result())
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_pdf_worker_init) as executor:
+        executor.submit(_pdf_worker_ready).result()
+        for html in htmls:
+            started = time.perf_counter()
+            timings["chaud"].append(executor.submit(_timed_pdf_render, html).result())
+            timings["chaud (soumission)"].append(time.perf_counter() - started)
+
+    for name, durations in timings.items():
+        click.echo(
+            f"{template_name} {name}: p50={_percentile_ms(durations, 0.5):.1f} ms "
+            f"p95={_percentile_ms(durations, 0.95):.1f} ms ({len(durations)} rendus)"
+        )
 
 
 @app.route('/attestation/<int:id>')
@@ -1059,18 +2257,27 @@ def attestation_pdf(id):
         return "Type de formation non pris en charge", 400
     template_name = f"attestation_{formation.lower()}.html"
     html = render_template(template_name, stagiaire=stagiaire)
-    pdf = HTML(string=html, base_url=os.getcwd()).write_pdf()  # ✅ Signature fonctionnelle
-    response = make_response(pdf)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=attestation_{formation}_{stagiaire["nom"]}.pdf'
-    return response
+    try:
+        key = _cached_attestation_pdf(template_name, html)
+    except TimeoutError:
+        # Le rendu continue dans le pool : la prochaine tentative trouvera le PDF en cache.
+        return "Attestation en cours de génération, réessayez dans quelques secondes.", 503, {"Retry-After": "5"}
+    # Fichier statique : la clé de contenu sert d'ETag (304 si le PDF n'a pas changé).
+    return send_from_directory(
+        ATTESTATION_CACHE_DIR,
+        _attestation_cache_relpath(key),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f'attestation_{formation}_{stagiaire["nom"]}.pdf',
+        etag=key,
+    )
 
 @app.route("/export")
 @login_required
 def export_csv():
     si = StringIO()
     writer = csv.writer(si)
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         cur = conn.execute("SELECT id, nom, prenom, formation, session, lien, statut, commentaire, statut_cnaps FROM dossiers")
         writer.writerow([col[0] for col in cur.description])
         writer.writerows(cur.fetchall())
@@ -1087,10 +2294,11 @@ def import_csv():
         if file:
             stream = StringIO(file.stream.read().decode("utf-8"))
             reader = csv.DictReader(stream)
-            with sqlite3.connect(DB_NAME) as conn:
+            with get_db() as conn:
                 conn.execute("DELETE FROM dossiers")  # On remplace tout
+                imported_ids = []
                 for row in reader:
-                    conn.execute("""
+                    cur = conn.execute("""
                         INSERT INTO dossiers (id, nom, prenom, formation, session, lien, statut, commentaire, statut_cnaps)
                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """, (
@@ -1104,6 +2312,9 @@ def import_csv():
                         row.get("commentaire"),
                         row.get("statut_cnaps"),
                     ))
+                    imported_ids.append(cur.lastrowid)
+                conn.execute("UPDATE public_requests SET updated_at = datetime('now','localtime')")
+                _store_lookup_norms(conn, "dossiers", imported_ids)
         return redirect("/")
     return '''
     <!doctype html>
@@ -1146,10 +2357,161 @@ def logout():
     return redirect("/login")
 
 
+# --- Cache des JSON publics ---
+# Les plateformes partenaires interrogent ces routes en boucle. Réponses gardées
+# PUBLIC_JSON_CACHE_TTL_SECONDS dans chaque processus. Toute requête qui écrit fait
+# avancer une génération stockée en base (close_db) ; chaque appel la relit, si bien
+# qu'une écriture passée par un autre worker gunicorn invalide aussi ce cache.
+# Le recalcul unique ne regroupe que les appels simultanés d'un même processus :
+# il suppose des workers à threads (worker_class gthread, gunicorn.conf.py).
+_PUBLIC_JSON_CACHE_LOCK = threading.Lock()
+_PUBLIC_JSON_CACHE = {}
+_PUBLIC_JSON_INFLIGHT = {}
+_PUBLIC_JSON_CACHE_STATS = {"hits": 0, "misses": 0, "coalesced": 0, "not_modified": 0, "invalidations": 0}
+_public_json_generation = 0
+
+
+def public_json_cache_stats() -> dict:
+    """Compteurs du cache depuis le démarrage ; coalesced = requêtes ayant attendu un calcul en cours."""
+    with _PUBLIC_JSON_CACHE_LOCK:
+        stats = dict(_PUBLIC_JSON_CACHE_STATS)
+        stats["entries"] = len(_PUBLIC_JSON_CACHE)
+    lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+    stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else None
+    return stats
+
+
+def _shared_public_json_generation(conn):
+    """Génération commune à tous les workers ; None avant la migration 017."""
+    try:
+        row = conn.execute("SELECT generation FROM public_json_cache_state WHERE id = 1").fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def _publish_public_json_invalidation(conn):
+    """Fait avancer la génération partagée : les autres workers recalculent au prochain appel."""
+    try:
+        # Transaction laissée ouverte par une requête en erreur : abandonnée, comme à la fermeture.
+        if conn.in_transaction:
+            conn.rollback()
+        # Instruction unique en autocommit : pas de transaction de plus à la fermeture.
+        conn.isolation_level = None
+        conn.execute("UPDATE public_json_cache_state SET generation = generation + 1 WHERE id = 1")
+    except sqlite3.Error:
+        app.logger.exception("Invalidation partagée du cache JSON public impossible")
+
+
+def _invalidate_public_json_cache():
+    global _public_json_generation
+    with _PUBLIC_JSON_CACHE_LOCK:
+        # Un calcul lancé avant l'invalidation ne sera pas mis en cache (génération changée).
+        _public_json_generation += 1
+        _PUBLIC_JSON_CACHE.clear()
+        _PUBLIC_JSON_CACHE_STATS["invalidations"] += 1
+
+
+def _public_json_entry(rv) -> dict:
+    response = app.make_response(rv)
+    body = response.get_data()
+    return {
+        "body": body,
+        "status": response.status_code,
+        "headers": [
+            (name, value)
+            for name, value in response.headers.items()
+            if name not in ("Content-Length", "ETag", "Cache-Control")
+        ],
+        "etag": hashlib.sha1(body).hexdigest(),
+        "expires_at": time.monotonic() + PUBLIC_JSON_CACHE_TTL_SECONDS,
+    }
+
+
+def _public_json_response(entry, cache_status):
+    response = app.response_class(entry["body"], status=entry["status"], headers=entry["headers"])
+    response.headers["X-Cache"] = cache_status
+    if entry["status"] != 200:
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    response.set_etag(entry["etag"])
+    max_age = max(0, int(entry["expires_at"] - time.monotonic()))
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        with _PUBLIC_JSON_CACHE_LOCK:
+            _PUBLIC_JSON_CACHE_STATS["not_modified"] += 1
+    return response
+
+
+def public_json_cached(view):
+    """Met en cache la réponse d'une route JSON publique, avec un seul recalcul à la fois par route."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if PUBLIC_JSON_CACHE_TTL_SECONDS <= 0:
+            return view(*args, **kwargs)
+
+        # Ces routes ignorent la query string : elle n'entre pas dans la clé.
+        key = (DB_NAME, request.path)
+        # Une lecture d'une ligne par appel : voit les écritures des autres workers.
+        shared_generation = _shared_public_json_generation(get_db())
+        flight_key = (key, shared_generation)
+        with _PUBLIC_JSON_CACHE_LOCK:
+            entry = _PUBLIC_JSON_CACHE.get(key)
+            fresh = (
+                entry is not None
+                and entry["shared_generation"] == shared_generation
+                and entry["expires_at"] > time.monotonic()
+            )
+            if fresh:
+                _PUBLIC_JSON_CACHE_STATS["hits"] += 1
+            else:
+                flight = _PUBLIC_JSON_INFLIGHT.get(flight_key)
+                leader = flight is None
+                if leader:
+                    flight = {"done": threading.Event(), "entry": None}
+                    _PUBLIC_JSON_INFLIGHT[flight_key] = flight
+                    generation = _public_json_generation
+                    _PUBLIC_JSON_CACHE_STATS["misses"] += 1
+                else:
+                    _PUBLIC_JSON_CACHE_STATS["coalesced"] += 1
+
+        if fresh:
+            return _public_json_response(entry, "HIT")
+        if not leader:
+            flight["done"].wait(PUBLIC_JSON_CACHE_WAIT_SECONDS)
+            if flight["entry"] is not None:
+                return _public_json_response(flight["entry"], "COALESCED")
+            # Calcul de tête en échec ou trop lent : on répond sans attendre davantage.
+            return _public_json_response(_public_json_entry(view(*args, **kwargs)), "MISS")
+
+        entry = None
+        try:
+            entry = _public_json_entry(view(*args, **kwargs))
+            entry["shared_generation"] = shared_generation
+        finally:
+            with _PUBLIC_JSON_CACHE_LOCK:
+                _PUBLIC_JSON_INFLIGHT.pop(flight_key, None)
+                if entry is not None and entry["status"] == 200 and generation == _public_json_generation:
+                    _PUBLIC_JSON_CACHE[key] = entry
+            flight["entry"] = entry
+            flight["done"].set()
+        return _public_json_response(entry, "MISS")
+    return wrapped
+
+
+@app.route("/public-json-cache/stats.json")
+@login_required
+def public_json_cache_stats_json():
+    return jsonify(public_json_cache_stats())
+
+
 # ------------------------------------------------------------
 # ✅ Route publique pour le suivi sur la plateforme principale
 # ------------------------------------------------------------
 @app.route("/data.json")
+@public_json_cached
 def data_json():
     """Retourne les compteurs du suivi CNAPS pour la plateforme de gestion."""
     headers = {
@@ -1157,93 +2519,20 @@ def data_json():
         "Access-Control-Allow-Origin": "*"
     }
 
-    def _safe_count(conn, query):
-        try:
-            return conn.execute(query).fetchone()[0], None
-        except sqlite3.OperationalError as exc:
-            return 0, str(exc)
-
     try:
         errors = []
-        with sqlite3.connect(DB_NAME) as conn:
-            espace_cnaps_normalized_expr = """
-                LOWER(
-                    TRIM(
-                        REPLACE(
-                            REPLACE(
-                                REPLACE(
-                                    REPLACE(
-                                        REPLACE(
-                                            REPLACE(
-                                                REPLACE(COALESCE(pr.espace_cnaps, 'A créer'), char(160), ' '),
-                                                char(9),
-                                                ' '
-                                            ),
-                                            char(10),
-                                            ' '
-                                        ),
-                                        char(13),
-                                        ' '
-                                    ),
-                                    'é',
-                                    'e'
-                                ),
-                                'è',
-                                'e'
-                            ),
-                            'ê',
-                            'e'
-                        )
-                    )
-                )
-            """
-            instruction_count, err = _safe_count(
-                conn,
-                "SELECT COUNT(*) FROM dossiers WHERE statut_cnaps = 'INSTRUCTION'",
-            )
-            if err:
-                errors.append(f"instruction: {err}")
-
+        with get_db() as conn:
             try:
-                demande_a_faire_count, _ = _compute_demandes_a_faire(conn, debug=False)
+                counters = _read_dashboard_counters(conn)
             except sqlite3.OperationalError as exc:
-                demande_a_faire_count = 0
-                errors.append(f"demande_a_faire: {exc}")
-
-            documents_a_controler_count, err = _safe_count(
-                conn,
-                """
-                SELECT COUNT(*)
-                FROM request_documents rd
-                WHERE rd.is_active = 1
-                  AND rd.is_conforme IS NULL
-                """,
-            )
-            if err:
-                errors.append(f"documents_a_controler: {err}")
-
-            dossiers_documents_a_controler_count, err = _safe_count(
-                conn,
-                """
-                SELECT COUNT(DISTINCT rd.request_id)
-                FROM request_documents rd
-                WHERE rd.is_active = 1
-                  AND rd.is_conforme IS NULL
-                """,
-            )
-            if err:
-                errors.append(f"dossiers_documents_a_controler: {err}")
+                counters = {}
+                errors.append(f"dashboard_counters: {exc}")
 
-            comptes_cnaps_a_creer_count, err = _safe_count(
-                conn,
-                f"""
-                SELECT COUNT(*)
-                FROM public_requests pr
-                WHERE {espace_cnaps_normalized_expr} = 'a creer'
-                """,
-            )
-            if err:
-                errors.append(f"comptes_cnaps_a_creer: {err}")
+        instruction_count = counters.get("instruction", 0)
+        demande_a_faire_count = counters.get("demande_a_faire", 0)
+        documents_a_controler_count = counters.get("documents_a_controler", 0)
+        dossiers_documents_a_controler_count = counters.get("dossiers_documents_a_controler", 0)
+        comptes_cnaps_a_creer_count = counters.get("comptes_cnaps_a_creer", 0)
 
         payload = {
             "instruction": instruction_count,
@@ -1282,6 +2571,7 @@ def data_json():
 
 
 @app.route("/summary.json")
+@public_json_cached
 def summary_json():
     """Retourne les compteurs globaux nécessaires à plateformegestion."""
     headers = {
@@ -1290,23 +2580,25 @@ def summary_json():
     }
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            data, source = _load_summary_source_data(conn)
+        with get_db() as conn:
+            counters = _read_dashboard_counters(conn)
+            source = "dashboard_counters"
 
             debug_payload = {
-                "__debug_count": len(data) if isinstance(data, list) else 0,
+                "__debug_count": counters["request_count"],
                 "__debug_source": source,
             }
 
             if DEBUG_SUMMARY:
-                dataset_type = type(data).__name__
+                # Échantillon de la première ligne /a-traiter, uniquement en mode debug.
+                sample = _load_a_traiter_dataset(conn, limit=1)
                 print(
                     f"[DEBUG_SUMMARY] source={source} "
-                    f"dataset_size={debug_payload['__debug_count']} type={dataset_type}"
+                    f"dataset_size={debug_payload['__debug_count']}"
                 )
-                if isinstance(data, list) and data and isinstance(data[0], dict):
-                    print(f"[DEBUG_SUMMARY] first_record_keys={list(data[0].keys())}")
-                    first_row = data[0]
+                if sample:
+                    first_row = sample[0]
+                    print(f"[DEBUG_SUMMARY] first_record_keys={list(first_row.keys())}")
                     debug_key_terms = ["cnaps", "statut", "status", "action", "instruction", "doc", "compte"]
                     debug_payload["__debug_keys"] = sorted(list(first_row.keys()))
                     debug_payload["__debug_sample"] = {
@@ -1336,36 +2628,14 @@ def summary_json():
                         for field in debug_demande_fields
                     }
 
-            if not isinstance(data, list) or len(data) == 0:
-                error_payload = {"error": "no_data_loaded", "__debug_source": source, "__debug_count": 0}
-                if DEBUG_SUMMARY:
-                    return error_payload, 200, headers
+            if counters["request_count"] == 0:
                 return {"error": "no_data_loaded", "__debug_source": source, "__debug_count": 0}, 200, headers
 
-            instruction = 0
-            nouveau_dossier = 0
-            demandes_a_faire = 0
-            documents_a_controler = 0
-            comptes_cnaps_a_creer = 0
-
-            for row in data:
-                if not isinstance(row, dict):
-                    continue
-
-                if _is_instruction_row(row):
-                    instruction += 1
-
-                if _is_nouveau_dossier(row):
-                    nouveau_dossier += 1
-
-                if _is_demande_a_faire_summary(row):
-                    demandes_a_faire += 1
-
-                if _has_documents_to_review(row):
-                    documents_a_controler += 1
-
-                if _is_compte_cnaps_a_creer(row):
-                    comptes_cnaps_a_creer += 1
+            instruction = counters["summary_instruction"]
+            nouveau_dossier = counters["nouveau_dossier"]
+            demandes_a_faire = counters["summary_demandes_a_faire"]
+            documents_a_controler = counters["summary_documents_a_controler"]
+            comptes_cnaps_a_creer = counters["summary_comptes_cnaps_a_creer"]
 
         payload = {
             "nouveau_dossier": nouveau_dossier,
@@ -1383,20 +2653,21 @@ def summary_json():
             print(f"[DEBUG_SUMMARY] summary_json error={exc}")
         return {
             "error": "no_data_loaded",
-            "__debug_source": "_load_a_traiter_dataset",
+            "__debug_source": "dashboard_counters",
             "__debug_count": 0,
         }, 200, headers
 
 @app.route('/notifications_espace_cnaps_a_valider.json')
+@public_json_cached
 def notifications_espace_cnaps_a_valider_json():
     """Retourne les comptes CNAPS créés qui doivent être validés côté gestionstagiaires."""
     headers = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_db() as conn:
+            statut = "d.statut_cnaps" if _table_has_column(conn, "dossiers", "statut_cnaps") else "NULL"
             rows = conn.execute(
-                """
+                f"""
                 SELECT
                     pr.id,
                     pr.nom,
@@ -1409,8 +2680,8 @@ def notifications_espace_cnaps_a_valider_json():
                     pr.updated_at
                 FROM public_requests pr
                 LEFT JOIN dossiers d ON d.id = pr.dossier_id
-                WHERE LOWER(TRIM(REPLACE(REPLACE(COALESCE(pr.espace_cnaps, 'A créer'), 'é', 'e'), 'É', 'E'))) = 'cree'
-                  AND LOWER(TRIM(REPLACE(REPLACE(COALESCE(d.statut_cnaps, ''), 'é', 'e'), 'É', 'E'))) != 'valide'
+                WHERE {_espace_cnaps_notification_expr()} = 'cree'
+                  AND LOWER(TRIM(REPLACE(REPLACE(COALESCE({statut}, ''), 'é', 'e'), 'É', 'E'))) != 'valide'
                 ORDER BY pr.id DESC
                 """
             ).fetchall()
@@ -1464,9 +2735,7 @@ def integration_accept_cnaps():
             "message": "Fournir request_id ou dossier_id dans le JSON.",
         }), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
+    with get_db() as conn:
         if dossier_id is None:
             req = conn.execute(
                 "SELECT dossier_id FROM public_requests WHERE id = ?",
@@ -1482,6 +2751,8 @@ def integration_accept_cnaps():
         ).fetchone()
         if not dossier:
             return jsonify({"ok": False, "error": "dossier_not_found"}), 404
+        # Identifiant renvoyé tel qu'en base (entier), quelle que soit la forme reçue.
+        dossier_id = dossier["id"]
 
         old_statut = (dossier["statut_cnaps"] or "").strip()
         if old_statut != "ACCEPTÉ":
@@ -1490,6 +2761,7 @@ def integration_accept_cnaps():
                 ("ACCEPTÉ", dossier_id),
             )
             _record_statut_cnaps_history(conn, dossier_id, "ACCEPTÉ")
+            _touch_requests_for_dossier(conn, dossier_id)
 
     return jsonify({
         "ok": True,
@@ -1499,12 +2771,98 @@ def integration_accept_cnaps():
     })
 
 
+@app.route("/integrations/gestionstagiaire/cnaps/accept/batch", methods=["POST"])
+def integration_accept_cnaps_batch():
+    """Variante groupée : {"items": [{"request_id": ...} | {"dossier_id": ...}, ...]}, en une transaction."""
+    token = _extract_gestionstagiaire_sync_token()
+    if not _is_valid_gestionstagiaire_sync_token(token):
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+
+    payload = request.get_json(silent=True) or {}
+    items = payload.get("items")
+    if not isinstance(items, list):
+        return jsonify({"ok": False, "error": "invalid_payload", "message": "items doit être une liste."}), 400
+    if len(items) > INTEGRATION_BATCH_MAX_ITEMS:
+        return jsonify({
+            "ok": False,
+            "error": "invalid_payload",
+            "message": f"{INTEGRATION_BATCH_MAX_ITEMS} éléments maximum par appel.",
+        }), 400
+
+    results = [None] * len(items)
+    identifiers = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        if item.get("request_id") is None and item.get("dossier_id") is None:
+            results[index] = {"index": index, "ok": False, "error": "missing_identifier"}
+            continue
+        identifiers.append({"index": index, "request_id": item.get("request_id"), "dossier_id": item.get("dossier_id")})
+
+    with get_db() as conn:
+        # Résolution de tous les identifiants en une requête (dossier_id prioritaire, comme l'appel unitaire).
+        rows = conn.execute(
+            """
+            SELECT
+                json_extract(items.value, '$.index') AS position,
+                json_extract(items.value, '$.dossier_id') AS requested_dossier_id,
+                pr.dossier_id AS request_dossier_id,
+                d.id AS dossier_id,
+                d.statut_cnaps
+            FROM json_each(?) items
+            LEFT JOIN public_requests pr
+              ON json_extract(items.value, '$.dossier_id') IS NULL
+             AND pr.id = json_extract(items.value, '$.request_id')
+            LEFT JOIN dossiers d
+              ON d.id = COALESCE(json_extract(items.value, '$.dossier_id'), pr.dossier_id)
+            """,
+            (json.dumps(identifiers),),
+        ).fetchall() if identifiers else []
+
+        accepted = {}
+        for row in sorted(rows, key=lambda row: row["position"]):
+            index = row["position"]
+            if row["requested_dossier_id"] is None and row["request_dossier_id"] is None:
+                results[index] = {"index": index, "ok": False, "error": "request_not_found"}
+                continue
+            if row["dossier_id"] is None:
+                results[index] = {"index": index, "ok": False, "error": "dossier_not_found"}
+                continue
+
+            dossier_id = row["dossier_id"]
+            # Un dossier cité deux fois est déjà ACCEPTÉ au second passage, comme en appels successifs.
+            old_statut = "ACCEPTÉ" if dossier_id in accepted else (row["statut_cnaps"] or "").strip()
+            if old_statut != "ACCEPTÉ":
+                accepted[dossier_id] = True
+            results[index] = {
+                "index": index,
+                "ok": True,
+                "dossier_id": dossier_id,
+                "previous_statut_cnaps": old_statut,
+                "statut_cnaps": "ACCEPTÉ",
+            }
+
+        if accepted:
+            dossier_ids = [(dossier_id,) for dossier_id in accepted]
+            conn.executemany("UPDATE dossiers SET statut_cnaps = 'ACCEPTÉ' WHERE id = ?", dossier_ids)
+            conn.executemany(
+                "INSERT INTO statut_cnaps_history (dossier_id, statut_cnaps) VALUES (?, 'ACCEPTÉ')",
+                dossier_ids,
+            )
+            conn.executemany(
+                "UPDATE public_requests SET updated_at = datetime('now','localtime') WHERE dossier_id = ?",
+                dossier_ids,
+            )
+
+    app.logger.info("[ACCEPT_BATCH] items=%s accepted=%s", len(items), len(accepted))
+    return jsonify({"ok": True, "accepted": len(accepted), "results": results})
+
+
 @app.route("/recent_acceptes.json")
+@public_json_cached
 def recent_acceptes_json():
     """Retourne les 10 derniers dossiers ACCEPTÉS avec date approximative de validation."""
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_db() as conn:
             rows = conn.execute("""
                 SELECT nom, prenom, session,
                        datetime('now', '-'||(ABS(RANDOM()) % 7)||' day') AS date_acceptation
@@ -1599,49 +2957,230 @@ def _normalize_lookup_email(value: str) -> str:
     return (value or "").strip().lower()
 
 
-def _normalize_summary_key(value) -> str:
-    return _normalize_action_value(value).replace(" ", "_")
+# Colonnes normalisées en Python à l'écriture : (source, colonne *_norm, normalisation).
+# Les routes qui écrivent un nom ou un email appellent _store_lookup_norms ; les
+# recherches ne font que lire. Un trigger remet la colonne *_norm à NULL quand la
+# source change hors de l'application (jamais de correspondance périmée) ; ces lignes,
+# comme les lignes historiques, sont recalculées par _backfill_lookup_norms au
+# démarrage (init_db) ou via `flask --app app lookup-norms backfill`.
+LOOKUP_NORM_COLUMNS = {
+    "dossiers": (
+        ("nom", "nom_norm", _normalize_lookup_identity),
+        ("prenom", "prenom_norm", _normalize_lookup_identity),
+    ),
+    "public_requests": (
+        ("email", "email_norm", _normalize_lookup_email),
+    ),
+}
+LOOKUP_NORM_INDEXES = {
+    "dossiers": "idx_dossiers_lookup_norm",
+    "public_requests": "idx_public_requests_email_norm",
+}
 
 
-def _coerce_bool(value) -> bool:
-    if isinstance(value, bool):
-        return value
-    if value is None:
+def _install_lookup_norms(conn, table_name) -> bool:
+    """Ajoute les colonnes *_norm de `table_name`, leur index et le trigger de péremption."""
+    specs = LOOKUP_NORM_COLUMNS[table_name]
+    columns = _table_columns(conn, table_name)
+    # La table dossiers est historique et n'est pas créée par init_db().
+    if not all(source in columns for source, _, _ in specs):
         return False
-    if isinstance(value, (int, float)):
-        return value != 0
 
-    normalized = _normalize_summary_key(str(value))
-    return normalized in {"1", "true", "vrai", "yes", "oui", "y", "on"}
+    for _, target, _ in specs:
+        if target not in columns:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {target} TEXT")
+    targets = ", ".join(target for _, target, _ in specs)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {LOOKUP_NORM_INDEXES[table_name]} ON {table_name} ({targets})")
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lookup_norm_{table_name}
+        AFTER UPDATE OF {", ".join(source for source, _, _ in specs)} ON {table_name}
+        WHEN {" OR ".join(f"NEW.{source} IS NOT OLD.{source}" for source, _, _ in specs)}
+        BEGIN
+            UPDATE {table_name} SET {", ".join(f"{target} = NULL" for _, target, _ in specs)} WHERE id = NEW.id;
+        END
+        """
+    )
+    _invalidate_schema_cache()
+    _refresh_lookup_norms(conn, table_name)
+    return True
 
 
-def _first_present_value(row: dict, candidates):
-    for field in candidates:
-        if field in row:
-            return row.get(field)
-    return None
+def _write_lookup_norms(conn, table_name, where_sql, params=()) -> int:
+    specs = LOOKUP_NORM_COLUMNS[table_name]
+    rows = conn.execute(
+        f"SELECT id, {', '.join(source for source, _, _ in specs)} FROM {table_name} WHERE {where_sql}",
+        params,
+    ).fetchall()
+    if rows:
+        conn.executemany(
+            f"UPDATE {table_name} SET {', '.join(f'{target} = ?' for _, target, _ in specs)} WHERE id = ?",
+            [
+                [normalize(row[index + 1]) for index, (_, _, normalize) in enumerate(specs)] + [row[0]]
+                for row in rows
+            ],
+        )
+    return len(rows)
 
 
-def _extract_action_value(row: dict):
-    candidates = [
-        "action_cnaps",
-        "cnaps_action",
-        "espace_cnaps_action",
-        "action_espace_cnaps",
-        "statut_action",
-        "action",
-        "demande_action",
-        "demande_statut",
-    ]
-    return _first_present_value(row, candidates)
+def _refresh_lookup_norms(conn, table_name) -> int:
+    """Calcule les colonnes *_norm encore à NULL (lignes historiques ou modifiées hors de l'application)."""
+    return _write_lookup_norms(conn, table_name, f"{LOOKUP_NORM_COLUMNS[table_name][0][1]} IS NULL")
 
 
-def _is_instruction_row(row: dict) -> bool:
-    return (row.get("statut_cnaps") or "").strip().upper() == "INSTRUCTION"
+def _store_lookup_norms(conn, table_name, row_ids) -> int:
+    """À appeler dans la transaction qui vient d'écrire des noms / emails de `row_ids`."""
+    if LOOKUP_NORM_COLUMNS[table_name][0][1] not in _table_columns(conn, table_name):
+        # Table historique apparue après la migration 014 : l'installation calcule tout.
+        _install_lookup_norms(conn, table_name)
+        return 0
+    row_ids = [row_id for row_id in row_ids if row_id is not None]
+    if not row_ids:
+        return 0
+    return _write_lookup_norms(conn, table_name, "id IN (SELECT value FROM json_each(?))", (json.dumps(row_ids),))
 
 
-def _is_nouveau_dossier(row: dict) -> bool:
-    formation = (row.get("formation") or "").strip()
+def _backfill_lookup_norms(conn) -> dict:
+    """Installe les colonnes *_norm manquantes et calcule les lignes à NULL ; {table: lignes calculées}."""
+    computed = {}
+    for table_name, specs in LOOKUP_NORM_COLUMNS.items():
+        if specs[0][1] in _table_columns(conn, table_name):
+            computed[table_name] = _refresh_lookup_norms(conn, table_name)
+        elif _install_lookup_norms(conn, table_name):
+            computed[table_name] = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    return computed
+
+
+@app.cli.command("lookup-norms")
+@click.argument("action", type=click.Choice(["backfill"]))
+def lookup_norms_command(action):
+    """Calcule nom_norm / prenom_norm / email_norm des lignes écrites hors de l'application."""
+    with closing(_connect_db()) as conn:
+        with conn:
+            computed = _backfill_lookup_norms(conn)
+    for table_name, count in computed.items():
+        click.echo(f"{table_name}: {count} ligne(s) normalisée(s)")
+
+
+LOOKUP_OUTCOME_HTTP_STATUS = {"MATCH": 200, "NOT_FOUND": 404, "AMBIGUOUS": 409}
+
+
+def _identity_lookup_outcome(rows):
+    """Verdict d'une recherche par identité : (MATCH | NOT_FOUND | AMBIGUOUS, corps JSON)."""
+    matches = {(row["request_id"], row["dossier_id"]) for row in rows}
+    if len(matches) > 1:
+        return "AMBIGUOUS", {"error": "AMBIGUOUS", "count": len(matches)}
+
+    body = {}
+    for request_id, dossier_id in matches:
+        if request_id is not None:
+            body["request_id"] = str(request_id)
+        if dossier_id is not None:
+            body["dossier_id"] = str(dossier_id)
+    if not body:
+        return "NOT_FOUND", {"error": "NOT_FOUND"}
+    return "MATCH", body
+
+
+def _lookup_norms_installed(conn) -> bool:
+    # Sans colonnes *_norm (dossiers créée après le démarrage), aucune ligne n'est cherchable.
+    return all(specs[0][1] in _table_columns(conn, table_name) for table_name, specs in LOOKUP_NORM_COLUMNS.items())
+
+
+def _find_dossiers_by_identities(conn, keys):
+    """_find_dossiers_by_identity pour une liste de (nom_norm, prenom_norm, email_norm), en une requête."""
+    if not keys or not _lookup_norms_installed(conn):
+        return {}
+    rows = conn.execute(
+        """
+        SELECT
+            CAST(ids.key AS INTEGER) AS position,
+            pr.id AS request_id,
+            d.id AS dossier_id
+        FROM json_each(?) ids
+        JOIN dossiers d
+          ON d.nom_norm = json_extract(ids.value, '$[0]')
+         AND d.prenom_norm = json_extract(ids.value, '$[1]')
+        LEFT JOIN public_requests pr ON pr.dossier_id = d.id
+        WHERE json_extract(ids.value, '$[2]') = ''
+           OR pr.email_norm = json_extract(ids.value, '$[2]')
+        """,
+        (json.dumps(keys),),
+    ).fetchall()
+
+    rows_by_key = {}
+    for row in rows:
+        rows_by_key.setdefault(keys[row["position"]], []).append(row)
+    return rows_by_key
+
+
+def _find_dossiers_by_identity(conn, nom_norm, prenom_norm, email_norm=""):
+    """Dossiers (et demandes liées) d'une identité normalisée : sonde de l'index nom_norm / prenom_norm."""
+    if not _lookup_norms_installed(conn):
+        return []
+    query = """
+        SELECT
+            pr.id AS request_id,
+            pr.email AS request_email,
+            d.id AS dossier_id,
+            d.nom,
+            d.prenom,
+            d.statut_cnaps
+        FROM dossiers d
+        LEFT JOIN public_requests pr ON pr.dossier_id = d.id
+        WHERE d.nom_norm = ?
+          AND d.prenom_norm = ?
+    """
+    params = [nom_norm, prenom_norm]
+    if email_norm:
+        query += " AND pr.email_norm = ?"
+        params.append(email_norm)
+    return conn.execute(query + " ORDER BY d.id DESC", params).fetchall()
+
+
+def _normalize_summary_key(value) -> str:
+    return _normalize_action_value(value).replace(" ", "_")
+
+
+def _coerce_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    if isinstance(value, (int, float)):
+        return value != 0
+
+    normalized = _normalize_summary_key(str(value))
+    return normalized in {"1", "true", "vrai", "yes", "oui", "y", "on"}
+
+
+def _first_present_value(row: dict, candidates):
+    for field in candidates:
+        if field in row:
+            return row.get(field)
+    return None
+
+
+def _extract_action_value(row: dict):
+    candidates = [
+        "action_cnaps",
+        "cnaps_action",
+        "espace_cnaps_action",
+        "action_espace_cnaps",
+        "statut_action",
+        "action",
+        "demande_action",
+        "demande_statut",
+    ]
+    return _first_present_value(row, candidates)
+
+
+def _is_instruction_row(row: dict) -> bool:
+    return (row.get("statut_cnaps") or "").strip().upper() == "INSTRUCTION"
+
+
+def _is_nouveau_dossier(row: dict) -> bool:
+    formation = (row.get("formation") or "").strip()
     session_date = (row.get("session_date") or "").strip()
     return not (formation and session_date)
 
@@ -1666,10 +3205,6 @@ def _is_demande_a_faire_summary(row: dict) -> bool:
     return all_docs_conformes and espace_cnaps == "Validé" and (statut_cnaps == "" or statut_cnaps == "--")
 
 
-def _table_columns(conn, table_name: str):
-    return {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
-
-
 def _build_first_non_empty_expr(alias: str, columns, candidates):
     parts = []
     for field in candidates:
@@ -1680,11 +3215,20 @@ def _build_first_non_empty_expr(alias: str, columns, candidates):
     return f"COALESCE({', '.join(parts)}, '')"
 
 
-def _compute_demandes_a_faire(conn, debug: bool = False):
-    """Compte les demandes à faire via plusieurs champs d'action possibles."""
-    pr_columns = _table_columns(conn, "public_requests")
-    d_columns = _table_columns(conn, "dossiers")
+def _demandes_a_faire_exprs(conn):
+    """Expressions action/espace/statut de _compute_demandes_a_faire, construites une fois."""
+    return _cached_sql_fragment(
+        conn,
+        "demandes_a_faire",
+        ("public_requests", "dossiers"),
+        lambda columns_by_table: _build_demandes_a_faire_exprs(
+            columns_by_table["public_requests"],
+            columns_by_table["dossiers"],
+        ),
+    )
 
+
+def _build_demandes_a_faire_exprs(pr_columns, d_columns):
     action_candidates = [
         ("pr", "action_cnaps"),
         ("pr", "cnaps_action"),
@@ -1723,6 +3267,12 @@ def _compute_demandes_a_faire(conn, debug: bool = False):
         d_columns,
         ["statut_cnaps", "cnaps_statut", "statut"],
     )
+    return tuple(selected_action_fields), action_expr, espace_expr, statut_expr
+
+
+def _compute_demandes_a_faire(conn, debug: bool = False):
+    """Compte les demandes à faire via plusieurs champs d'action possibles."""
+    selected_action_fields, action_expr, espace_expr, statut_expr = _demandes_a_faire_exprs(conn)
 
     rows = conn.execute(
         f"""
@@ -1803,6 +3353,437 @@ def _compute_demandes_a_faire(conn, debug: bool = False):
     return count, debug_payload
 
 
+# Équivalent SQL de str.strip() pour les blancs rencontrés dans les saisies.
+SQL_WHITESPACE_CHARS = "char(32, 9, 10, 11, 12, 13, 160)"
+
+# espace_cnaps normalisé comme dans /data.json (NULL = "A créer", accents et blancs neutralisés).
+ESPACE_CNAPS_NORMALIZED_SQL = """
+    LOWER(
+        TRIM(
+            REPLACE(
+                REPLACE(
+                    REPLACE(
+                        REPLACE(
+                            REPLACE(
+                                REPLACE(
+                                    REPLACE(COALESCE(pr.espace_cnaps, 'A créer'), char(160), ' '),
+                                    char(9),
+                                    ' '
+                                ),
+                                char(10),
+                                ' '
+                            ),
+                            char(13),
+                            ' '
+                        ),
+                        'é',
+                        'e'
+                    ),
+                    'è',
+                    'e'
+                ),
+                'ê',
+                'e'
+            )
+        )
+    )
+"""
+
+
+def _espace_cnaps_notification_expr(alias="pr") -> str:
+    """espace_cnaps normalisé comme dans /notifications_espace_cnaps_a_valider.json (index 018)."""
+    prefix = f"{alias}." if alias else ""
+    return f"LOWER(TRIM(REPLACE(REPLACE(COALESCE({prefix}espace_cnaps, 'A créer'), 'é', 'e'), 'É', 'E')))"
+
+
+# Codes canoniques des libellés espace_cnaps / statut_cnaps, indexés par leur forme
+# compacte (_sql_compact_token). Libellé vide -> '', libellé inconnu -> 'autre'.
+ESPACE_CNAPS_CODES = {"acreer": "a_creer", "cree": "cree", "valide": "valide"}
+STATUT_CNAPS_CODES = {
+    "transmis": "transmis",
+    "enregistre": "enregistre",
+    "instruction": "instruction",
+    "accepte": "accepte",
+    "refuse": "refuse",
+    "docscomplementaires": "docs_complementaires",
+    "annule": "annule",
+    "valide": "valide",
+}
+
+
+# Accents des mots comparés ("validé", "à faire"), ramenés à l'ASCII : LOWER de
+# SQLite ne traite que l'ASCII. Liste courte, l'analyseur SQLite limite la
+# profondeur des REPLACE imbriqués.
+_SQL_ACCENT_FOLDS = (
+    ("é", "e"), ("è", "e"), ("ê", "e"), ("ë", "e"), ("É", "e"), ("È", "e"), ("Ê", "e"),
+    ("à", "a"), ("â", "a"), ("À", "a"),
+)
+_SQL_TOKEN_SEPARATORS = ("' '", "'_'", "'-'", "char(9)", "char(10)", "char(13)", "char(160)")
+
+DASHBOARD_REQUEST_COUNTERS = (
+    "request_count",
+    "summary_instruction",
+    "nouveau_dossier",
+    "summary_demandes_a_faire",
+    "demande_a_faire",
+    "summary_documents_a_controler",
+    "comptes_cnaps_a_creer",
+    "summary_comptes_cnaps_a_creer",
+)
+DASHBOARD_COUNTERS = DASHBOARD_REQUEST_COUNTERS + (
+    "instruction",
+    "documents_a_controler",
+    "dossiers_documents_a_controler",
+)
+
+
+def _sql_stripped(expr: str) -> str:
+    return f"TRIM(COALESCE({expr}, ''), {SQL_WHITESPACE_CHARS})"
+
+
+def _sql_compact_token(expr: str) -> str:
+    """_normalize_action_value(...) sans espaces, en SQL pur (utilisable dans un trigger)."""
+    sql = f"LOWER(COALESCE({expr}, ''))"
+    for accented, plain in _SQL_ACCENT_FOLDS:
+        sql = f"REPLACE({sql}, '{accented}', '{plain}')"
+    for separator in _SQL_TOKEN_SEPARATORS:
+        sql = f"REPLACE({sql}, {separator}, '')"
+    return sql
+
+
+def _sql_enum_code(expr: str, codes: dict) -> str:
+    whens = " ".join(f"WHEN '{token}' THEN '{code}'" for token, code in codes.items())
+    return f"CASE {_sql_compact_token(expr)} WHEN '' THEN '' {whens} ELSE 'autre' END"
+
+
+def _espace_cnaps_code_expr(pr_columns, alias="pr") -> str:
+    """Code de espace_cnaps : colonne générée indexée si présente, sinon calcul à la volée."""
+    prefix = f"{alias}." if alias else ""
+    if "espace_cnaps_code" in pr_columns:
+        return f"{prefix}espace_cnaps_code"
+    # NULL vaut "A créer", comme la valeur par défaut de la colonne.
+    return _sql_enum_code(f"COALESCE({prefix}espace_cnaps, 'A créer')", ESPACE_CNAPS_CODES)
+
+
+def _statut_cnaps_code_expr(d_columns, alias="d") -> str:
+    """Code de statut_cnaps (dossiers) ; '' si la colonne n'existe pas."""
+    prefix = f"{alias}." if alias else ""
+    if "statut_cnaps_code" in d_columns:
+        return f"{prefix}statut_cnaps_code"
+    if "statut_cnaps" in d_columns:
+        return _sql_enum_code(f"{prefix}statut_cnaps", STATUT_CNAPS_CODES)
+    return "''"
+
+
+def _build_dashboard_request_counters_sql(pr_columns, d_columns, where_sql: str) -> str:
+    """Compteurs par demande (public_requests filtrées par `where_sql`), sans CTE ni paramètre."""
+    _, action_expr, espace_expr, statut_expr = _build_demandes_a_faire_exprs(pr_columns, d_columns)
+    statut = _sql_stripped("d.statut_cnaps") if "statut_cnaps" in d_columns else "''"
+    espace = _sql_stripped("pr.espace_cnaps")
+    active_docs = "SELECT 1 FROM request_documents rd WHERE rd.request_id = pr.id AND rd.is_active = 1"
+    return f"""
+        SELECT
+            COUNT(*) AS request_count,
+            COALESCE(SUM(UPPER(r.statut_value) = 'INSTRUCTION'), 0) AS summary_instruction,
+            COALESCE(SUM(r.is_nouveau_dossier), 0) AS nouveau_dossier,
+            COALESCE(SUM(
+                CASE WHEN r.all_docs_conformes
+                     THEN r.espace_value = 'Validé' AND r.statut_value IN ('', '--')
+                     ELSE 0 END
+            ), 0) AS summary_demandes_a_faire,
+            COALESCE(SUM(
+                CASE WHEN r.all_docs_conformes
+                     THEN {_sql_compact_token("r.action_value")} IN ('demandeafaire', 'demandesafaire', 'afaire')
+                          OR (
+                              {_sql_enum_code("r.espace_fallback_value", ESPACE_CNAPS_CODES)} = 'valide'
+                              AND {_sql_enum_code("r.statut_fallback_value", STATUT_CNAPS_CODES)} = ''
+                          )
+                     ELSE 0 END
+            ), 0) AS demande_a_faire,
+            COALESCE(SUM(r.has_pending_docs), 0) AS summary_documents_a_controler,
+            COALESCE(SUM(r.espace_normalized = 'a creer'), 0) AS comptes_cnaps_a_creer,
+            COALESCE(SUM(r.espace_value = 'A créer'), 0) AS summary_comptes_cnaps_a_creer
+        FROM (
+            SELECT
+                {statut} AS statut_value,
+                {espace} AS espace_value,
+                {_sql_stripped("pr.formation")} = '' OR {_sql_stripped("pr.session_date")} = '' AS is_nouveau_dossier,
+                {action_expr} AS action_value,
+                {espace_expr} AS espace_fallback_value,
+                {statut_expr} AS statut_fallback_value,
+                {ESPACE_CNAPS_NORMALIZED_SQL} AS espace_normalized,
+                EXISTS ({active_docs} AND rd.is_conforme IS NULL) AS has_pending_docs,
+                EXISTS ({active_docs})
+                    AND NOT EXISTS ({active_docs} AND (rd.is_conforme IS NULL OR rd.is_conforme <> 1))
+                    AS all_docs_conformes
+            FROM public_requests pr
+            LEFT JOIN dossiers d ON d.id = pr.dossier_id
+            WHERE {where_sql}
+        ) r
+    """
+
+
+def _dashboard_counters_sql(conn):
+    return _cached_sql_fragment(
+        conn,
+        "dashboard_counters",
+        ("public_requests", "dossiers"),
+        lambda columns_by_table: f"""
+            SELECT
+                r.*,
+                {_dossiers_instruction_count_sql(columns_by_table["dossiers"])} AS instruction,
+                (
+                    SELECT COUNT(*) FROM request_documents
+                    WHERE is_active = 1 AND is_conforme IS NULL
+                ) AS documents_a_controler,
+                (
+                    SELECT COUNT(DISTINCT request_id) FROM request_documents
+                    WHERE is_active = 1 AND is_conforme IS NULL
+                ) AS dossiers_documents_a_controler
+            FROM ({_build_dashboard_request_counters_sql(
+                columns_by_table["public_requests"], columns_by_table["dossiers"], "1"
+            )}) r
+        """,
+    )
+
+
+def _dossiers_instruction_count_sql(d_columns) -> str:
+    if "statut_cnaps" not in d_columns:
+        return "0"
+    return "(SELECT COUNT(*) FROM dossiers WHERE statut_cnaps = 'INSTRUCTION')"
+
+
+def _compute_dashboard_counters(conn) -> dict:
+    """Tous les compteurs de /summary.json et /data.json, recalculés en une seule requête.
+
+    Les préfixes summary_ gardent les définitions historiques de /summary.json
+    (valeurs brutes de la ligne /a-traiter) ; les autres suivent /data.json
+    (valeurs normalisées, comptes sur dossiers / documents).
+    """
+    cur = conn.execute(_dashboard_counters_sql(conn))
+    names = [column[0] for column in cur.description]
+    return {name: int(value or 0) for name, value in zip(names, cur.fetchone())}
+
+
+# --- Compteurs matérialisés (table dashboard_counters) ---
+# Une seule ligne, tenue à jour par des triggers : chaque écriture retire la
+# contribution des demandes touchées (BEFORE) puis ajoute la nouvelle (AFTER).
+# /data.json et /summary.json ne lisent plus que cette ligne.
+
+DASHBOARD_TRIGGER_PREFIX = "trg_dashboard_counters_"
+
+
+def _dashboard_request_delta_sql(pr_columns, d_columns, sign: str, where_sql: str) -> str:
+    assignments = ",\n            ".join(
+        f"{name} = dashboard_counters.{name} {sign} delta.{name}" for name in DASHBOARD_REQUEST_COUNTERS
+    )
+    return f"""
+        UPDATE dashboard_counters
+        SET {assignments}
+        FROM ({_build_dashboard_request_counters_sql(pr_columns, d_columns, where_sql)}) AS delta
+        WHERE dashboard_counters.id = 1;
+    """
+
+
+def _pending_request_exists_sql(request_id_expr: str) -> str:
+    return (
+        "EXISTS (SELECT 1 FROM request_documents "
+        f"WHERE request_id = {request_id_expr} AND is_active = 1 AND is_conforme IS NULL)"
+    )
+
+
+def _dashboard_document_delta_sql(sign: str, row: str) -> str:
+    """Compteurs au niveau document pour la ligne OLD/NEW de request_documents."""
+    pending_row = f"({row}.is_active = 1 AND {row}.is_conforme IS NULL)"
+    return f"""
+        UPDATE dashboard_counters
+        SET documents_a_controler = documents_a_controler {sign} {pending_row}
+        WHERE id = 1;
+    """
+
+
+def _dashboard_pending_requests_delta_sql(sign: str) -> str:
+    # Demandes distinctes ayant un document en attente : état avant (BEFORE) / après (AFTER)
+    # pour l'ancienne et la nouvelle demande de la ligne modifiée.
+    return f"""
+        UPDATE dashboard_counters
+        SET dossiers_documents_a_controler = dossiers_documents_a_controler {sign} (
+            {_pending_request_exists_sql("OLD.request_id")}
+            + (NEW.request_id IS NOT OLD.request_id AND {_pending_request_exists_sql("NEW.request_id")})
+        )
+        WHERE id = 1;
+    """
+
+
+def _install_dashboard_counter_triggers(conn):
+    """(Re)crée les triggers des compteurs d'après le schéma courant des tables."""
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?",
+        (f"{DASHBOARD_TRIGGER_PREFIX}%",),
+    ).fetchall():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    _invalidate_schema_cache()
+    pr_columns = _table_columns(conn, "public_requests")
+    d_columns = _table_columns(conn, "dossiers")
+    request_columns = sorted(
+        {"id", "dossier_id", "formation", "session_date"}
+        | {field for alias, field in _build_demandes_a_faire_exprs(pr_columns, d_columns)[0] if alias == "pr"}
+        | {field for field in ("espace_cnaps", "cnaps_espace", "espace_cnaps_statut", "statut_espace_cnaps") if field in pr_columns}
+    )
+    dossier_columns = sorted(
+        {"id"}
+        | {field for alias, field in _build_demandes_a_faire_exprs(pr_columns, d_columns)[0] if alias == "d"}
+        | {field for field in ("statut_cnaps", "cnaps_statut", "statut") if field in d_columns}
+    )
+
+    def delta(sign, where_sql):
+        return _dashboard_request_delta_sql(pr_columns, d_columns, sign, where_sql)
+
+    def instruction_delta(sign, row):
+        if "statut_cnaps" not in d_columns:
+            return ""
+        return (
+            f"UPDATE dashboard_counters SET instruction = instruction {sign} "
+            f"({row}.statut_cnaps IS 'INSTRUCTION') WHERE id = 1;"
+        )
+    triggers = {
+        "pr_insert": ("AFTER INSERT ON public_requests", delta("+", "pr.id = NEW.id")),
+        "pr_delete": ("BEFORE DELETE ON public_requests", delta("-", "pr.id = OLD.id")),
+        "pr_update_before": (
+            f"BEFORE UPDATE OF {', '.join(request_columns)} ON public_requests",
+            delta("-", "pr.id = OLD.id"),
+        ),
+        "pr_update_after": (
+            f"AFTER UPDATE OF {', '.join(request_columns)} ON public_requests",
+            delta("+", "pr.id = NEW.id"),
+        ),
+        # Les demandes survivent à leur dossier (LEFT JOIN) : on les recompte de part et d'autre.
+        "d_insert_before": ("BEFORE INSERT ON dossiers", delta("-", "pr.dossier_id = NEW.id")),
+        "d_insert_after": (
+            "AFTER INSERT ON dossiers",
+            delta("+", "pr.dossier_id = NEW.id") + instruction_delta("+", "NEW"),
+        ),
+        "d_delete_before": (
+            "BEFORE DELETE ON dossiers",
+            delta("-", "pr.dossier_id = OLD.id") + instruction_delta("-", "OLD"),
+        ),
+        "d_delete_after": ("AFTER DELETE ON dossiers", delta("+", "pr.dossier_id = OLD.id")),
+        "d_update_before": (
+            f"BEFORE UPDATE OF {', '.join(dossier_columns)} ON dossiers",
+            delta("-", "pr.dossier_id IN (OLD.id, NEW.id)") + instruction_delta("-", "OLD"),
+        ),
+        "d_update_after": (
+            f"AFTER UPDATE OF {', '.join(dossier_columns)} ON dossiers",
+            delta("+", "pr.dossier_id IN (OLD.id, NEW.id)") + instruction_delta("+", "NEW"),
+        ),
+        "rd_insert_before": (
+            "BEFORE INSERT ON request_documents",
+            delta("-", "pr.id = NEW.request_id")
+            + f"UPDATE dashboard_counters SET dossiers_documents_a_controler = dossiers_documents_a_controler - {_pending_request_exists_sql('NEW.request_id')} WHERE id = 1;",
+        ),
+        "rd_insert_after": (
+            "AFTER INSERT ON request_documents",
+            delta("+", "pr.id = NEW.request_id")
+            + _dashboard_document_delta_sql("+", "NEW")
+            + f"UPDATE dashboard_counters SET dossiers_documents_a_controler = dossiers_documents_a_controler + {_pending_request_exists_sql('NEW.request_id')} WHERE id = 1;",
+        ),
+        "rd_delete_before": (
+            "BEFORE DELETE ON request_documents",
+            delta("-", "pr.id = OLD.request_id")
+            + _dashboard_document_delta_sql("-", "OLD")
+            + f"UPDATE dashboard_counters SET dossiers_documents_a_controler = dossiers_documents_a_controler - {_pending_request_exists_sql('OLD.request_id')} WHERE id = 1;",
+        ),
+        "rd_delete_after": (
+            "AFTER DELETE ON request_documents",
+            delta("+", "pr.id = OLD.request_id")
+            + f"UPDATE dashboard_counters SET dossiers_documents_a_controler = dossiers_documents_a_controler + {_pending_request_exists_sql('OLD.request_id')} WHERE id = 1;",
+        ),
+        "rd_update_before": (
+            "BEFORE UPDATE OF request_id, is_active, is_conforme ON request_documents",
+            delta("-", "pr.id IN (OLD.request_id, NEW.request_id)")
+            + _dashboard_document_delta_sql("-", "OLD")
+            + _dashboard_pending_requests_delta_sql("-"),
+        ),
+        "rd_update_after": (
+            "AFTER UPDATE OF request_id, is_active, is_conforme ON request_documents",
+            delta("+", "pr.id IN (OLD.request_id, NEW.request_id)")
+            + _dashboard_document_delta_sql("+", "NEW")
+            + _dashboard_pending_requests_delta_sql("+"),
+        ),
+    }
+    for suffix, (event, body) in triggers.items():
+        conn.execute(f"CREATE TRIGGER {DASHBOARD_TRIGGER_PREFIX}{suffix} {event} BEGIN {body} END")
+
+
+def _rebuild_dashboard_counters(conn) -> dict:
+    """Réinstalle les triggers et recalcule la ligne de compteurs (dans la transaction de l'appelant)."""
+    _install_dashboard_counter_triggers(conn)
+    counters = _compute_dashboard_counters(conn)
+    columns = ", ".join(DASHBOARD_COUNTERS)
+    conn.execute(
+        f"""
+        INSERT OR REPLACE INTO dashboard_counters (id, {columns}, rebuilt_at)
+        VALUES (1, {', '.join('?' for _ in DASHBOARD_COUNTERS)}, datetime('now', 'localtime'))
+        """,
+        [counters[name] for name in DASHBOARD_COUNTERS],
+    )
+    return counters
+
+
+def _verify_dashboard_counters(conn) -> dict:
+    """Compare la ligne matérialisée à un recalcul complet ; renvoie {compteur: (stocké, réel)} en écart."""
+    stored = _read_materialized_dashboard_counters(conn)
+    if stored is None:
+        return {"dashboard_counters": (None, "absent")}
+    actual = _compute_dashboard_counters(conn)
+    return {
+        name: (stored[name], actual[name])
+        for name in DASHBOARD_COUNTERS
+        if stored[name] != actual[name]
+    }
+
+
+def _read_materialized_dashboard_counters(conn):
+    if not _table_columns(conn, "dashboard_counters"):
+        return None
+    cur = conn.execute(f"SELECT {', '.join(DASHBOARD_COUNTERS)} FROM dashboard_counters WHERE id = 1")
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip(DASHBOARD_COUNTERS, (int(value or 0) for value in row)))
+
+
+def _read_dashboard_counters(conn) -> dict:
+    """Lecture O(1) de la ligne matérialisée ; recalcul complet si elle n'est pas installée."""
+    counters = _read_materialized_dashboard_counters(conn)
+    if counters is None:
+        counters = _compute_dashboard_counters(conn)
+    return counters
+
+
+@app.cli.command("dashboard-counters")
+@click.argument("action", type=click.Choice(["verify", "rebuild"]))
+def dashboard_counters_command(action):
+    """Vérifie (verify) ou recalcule (rebuild) la table dashboard_counters."""
+    with closing(_connect_db()) as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            drift = _verify_dashboard_counters(conn)
+            for name, (stored, actual) in drift.items():
+                click.echo(f"écart {name}: stocké={stored} réel={actual}")
+            if action == "rebuild":
+                _rebuild_dashboard_counters(conn)
+                click.echo("dashboard_counters recalculé")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    if action == "verify":
+        if drift:
+            raise SystemExit(1)
+        click.echo("dashboard_counters à jour")
 
 
 @app.route("/integrations/gestionstagiaire/cnaps/lookup", methods=["POST"])
@@ -1823,30 +3804,8 @@ def integration_lookup_cnaps():
     normalized_last_name = _normalize_lookup_identity(last_name)
     normalized_email = _normalize_lookup_email(email)
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        conn.create_function("norm_lookup", 1, _normalize_lookup_identity)
-        conn.create_function("norm_email", 1, _normalize_lookup_email)
-
-        query = """
-            SELECT
-                pr.id AS request_id,
-                pr.email AS request_email,
-                d.id AS dossier_id,
-                d.nom,
-                d.prenom
-            FROM dossiers d
-            LEFT JOIN public_requests pr ON pr.dossier_id = d.id
-            WHERE norm_lookup(d.nom) = ?
-              AND norm_lookup(d.prenom) = ?
-        """
-        params = [normalized_last_name, normalized_first_name]
-
-        if normalized_email:
-            query += " AND norm_email(pr.email) = ?"
-            params.append(normalized_email)
-
-        rows = conn.execute(query, tuple(params)).fetchall()
+    with get_db() as conn:
+        rows = _find_dossiers_by_identity(conn, normalized_last_name, normalized_first_name, normalized_email)
 
     app.logger.info(
         "[LOOKUP] matches=%s first_name=%s last_name=%s email_provided=%s",
@@ -1856,29 +3815,65 @@ def integration_lookup_cnaps():
         bool(normalized_email),
     )
 
-    if not rows:
-        return jsonify({"error": "NOT_FOUND"}), 404
+    outcome, body = _identity_lookup_outcome(rows)
+    return jsonify(body), LOOKUP_OUTCOME_HTTP_STATUS[outcome]
 
-    unique = {}
-    for row in rows:
-        key = (row["request_id"], row["dossier_id"])
-        unique[key] = row
 
-    matches = list(unique.values())
-    if len(matches) > 1:
-        return jsonify({"error": "AMBIGUOUS", "count": len(matches)}), 409
+@app.route("/integrations/gestionstagiaire/cnaps/lookup/batch", methods=["POST"])
+def integration_lookup_cnaps_batch():
+    """Variante groupée de la recherche : {"identities": [{first_name, last_name, email}, ...]}."""
+    token = _extract_bearer_token()
+    if not _is_valid_gestionstagiaire_sync_token(token):
+        return jsonify({"error": "UNAUTHORIZED"}), 401
+
+    payload = request.get_json(silent=True) or {}
+    identities = payload.get("identities")
+    if not isinstance(identities, list):
+        return jsonify({"error": "INVALID_PAYLOAD", "message": "identities must be a list"}), 400
+    if len(identities) > INTEGRATION_BATCH_MAX_ITEMS:
+        return jsonify({
+            "error": "INVALID_PAYLOAD",
+            "message": f"at most {INTEGRATION_BATCH_MAX_ITEMS} identities per batch",
+        }), 400
+
+    results = [None] * len(identities)
+    keys = {}
+    for index, identity in enumerate(identities):
+        identity = identity if isinstance(identity, dict) else {}
+        first_name = (identity.get("first_name") or "").strip()
+        last_name = (identity.get("last_name") or "").strip()
+        if not first_name or not last_name:
+            results[index] = {
+                "index": index,
+                "status": "INVALID_PAYLOAD",
+                "error": "INVALID_PAYLOAD",
+                "message": "first_name and last_name are required",
+            }
+            continue
+        key = (
+            _normalize_lookup_identity(last_name),
+            _normalize_lookup_identity(first_name),
+            _normalize_lookup_email(identity.get("email")),
+        )
+        keys.setdefault(key, []).append(index)
 
-    match = matches[0]
-    response = {}
-    if match["request_id"] is not None:
-        response["request_id"] = str(match["request_id"])
-    if match["dossier_id"] is not None:
-        response["dossier_id"] = str(match["dossier_id"])
+    with get_db() as conn:
+        rows_by_key = _find_dossiers_by_identities(conn, list(keys))
+
+    for key, indexes in keys.items():
+        outcome, body = _identity_lookup_outcome(rows_by_key.get(key, []))
+        for index in indexes:
+            results[index] = {"index": index, "status": outcome, **body}
+
+    app.logger.info(
+        "[LOOKUP_BATCH] identities=%s distinct=%s matches=%s",
+        len(identities),
+        len(keys),
+        sum(1 for result in results if result["status"] == "MATCH"),
+    )
+    return jsonify({"results": results}), 200
 
-    if not response:
-        return jsonify({"error": "NOT_FOUND"}), 404
 
-    return jsonify(response), 200
 @app.route("/lookup_cnaps.json")
 def lookup_cnaps():
     nom = (request.args.get("nom") or "").strip()
@@ -1888,36 +3883,23 @@ def lookup_cnaps():
         return {"ok": False, "error": "missing nom or prenom"}, 400, {"Access-Control-Allow-Origin": "*"}
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
-            conn.create_function("norm", 1, _normalize)
-            row = conn.execute(f"""
-                SELECT id, nom, prenom, statut_cnaps
-                FROM dossiers
-                WHERE norm(nom) = norm(?)
-                  AND norm(prenom) = norm(?)
-                ORDER BY id DESC
-                LIMIT 1
-            """, (nom, prenom)).fetchone()
-
-            if not row:
-                row = conn.execute(f"""
-                    SELECT id, nom, prenom, statut_cnaps
-                    FROM dossiers
-                    WHERE norm(nom) = norm(?)
-                      AND norm(prenom) = norm(?)
-                    ORDER BY id DESC
-                    LIMIT 1
-                """, (prenom, nom)).fetchone()
-
-            if not row:
+        with get_db() as conn:
+            nom_norm = _normalize_lookup_identity(nom)
+            prenom_norm = _normalize_lookup_identity(prenom)
+            # Deuxième essai avec nom / prénom inversés.
+            rows = (
+                _find_dossiers_by_identity(conn, nom_norm, prenom_norm)
+                or _find_dossiers_by_identity(conn, prenom_norm, nom_norm)
+            )
+            if not rows:
                 return {"ok": True, "nom": nom, "prenom": prenom, "statut_cnaps": "INCONNU"}, 200, {"Access-Control-Allow-Origin": "*"}
 
-            statuts_dates = _get_statuts_dates(conn, row["id"])
+            row = rows[0]
+            statuts_dates = _get_statuts_dates(conn, row["dossier_id"])
 
             return {
                 "ok": True,
-                "id": row["id"],
+                "id": row["dossier_id"],
                 "nom": row["nom"],
                 "prenom": row["prenom"],
                 "statut_cnaps": row["statut_cnaps"] or "INCONNU",
@@ -1927,6 +3909,362 @@ def lookup_cnaps():
     except Exception as e:
         return {"ok": False, "error": str(e)}, 500, {"Access-Control-Allow-Origin": "*"}
 
+def _percentile_ms(durations, percentile):
+    ordered = sorted(durations)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))] * 1000
+
+
+@app.cli.command("lookup-benchmark")
+@click.option("--sizes", default="10000,100000", show_default=True, help="Nombres de dossiers, séparés par des virgules.")
+@click.option("--runs", default=200, show_default=True, help="Recherches mesurées par taille.")
+def lookup_benchmark_command(sizes, runs):
+    """Latence des recherches par identité : index *_norm contre l'ancien scan avec fonction Python."""
+    global DB_NAME
+    saved_db_name = DB_NAME
+    rng = random.Random(0)
+    try:
+        for size in [int(value) for value in sizes.split(",") if value.strip()]:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                DB_NAME = os.path.join(tmpdir, "lookup-benchmark.db")
+                _invalidate_schema_cache()
+                with closing(_connect_db()) as conn:
+                    conn.execute("CREATE TABLE dossiers (id INTEGER PRIMARY KEY, nom TEXT, prenom TEXT, statut_cnaps TEXT)")
+                    conn.execute("CREATE TABLE public_requests (id INTEGER PRIMARY KEY, dossier_id INTEGER, email TEXT)")
+                    conn.execute("CREATE INDEX idx_public_requests_dossier_id ON public_requests (dossier_id)")
+                    conn.executemany(
+                        "INSERT INTO dossiers (id, nom, prenom, statut_cnaps) VALUES (?, ?, ?, 'INSTRUCTION')",
+                        ((index, f"Dùpont-{index}", f"Jean {index}") for index in range(1, size + 1)),
+                    )
+                    conn.executemany(
+                        "INSERT INTO public_requests (dossier_id, email) VALUES (?, ?)",
+                        ((index, f"user{index}@example.com") for index in range(1, size + 1)),
+                    )
+                    for table_name in LOOKUP_NORM_COLUMNS:
+                        _install_lookup_norms(conn, table_name)
+                    conn.commit()
+
+                    conn.create_function("norm_lookup", 1, _normalize_lookup_identity)
+                    targets = [rng.randint(1, size) for _ in range(runs)]
+                    timings = {"scan": [], "index": []}
+                    # L'ancien scan coûte ~1 s à 100k dossiers : on le limite à 20 mesures.
+                    for index in targets[:20]:
+                        started = time.perf_counter()
+                        conn.execute(
+                            "SELECT d.id FROM dossiers d LEFT JOIN public_requests pr ON pr.dossier_id = d.id "
+                            "WHERE norm_lookup(d.nom) = ? AND norm_lookup(d.prenom) = ?",
+                            (f"dupont{index}", f"jean{index}"),
+                        ).fetchall()
+                        timings["scan"].append(time.perf_counter() - started)
+                    for index in targets:
+                        started = time.perf_counter()
+                        _find_dossiers_by_identity(conn, f"dupont{index}", f"jean{index}", f"user{index}@example.com")
+                        timings["index"].append(time.perf_counter() - started)
+
+                for name, durations in timings.items():
+                    click.echo(
+                        f"{size} dossiers {name}: p50={_percentile_ms(durations, 0.5):.3f} ms "
+                        f"p95={_percentile_ms(durations, 0.95):.3f} ms ({len(durations)} recherches)"
+                    )
+    finally:
+        DB_NAME = saved_db_name
+        _invalidate_schema_cache()
+
+
+# --- Recherche plein texte (FTS5) ---
+# Une seule table virtuelle pour les dossiers et les demandes : rowid = 2 * id pour
+# une demande, 2 * id + 1 pour un dossier. Le tokenizer ramène casse et accents à la
+# forme de _normalize ; la colonne `compact` reprend les valeurs sans séparateurs
+# ("jeanpierre", "0612345678") pour les termes saisis d'un bloc.
+SEARCH_INDEX_COLUMNS = ("nom", "prenom", "email", "telephone", "nub", "formation", "session", "compact")
+SEARCH_INDEX_RANK = "bm25(10.0, 10.0, 4.0, 4.0, 6.0, 1.0, 1.0, 2.0)"
+SEARCH_TRIGGER_PREFIX = "trg_search_index_"
+SEARCH_KINDS = {"request": 0, "dossier": 1}
+SEARCH_MAX_TERMS = 8
+_SQL_SEARCH_SEPARATORS = (
+    "' '", "'-'", "'.'", "'_'", "''''", "'’'", "'@'", "'+'", "'/'", "'('", "')'", "char(9)", "char(160)",
+)
+
+
+def _sql_search_compact(expr: str) -> str:
+    sql = f"COALESCE({expr}, '')"
+    for separator in _SQL_SEARCH_SEPARATORS:
+        sql = f"REPLACE({sql}, {separator}, '')"
+    return sql
+
+
+def _create_search_index(conn):
+    if _table_columns(conn, "search_index"):
+        return
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            {", ".join(SEARCH_INDEX_COLUMNS)},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    )
+    # Classement par défaut de ORDER BY rank (configuration persistée dans la table).
+    conn.execute("INSERT INTO search_index (search_index, rank) VALUES ('rank', ?)", (SEARCH_INDEX_RANK,))
+    _invalidate_schema_cache()
+
+
+def _search_index_rows_sql(pr_columns, d_columns, kind, where_sql):
+    """SELECT (rowid, colonnes de search_index) des lignes de `kind` vérifiant `where_sql`."""
+    if kind == "request":
+        alias, table = "pr", "public_requests"
+        join_sql = "LEFT JOIN dossiers d ON d.id = pr.dossier_id" if d_columns else ""
+        phones = ["NULLIF(pr.telephone, '')"] if "telephone" in pr_columns else []
+        if "telephone" in d_columns:
+            phones.append("NULLIF(d.telephone, '')")
+        values = {
+            "nom": "pr.nom",
+            "prenom": "pr.prenom",
+            "email": "pr.email",
+            "telephone": f"COALESCE({', '.join(phones)}, NULL)" if phones else "NULL",
+            "nub": "d.commentaire" if "commentaire" in d_columns else "NULL",
+            "formation": "pr.formation" if "formation" in pr_columns else "NULL",
+            "session": "pr.session_date" if "session_date" in pr_columns else "NULL",
+        }
+    else:
+        alias, table, join_sql = "d", "dossiers", ""
+        values = {
+            column: f"d.{source}" if source in d_columns else "NULL"
+            for column, source in (
+                ("nom", "nom"),
+                ("prenom", "prenom"),
+                ("email", "email"),
+                ("telephone", "telephone"),
+                ("nub", "commentaire"),
+                ("formation", "formation"),
+                ("session", "session"),
+            )
+        }
+    values["compact"] = " || ' ' || ".join(
+        _sql_search_compact(values[column]) for column in ("nom", "prenom", "email", "telephone", "nub")
+    )
+    return (
+        f"SELECT {alias}.id * 2 + {SEARCH_KINDS[kind]}, {', '.join(values[column] for column in SEARCH_INDEX_COLUMNS)} "
+        f"FROM {table} {alias} {join_sql} WHERE {where_sql}"
+    )
+
+
+def _install_search_index_triggers(conn):
+    """(Re)crée les triggers de search_index d'après le schéma courant des tables."""
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?",
+        (f"{SEARCH_TRIGGER_PREFIX}%",),
+    ).fetchall():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    _invalidate_schema_cache()
+    pr_columns = _table_columns(conn, "public_requests")
+    d_columns = _table_columns(conn, "dossiers")
+    insert_sql = f"INSERT INTO search_index (rowid, {', '.join(SEARCH_INDEX_COLUMNS)}) "
+
+    def reindex(kind, rowids_sql, where_sql):
+        return (
+            f"DELETE FROM search_index WHERE rowid IN ({rowids_sql});"
+            + insert_sql + _search_index_rows_sql(pr_columns, d_columns, kind, where_sql) + ";"
+        )
+
+    request_columns = [
+        column for column in ("dossier_id", "nom", "prenom", "email", "telephone", "formation", "session_date")
+        if column in pr_columns
+    ]
+    triggers = {
+        "pr_insert": (
+            "AFTER INSERT ON public_requests",
+            insert_sql + _search_index_rows_sql(pr_columns, d_columns, "request", "pr.id = NEW.id") + ";",
+        ),
+        "pr_delete": ("AFTER DELETE ON public_requests", "DELETE FROM search_index WHERE rowid = OLD.id * 2;"),
+        "pr_update": (
+            f"AFTER UPDATE OF {', '.join(request_columns)} ON public_requests",
+            reindex("request", "OLD.id * 2, NEW.id * 2", "pr.id = NEW.id"),
+        ),
+    }
+    # La table dossiers est historique : sans elle, les demandes sont indexées sans NUB.
+    if d_columns:
+        dossier_columns = [
+            column for column in ("nom", "prenom", "email", "telephone", "commentaire", "formation", "session")
+            if column in d_columns
+        ]
+        triggers.update({
+            "d_insert": (
+                "AFTER INSERT ON dossiers",
+                insert_sql + _search_index_rows_sql(pr_columns, d_columns, "dossier", "d.id = NEW.id") + ";",
+            ),
+            "d_delete": (
+                "AFTER DELETE ON dossiers",
+                "DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;"
+                + reindex(
+                    "request",
+                    "SELECT id * 2 FROM public_requests WHERE dossier_id = OLD.id",
+                    "pr.dossier_id = OLD.id",
+                ),
+            ),
+            "d_update": (
+                f"AFTER UPDATE OF {', '.join(dossier_columns)} ON dossiers",
+                reindex("dossier", "OLD.id * 2 + 1, NEW.id * 2 + 1", "d.id = NEW.id"),
+            ),
+        })
+        # Les demandes reprennent le NUB (et à défaut le téléphone) de leur dossier.
+        shared_columns = [column for column in ("commentaire", "telephone") if column in d_columns]
+        if shared_columns:
+            triggers["d_update_requests"] = (
+                f"AFTER UPDATE OF {', '.join(shared_columns)} ON dossiers",
+                reindex(
+                    "request",
+                    "SELECT id * 2 FROM public_requests WHERE dossier_id IN (OLD.id, NEW.id)",
+                    "pr.dossier_id IN (OLD.id, NEW.id)",
+                ),
+            )
+    for suffix, (event, body) in triggers.items():
+        conn.execute(f"CREATE TRIGGER {SEARCH_TRIGGER_PREFIX}{suffix} {event} BEGIN {body} END")
+
+
+def _rebuild_search_index(conn) -> int:
+    """Réinstalle les triggers et réindexe tout (dans la transaction de l'appelant)."""
+    _install_search_index_triggers(conn)
+    pr_columns = _table_columns(conn, "public_requests")
+    d_columns = _table_columns(conn, "dossiers")
+    insert_sql = f"INSERT INTO search_index (rowid, {', '.join(SEARCH_INDEX_COLUMNS)}) "
+    conn.execute("DELETE FROM search_index")
+    conn.execute(insert_sql + _search_index_rows_sql(pr_columns, d_columns, "request", "1"))
+    if d_columns:
+        conn.execute(insert_sql + _search_index_rows_sql(pr_columns, d_columns, "dossier", "1"))
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    return conn.execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+
+
+def _search_index_pending(conn) -> bool:
+    """Vrai si la table dossiers est apparue après l'installation des triggers (lecture seule)."""
+    if not _table_columns(conn, "dossiers"):
+        return False
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+        (f"{SEARCH_TRIGGER_PREFIX}d_insert",),
+    ).fetchone() is None
+
+
+def _rebuild_search_index_at_startup(conn):
+    # Les recherches ne font que lire : une table dossiers créée hors de l'application
+    # est indexée ici, au démarrage suivant, ou via `flask search-index rebuild`.
+    if not _search_index_pending(conn):
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if _search_index_pending(conn):
+            count = _rebuild_search_index(conn)
+            app.logger.info("search_index reconstruit au démarrage (%s lignes)", count)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _search_match_expression(query: str) -> str:
+    """Termes saisis -> expression MATCH FTS5 : préfixes normalisés comme _normalize."""
+    terms = []
+    for raw_term in (query or "").split():
+        term = _normalize(raw_term)
+        if term and term not in terms:
+            terms.append(term)
+    return " ".join(f'"{term}"*' for term in terms[:SEARCH_MAX_TERMS])
+
+
+def _search(conn, query: str, kind=None, limit=SEARCH_MAX_RESULTS):
+    """Résultats classés (bm25) de la recherche plein texte, meilleurs d'abord."""
+    match = _search_match_expression(query)
+    if not match:
+        return []
+
+    kind_sql = ""
+    params = [match]
+    if kind is not None:
+        kind_sql = "AND rowid % 2 = ?"
+        params.append(SEARCH_KINDS[kind])
+    params.append(limit)
+
+    d_columns = _table_columns(conn, "dossiers")
+    statut_sql = "d.statut_cnaps" if "statut_cnaps" in d_columns else "NULL"
+    join_sql = ""
+    if d_columns:
+        join_sql = (
+            "LEFT JOIN dossiers d ON d.id = "
+            "CASE WHEN hits.rowid % 2 = 1 THEN hits.rowid / 2 ELSE pr.dossier_id END"
+        )
+    displayed_columns = SEARCH_INDEX_COLUMNS[:-1]
+    rows = conn.execute(
+        f"""
+        WITH hits AS (
+            SELECT rowid, {", ".join(displayed_columns)}, rank
+            FROM search_index
+            WHERE search_index MATCH ? {kind_sql}
+            ORDER BY rank
+            LIMIT ?
+        )
+        SELECT hits.*, pr.dossier_id AS request_dossier_id, {statut_sql} AS statut_cnaps
+        FROM hits
+        LEFT JOIN public_requests pr ON hits.rowid % 2 = 0 AND pr.id = hits.rowid / 2
+        {join_sql}
+        ORDER BY hits.rank
+        """,
+        params,
+    ).fetchall()
+
+    results = []
+    for row in rows:
+        item_kind = "dossier" if row["rowid"] % 2 else "request"
+        item_id = row["rowid"] // 2
+        result = {
+            "type": item_kind,
+            "id": item_id,
+            "dossier_id": item_id if item_kind == "dossier" else row["request_dossier_id"],
+            "statut_cnaps": row["statut_cnaps"],
+        }
+        result.update({column: row[column] for column in displayed_columns})
+        results.append(result)
+    return results
+
+
+@app.route("/search.json")
+@login_required
+def search_json():
+    """Recherche plein texte : ?q=...&type=dossier|request&limit=N."""
+    kind = (request.args.get("type") or "").strip() or None
+    if kind is not None and kind not in SEARCH_KINDS:
+        return jsonify({"ok": False, "error": "type doit valoir dossier ou request"}), 400
+    try:
+        limit = int(request.args.get("limit") or 20)
+    except ValueError:
+        return jsonify({"ok": False, "error": "limit doit être un entier"}), 400
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+
+    query = (request.args.get("q") or "").strip()
+    with get_db() as conn:
+        results = _search(conn, query, kind=kind, limit=limit)
+
+    return jsonify({"ok": True, "q": query, "count": len(results), "results": results})
+
+
+@app.cli.command("search-index")
+@click.argument("action", type=click.Choice(["rebuild"]))
+def search_index_command(action):
+    """Réinstalle les triggers de search_index et réindexe dossiers et demandes."""
+    with closing(_connect_db()) as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _create_search_index(conn)
+            count = _rebuild_search_index(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    click.echo(f"search_index reconstruit ({count} lignes)")
+
+
 DOC_LABELS = {
     "identity": "Pièce d'identité (recto/verso) ou passeport",
     "proof_address": "Justificatif de domicile de moins de 3 mois",
@@ -1946,6 +4284,159 @@ CHECKLIST_LABELS = [
 ]
 
 
+# --- Transport HTTP / SMTP réutilisable ---
+# Les envois partent en rafale (file outbox, rappels, non-conformités) : on
+# garde les connexions ouvertes d'un message à l'autre au lieu de refaire
+# TCP + TLS (et STARTTLS + login en SMTP) à chaque envoi.
+
+_TRANSPORT_LOCK = threading.Lock()
+_HTTP_POOLS = {}
+_SMTP_POOL = []
+_TRANSPORT_STATS = {"http_handshakes": 0, "http_reuses": 0, "smtp_handshakes": 0, "smtp_reuses": 0}
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    smtplib.SMTPServerDisconnected,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+def _count_transport(counter: str):
+    with _TRANSPORT_LOCK:
+        _TRANSPORT_STATS[counter] += 1
+
+
+def transport_stats() -> dict:
+    """Compteurs de connexions ouvertes (handshakes) et réutilisées depuis le démarrage."""
+    with _TRANSPORT_LOCK:
+        return dict(_TRANSPORT_STATS)
+
+
+def close_transport_pools():
+    with _TRANSPORT_LOCK:
+        http_conns = [conn for idle in _HTTP_POOLS.values() for conn, _ in idle]
+        smtp_servers = [server for server, _ in _SMTP_POOL]
+        _HTTP_POOLS.clear()
+        _SMTP_POOL.clear()
+    for conn in http_conns:
+        conn.close()
+    for server in smtp_servers:
+        _smtp_close(server)
+
+
+def _http_checkout(key, timeout: float):
+    now = time.monotonic()
+    with _TRANSPORT_LOCK:
+        idle = _HTTP_POOLS.get(key, [])
+        while idle:
+            conn, last_used = idle.pop()
+            if now - last_used < HTTP_POOL_IDLE_SECONDS:
+                _TRANSPORT_STATS["http_reuses"] += 1
+                return conn, True
+            conn.close()
+        _TRANSPORT_STATS["http_handshakes"] += 1
+    scheme, host, port = key
+    connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    return connection_class(host, port, timeout=timeout), False
+
+
+def _http_checkin(key, conn):
+    with _TRANSPORT_LOCK:
+        idle = _HTTP_POOLS.setdefault(key, [])
+        if len(idle) < HTTP_POOL_MAXSIZE:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def _http_post_json(url: str, payload, headers: dict | None = None, timeout: float = 10):
+    """POST JSON sur une connexion keep-alive du pool de l'hôte ; renvoie (status, corps)."""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    body = json.dumps(payload).encode("utf-8")
+    request_headers = {"content-type": "application/json", **(headers or {})}
+
+    while True:
+        conn, reused = _http_checkout(key, timeout)
+        try:
+            conn.request("POST", path, body=body, headers=request_headers)
+            resp = conn.getresponse()
+            response_body = resp.read().decode("utf-8", errors="replace")
+        except (http.client.HTTPException, OSError) as exc:
+            conn.close()
+            # Connexion fermée par le serveur pendant qu'elle dormait dans le pool :
+            # on rejoue sur une connexion neuve.
+            if reused and isinstance(exc, _STALE_CONNECTION_ERRORS):
+                continue
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            _http_checkin(key, conn)
+        return resp.status, response_body
+
+
+def _smtp_close(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+def _smtp_checkout():
+    while True:
+        with _TRANSPORT_LOCK:
+            if not _SMTP_POOL:
+                break
+            server, last_used = _SMTP_POOL.pop()
+        if time.monotonic() - last_used < SMTP_IDLE_CHECK_SECONDS or _smtp_is_alive(server):
+            _count_transport("smtp_reuses")
+            return server, True
+        _smtp_close(server)
+
+    _count_transport("smtp_handshakes")
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10)
+    try:
+        server.starttls()
+        server.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        _smtp_close(server)
+        raise
+    return server, False
+
+
+def _smtp_is_alive(server) -> bool:
+    try:
+        return server.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _smtp_checkin(server):
+    with _TRANSPORT_LOCK:
+        if len(_SMTP_POOL) < SMTP_POOL_MAXSIZE:
+            _SMTP_POOL.append((server, time.monotonic()))
+            return
+    _smtp_close(server)
+
+
+def _smtp_send_message(msg):
+    while True:
+        server, reused = _smtp_checkout()
+        try:
+            server.send_message(msg)
+        except Exception as exc:
+            _smtp_close(server)
+            if reused and isinstance(exc, _STALE_CONNECTION_ERRORS):
+                continue
+            raise
+        _smtp_checkin(server)
+        return
+
+
 def _send_email_html(to_email: str, subject: str, html: str):
     text_content = "Votre client mail ne supporte pas le HTML."
 
@@ -1957,45 +4448,30 @@ def _send_email_html(to_email: str, subject: str, html: str):
         msg.set_content(text_content)
         msg.add_alternative(html, subtype="html")
 
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
+        _smtp_send_message(msg)
         return
 
     if BREVO_API_KEY and BREVO_SENDER_EMAIL:
-        payload = json.dumps(
-            {
-                "sender": {"name": BREVO_SENDER_NAME, "email": BREVO_SENDER_EMAIL},
-                "to": [{"email": to_email}],
-                "subject": subject,
-                "htmlContent": html,
-                "textContent": text_content,
-            }
-        ).encode("utf-8")
-        req = urllib_request.Request(
-            "https://api.brevo.com/v3/smtp/email",
-            data=payload,
-            headers={
-                "accept": "application/json",
-                "api-key": BREVO_API_KEY,
-                "content-type": "application/json",
-            },
-            method="POST",
-        )
+        payload = {
+            "sender": {"name": BREVO_SENDER_NAME, "email": BREVO_SENDER_EMAIL},
+            "to": [{"email": to_email}],
+            "subject": subject,
+            "htmlContent": html,
+            "textContent": text_content,
+        }
         try:
-            with urllib_request.urlopen(req, timeout=10):
-                pass
-        except HTTPError as exc:
-            error_body = ""
-            if exc.fp is not None:
-                error_body = exc.fp.read().decode("utf-8", errors="replace")
+            status, response_body = _http_post_json(
+                f"{BREVO_API_BASE_URL}/v3/smtp/email",
+                payload,
+                headers={"accept": "application/json", "api-key": BREVO_API_KEY},
+            )
+        except (http.client.HTTPException, OSError) as exc:
+            raise RuntimeError(f"Brevo email request failed: {exc}") from exc
+        if status >= 400:
             raise RuntimeError(
-                f"Brevo email rejected request with status={exc.code}: {error_body}"
-            ) from exc
-        except URLError as exc:
-            raise RuntimeError(f"Brevo email request failed: {exc.reason}") from exc
-        return
+                f"Brevo email rejected request with status={status}: {response_body}"
+            )
+        return _provider_message_id(response_body)
 
     print(f"[EMAIL MOCK] to={to_email} subject={subject}")
     print(html)
@@ -2011,45 +4487,33 @@ def _send_sms(to_phone: str, message: str):
 
     if not SMS_WEBHOOK_URL:
         if BREVO_API_KEY and BREVO_SMS_SENDER:
-            payload = json.dumps(
-                {
-                    "sender": BREVO_SMS_SENDER,
-                    "recipient": normalized_phone,
-                    "content": message,
-                    "type": "transactional",
-                }
-            ).encode("utf-8")
-            req = urllib_request.Request(
-                "https://api.brevo.com/v3/transactionalSMS/sms",
-                data=payload,
-                headers={
-                    "accept": "application/json",
-                    "api-key": BREVO_API_KEY,
-                    "content-type": "application/json",
-                },
-                method="POST",
-            )
+            payload = {
+                "sender": BREVO_SMS_SENDER,
+                "recipient": normalized_phone,
+                "content": message,
+                "type": "transactional",
+            }
             try:
-                with urllib_request.urlopen(req, timeout=10) as resp:
-                    response_body = resp.read().decode("utf-8", errors="replace")
-                app.logger.info(
-                    "SMS Brevo accepté phone=%s sender=%r response=%s",
-                    normalized_phone,
-                    BREVO_SMS_SENDER,
-                    response_body,
+                status, response_body = _http_post_json(
+                    f"{BREVO_API_BASE_URL}/v3/transactionalSMS/sms",
+                    payload,
+                    headers={"accept": "application/json", "api-key": BREVO_API_KEY},
                 )
-            except HTTPError as exc:
-                error_body = ""
-                if exc.fp is not None:
-                    error_body = exc.fp.read().decode("utf-8", errors="replace")
+            except (http.client.HTTPException, OSError) as exc:
                 raise RuntimeError(
-                    f"Brevo SMS rejected request status={exc.code} phone={normalized_phone} sender={BREVO_SMS_SENDER!r} response={error_body}"
+                    f"Brevo SMS request failed phone={normalized_phone} sender={BREVO_SMS_SENDER!r} reason={exc}"
                 ) from exc
-            except URLError as exc:
+            if status >= 400:
                 raise RuntimeError(
-                    f"Brevo SMS request failed phone={normalized_phone} sender={BREVO_SMS_SENDER!r} reason={exc.reason}"
-                ) from exc
-            return
+                    f"Brevo SMS rejected request status={status} phone={normalized_phone} sender={BREVO_SMS_SENDER!r} response={response_body}"
+                )
+            app.logger.info(
+                "SMS Brevo accepté phone=%s sender=%r response=%s",
+                normalized_phone,
+                BREVO_SMS_SENDER,
+                response_body,
+            )
+            return _provider_message_id(response_body)
 
         if ALLOW_SMS_MOCK:
             print(f"[SMS MOCK] to={normalized_phone}")
@@ -2061,33 +4525,327 @@ def _send_sms(to_phone: str, message: str):
             "ou le couple BREVO_API_KEY + BREVO_SMS_SENDER"
         )
 
-    payload = json.dumps({"to": normalized_phone, "message": message}).encode("utf-8")
-    req = urllib_request.Request(
-        SMS_WEBHOOK_URL,
-        data=payload,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
     try:
-        with urllib_request.urlopen(req, timeout=10) as resp:
-            response_body = resp.read().decode("utf-8", errors="replace")
-        app.logger.info(
-            "SMS webhook accepté phone=%s url=%r response=%s",
-            normalized_phone,
+        status, response_body = _http_post_json(
             SMS_WEBHOOK_URL,
-            response_body,
+            {"to": normalized_phone, "message": message},
         )
-    except HTTPError as exc:
-        error_body = ""
-        if exc.fp is not None:
-            error_body = exc.fp.read().decode("utf-8", errors="replace")
+    except (http.client.HTTPException, OSError) as exc:
         raise RuntimeError(
-            f"SMS webhook rejected request status={exc.code} phone={normalized_phone} url={SMS_WEBHOOK_URL!r} response={error_body}"
+            f"SMS webhook request failed phone={normalized_phone} url={SMS_WEBHOOK_URL!r} reason={exc}"
         ) from exc
-    except URLError as exc:
+    if status >= 400:
         raise RuntimeError(
-            f"SMS webhook request failed phone={normalized_phone} url={SMS_WEBHOOK_URL!r} reason={exc.reason}"
-        ) from exc
+            f"SMS webhook rejected request status={status} phone={normalized_phone} url={SMS_WEBHOOK_URL!r} response={response_body}"
+        )
+    app.logger.info(
+        "SMS webhook accepté phone=%s url=%r response=%s",
+        normalized_phone,
+        SMS_WEBHOOK_URL,
+        response_body,
+    )
+    return _provider_message_id(response_body)
+
+
+def _provider_message_id(response_body: str):
+    try:
+        message_id = json.loads(response_body or "{}").get("messageId")
+    except (ValueError, AttributeError):
+        return None
+    return str(message_id) if message_id is not None else None
+
+
+def _batch_result(send, *args):
+    try:
+        return {"ok": True, "message_id": send(*args)}
+    except Exception as exc:
+        return {"ok": False, "error": str(exc) or exc.__class__.__name__}
+
+
+class _BrevoBatchRejected(RuntimeError):
+    """Appel messageVersions refusé en 4xx : souvent un seul destinataire fautif."""
+
+
+def _send_brevo_email_versions(subject: str, messages):
+    """Un seul appel Brevo pour plusieurs destinataires (messageVersions) ; renvoie les messageIds."""
+    base_html = messages[0][1]
+    versions = []
+    for to_email, html in messages:
+        version = {"to": [{"email": to_email}]}
+        if html != base_html:
+            version["htmlContent"] = html
+        versions.append(version)
+    payload = {
+        "sender": {"name": BREVO_SENDER_NAME, "email": BREVO_SENDER_EMAIL},
+        "subject": subject,
+        "htmlContent": base_html,
+        "textContent": "Votre client mail ne supporte pas le HTML.",
+        "messageVersions": versions,
+    }
+    try:
+        status, response_body = _http_post_json(
+            f"{BREVO_API_BASE_URL}/v3/smtp/email",
+            payload,
+            headers={"accept": "application/json", "api-key": BREVO_API_KEY},
+            timeout=30,
+        )
+    except (http.client.HTTPException, OSError) as exc:
+        raise RuntimeError(f"Brevo email batch request failed: {exc}") from exc
+    if 400 <= status < 500 and status != 429:
+        raise _BrevoBatchRejected(f"Brevo email batch rejected request with status={status}: {response_body}")
+    if status >= 400:
+        raise RuntimeError(f"Brevo email batch rejected request with status={status}: {response_body}")
+    try:
+        message_ids = json.loads(response_body or "{}").get("messageIds") or []
+    except (ValueError, AttributeError):
+        message_ids = []
+    if len(message_ids) != len(messages):
+        message_ids = [None] * len(messages)
+    return [str(message_id) if message_id is not None else None for message_id in message_ids]
+
+
+def _send_email_batch(messages, batch_size: int | None = None):
+    """Envoie une liste de (to_email, subject, html) ; renvoie un résultat par message, dans l'ordre.
+
+    Chaque résultat vaut {"ok": True, "message_id": ...} ou {"ok": False, "error": ...}.
+    Avec Brevo, les messages d'un même gabarit (même sujet) partent en appels
+    groupés de `batch_size` destinataires ; en SMTP ou en mode mock, un envoi
+    par message sur la session réutilisée. Un lot refusé en 4xx est renvoyé
+    message par message, pour que seul le destinataire fautif échoue.
+    """
+    batch_size = batch_size or BREVO_BATCH_SIZE
+    uses_brevo = not (SMTP_HOST and SMTP_USER and SMTP_PASSWORD) and BREVO_API_KEY and BREVO_SENDER_EMAIL
+    if not uses_brevo:
+        return [_batch_result(_send_email_html, *message) for message in messages]
+
+    results = [None] * len(messages)
+    by_subject = {}
+    for index, (_, subject, _) in enumerate(messages):
+        by_subject.setdefault(subject, []).append(index)
+
+    for subject, indexes in by_subject.items():
+        for start in range(0, len(indexes), batch_size):
+            chunk = indexes[start:start + batch_size]
+            if len(chunk) == 1:
+                results[chunk[0]] = _batch_result(_send_email_html, *messages[chunk[0]])
+                continue
+            try:
+                message_ids = _send_brevo_email_versions(
+                    subject,
+                    [(messages[i][0], messages[i][2]) for i in chunk],
+                )
+            except _BrevoBatchRejected as exc:
+                app.logger.warning("Lot Brevo refusé, renvoi message par message (%s messages): %s", len(chunk), exc)
+                for index in chunk:
+                    results[index] = _batch_result(_send_email_html, *messages[index])
+                continue
+            except RuntimeError as exc:
+                for index in chunk:
+                    results[index] = {"ok": False, "error": str(exc)}
+                continue
+            for index, message_id in zip(chunk, message_ids):
+                results[index] = {"ok": True, "message_id": message_id}
+    return results
+
+
+def _send_sms_batch(messages):
+    """Envoie une liste de (to_phone, message) ; renvoie un résultat par message, dans l'ordre.
+
+    L'API SMS transactionnelle de Brevo n'accepte qu'un destinataire par appel :
+    les envois sont parallélisés sur les connexions keep-alive du pool HTTP.
+    """
+    if len(messages) <= 1:
+        return [_batch_result(_send_sms, *message) for message in messages]
+    with ThreadPoolExecutor(max_workers=min(HTTP_POOL_MAXSIZE, len(messages))) as executor:
+        return list(executor.map(lambda message: _batch_result(_send_sms, *message), messages))
+
+
+# --- File d'envoi (outbox) ---
+# Les routes n'appellent plus _send_email_html / _send_sms directement : elles
+# insèrent le message dans la table outbox, dans la même transaction que leurs
+# propres écritures. Des threads d'envoi (start_outbox_workers) réservent les
+# messages par lots de BREVO_BATCH_SIZE, les envoient puis les acquittent un à un ;
+# le bail couvre un envoi séquentiel de tout le lot, pour qu'un autre worker ne
+# reprenne pas des messages encore en cours. Un échec est retenté avec un délai
+# exponentiel, puis passé en 'dead' après OUTBOX_MAX_ATTEMPTS.
+
+_outbox_wakeup = threading.Event()
+_outbox_workers_pid = None
+
+
+def _enqueue_message(conn, channel: str, recipient: str, body: str, subject: str | None = None,
+                     request_id: int | None = None, kind: str | None = None) -> int:
+    cur = conn.execute(
+        """
+        INSERT INTO outbox (channel, recipient, subject, body, request_id, kind, next_attempt_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (channel, recipient, subject, body, request_id, kind, time.time()),
+    )
+    if has_app_context():
+        g.outbox_enqueued = True
+    else:
+        _outbox_wakeup.set()
+    return cur.lastrowid
+
+
+def _enqueue_email(conn, to_email: str, subject: str, html: str, request_id: int | None = None, kind: str | None = None):
+    to_email = (to_email or "").strip()
+    if not to_email:
+        raise RuntimeError("Adresse email manquante pour l'envoi email")
+    return _enqueue_message(conn, "email", to_email, html, subject=subject, request_id=request_id, kind=kind)
+
+
+def _enqueue_sms(conn, to_phone: str, message: str, request_id: int | None = None, kind: str | None = None):
+    # Mêmes contrôles que _send_sms : un numéro invalide ne sera jamais envoyé,
+    # inutile de le retenter depuis la file.
+    if not to_phone:
+        raise RuntimeError("Numéro de téléphone manquant pour l'envoi SMS")
+    normalized_phone = _normalize_phone_number(to_phone)
+    if not normalized_phone:
+        raise RuntimeError(f"Numéro de téléphone invalide: {to_phone!r}")
+    return _enqueue_message(conn, "sms", normalized_phone, message, request_id=request_id, kind=kind)
+
+
+def _claim_outbox_messages(conn, worker: str, limit: int = 1):
+    """Réserve jusqu'à `limit` messages échus (ou abandonnés par un worker mort)."""
+    now = time.time()
+    lease = max(OUTBOX_CLAIM_TIMEOUT_SECONDS, limit * OUTBOX_SEND_TIMEOUT_SECONDS)
+    rows = conn.execute(
+        """
+        UPDATE outbox
+        SET status = 'sending',
+            attempts = attempts + 1,
+            locked_by = ?,
+            locked_until = ?
+        WHERE id IN (
+            SELECT id FROM outbox
+            WHERE (status = 'pending' AND next_attempt_at <= ?)
+               OR (status = 'sending' AND locked_until < ?)
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        )
+        RETURNING *
+        """,
+        (worker, now + lease, now, now, limit),
+    ).fetchall()
+    conn.commit()
+    return sorted(rows, key=lambda row: row["id"])
+
+
+def _ack_outbox_message(conn, message, worker: str, provider_message_id=None):
+    conn.execute(
+        """
+        UPDATE outbox
+        SET status = 'sent', sent_at = datetime('now', 'localtime'), provider_message_id = ?,
+            locked_by = NULL, locked_until = NULL, last_error = NULL
+        WHERE id = ? AND locked_by = ?
+        """,
+        (provider_message_id, message["id"], worker),
+    )
+
+
+def _outbox_retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+
+def _fail_outbox_message(conn, message, worker: str, error: str):
+    attempts = message["attempts"]
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        status, next_attempt_at = "dead", time.time()
+        app.logger.error(
+            "Message outbox abandonné id=%s channel=%s kind=%s request_id=%s après %s tentatives: %s",
+            message["id"], message["channel"], message["kind"], message["request_id"], attempts, error,
+        )
+    else:
+        status, next_attempt_at = "pending", time.time() + _outbox_retry_delay(attempts)
+    conn.execute(
+        """
+        UPDATE outbox
+        SET status = ?, next_attempt_at = ?, last_error = ?, locked_by = NULL, locked_until = NULL
+        WHERE id = ? AND locked_by = ?
+        """,
+        (status, next_attempt_at, error[:2000], message["id"], worker),
+    )
+
+
+def _deliver_outbox_messages(messages):
+    """Envoie un lot réservé ; renvoie un résultat par message (voir _send_email_batch)."""
+    results = [None] * len(messages)
+    by_channel = {}
+    for index, message in enumerate(messages):
+        by_channel.setdefault(message["channel"], []).append(index)
+
+    for channel, indexes in by_channel.items():
+        if channel == "email":
+            channel_results = _send_email_batch(
+                [(messages[i]["recipient"], messages[i]["subject"] or "", messages[i]["body"]) for i in indexes]
+            )
+        elif channel == "sms":
+            channel_results = _send_sms_batch([(messages[i]["recipient"], messages[i]["body"]) for i in indexes])
+        else:
+            channel_results = [{"ok": False, "error": f"Canal outbox inconnu: {channel!r}"}] * len(indexes)
+        for index, result in zip(indexes, channel_results):
+            results[index] = result
+    return results
+
+
+def drain_outbox(worker: str, max_messages: int | None = None) -> int:
+    """Envoie les messages échus par lots jusqu'à vider la file ; renvoie le nombre traité."""
+    processed = 0
+    with closing(_connect_db()) as conn:
+        while max_messages is None or processed < max_messages:
+            limit = BREVO_BATCH_SIZE if max_messages is None else min(BREVO_BATCH_SIZE, max_messages - processed)
+            messages = _claim_outbox_messages(conn, worker, limit)
+            if not messages:
+                break
+            for message, result in zip(messages, _deliver_outbox_messages(messages)):
+                if result["ok"]:
+                    _ack_outbox_message(conn, message, worker, result.get("message_id"))
+                    continue
+                app.logger.warning(
+                    "Echec envoi outbox id=%s channel=%s tentative=%s: %s",
+                    message["id"], message["channel"], message["attempts"], result["error"],
+                )
+                _fail_outbox_message(conn, message, worker, result["error"])
+            conn.commit()
+            processed += len(messages)
+    if processed:
+        app.logger.info("Outbox %s : %s message(s) traité(s), transport=%s", worker, processed, transport_stats())
+    return processed
+
+
+def _outbox_worker_loop(worker: str):
+    while True:
+        try:
+            drain_outbox(worker)
+        except Exception:
+            app.logger.exception("Erreur du worker outbox %s", worker)
+        _outbox_wakeup.wait(OUTBOX_POLL_SECONDS)
+        _outbox_wakeup.clear()
+
+
+def start_outbox_workers(count: int | None = None):
+    """Démarre les threads d'envoi de ce processus (idempotent)."""
+    global _outbox_workers_pid
+    count = OUTBOX_WORKERS if count is None else count
+    if count <= 0 or _outbox_workers_pid == os.getpid():
+        return
+    _outbox_workers_pid = os.getpid()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    for index in range(count):
+        threading.Thread(
+            target=_outbox_worker_loop,
+            args=(f"{prefix}:outbox-{index}",),
+            name=f"outbox-sender-{index}",
+            daemon=True,
+        ).start()
+
+
+@app.cli.command("outbox-worker")
+def outbox_worker_command():
+    """Vide la file d'envoi en continu au premier plan (processus dédié)."""
+    _outbox_worker_loop(f"{socket.gethostname()}:{os.getpid()}:cli")
 
 
 def _build_espace_cnaps_created_sms(prenom: str, formation_name: str, validation_url: str):
@@ -2187,65 +4945,133 @@ def _required_doc_types(heberge: int, non_francais: int):
     return required
 
 
-def _send_cnaps_reminders(conn, requests_rows):
-    if not _is_cnaps_auto_reminder_allowed():
-        return
+def _next_cnaps_reminder_window(now_dt: datetime) -> datetime:
+    """Prochaine ouverture de la plage d'envoi automatique (7h-21h, heure de Paris)."""
+    current = now_dt.astimezone(FRANCE_TZ)
+    opening = current.replace(hour=7, minute=0, second=0, microsecond=0)
+    if current.hour >= 7:
+        opening += timedelta(days=1)
+    return opening
+
+
+def _deliver_cnaps_reminder(conn, req, reminder_kind: str, expiration_label: str):
+    """Met en file l'email et le SMS du rappel 4h/2h (envoyés par les workers outbox).
+
+    Un téléphone manquant ou invalide n'empêche pas l'email : le SMS est ignoré
+    avec un avertissement. Renvoie les canaux effectivement mis en file.
+    """
+    kind = f"cnaps_reminder_{reminder_kind}"
+    formation_name = _formation_full_name(req.get("formation"))
+    recipient_email = (req.get("email") or "").strip()
+    queued = []
+
+    if reminder_kind == "4h":
+        template, subject = "emails/espace_cnaps_rappel_4h.html", "⚠️ Validation CNAPS à faire avant expiration"
+        sms = _cnaps_sms_message(req, expiration_label)
+    else:
+        template, subject = "emails/espace_cnaps_rappel_2h.html", "🚨 URGENT – Validation CNAPS avant expiration"
+        sms = _cnaps_sms_message(req, expiration_label, urgent=True)
+
+    if recipient_email:
+        html = render_template(
+            template,
+            formation_name=formation_name,
+            logo_url=url_for("static", filename="logo.png", _external=True),
+            dracar_url=url_for("static", filename="dracar.png", _external=True),
+        )
+        _enqueue_email(conn, recipient_email, subject, html, request_id=req["id"], kind=kind)
+        queued.append("email")
+    try:
+        _enqueue_sms(conn, req.get("telephone"), sms, request_id=req["id"], kind=kind)
+    except RuntimeError as exc:
+        app.logger.warning(
+            "SMS rappel CNAPS non mis en file request_id=%s reminder=%s telephone=%r error=%s",
+            req["id"],
+            reminder_kind,
+            req.get("telephone"),
+            exc,
+        )
+    else:
+        queued.append("sms")
+    return queued
+
+
+def _load_cnaps_reminder_candidates(conn):
+    telephone_expr = _request_phone_select_expr(conn)
+    rows = conn.execute(
+        f"""
+        SELECT pr.*, {telephone_expr} AS telephone
+        FROM public_requests pr
+        LEFT JOIN dossiers d ON d.id = pr.dossier_id
+        WHERE pr.espace_cnaps = 'Créé'
+          AND (
+              COALESCE(pr.cnaps_reminder_4h_sent_at, '') = ''
+              OR COALESCE(pr.cnaps_reminder_2h_sent_at, '') = ''
+          )
+        """
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _send_cnaps_reminders(conn, requests_rows, now_dt: datetime | None = None):
+    """Met en file les rappels 4h/2h échus et renvoie la prochaine échéance à surveiller.
+
+    La réservation du rappel (UPDATE conditionnel) et la mise en file des
+    messages sont validées dans la même transaction : un rappel n'est donc
+    jamais marqué envoyé sans ses messages, ni mis en file deux fois.
+    """
+    now = now_dt or _now_france()
+    next_due = None
+
+    def _watch(due_at):
+        nonlocal next_due
+        if next_due is None or due_at < next_due:
+            next_due = due_at
 
     for req in requests_rows:
         if (req.get("espace_cnaps") or "") != "Créé":
             continue
 
         timing = _compute_cnaps_timing(req)
-        remaining = timing["cnaps_remaining"]
-        if remaining is None or timing["cnaps_is_expired"]:
-            continue
-
-        remaining_seconds = remaining.total_seconds()
-        first_due = remaining_seconds <= 4 * 3600 and not req.get("cnaps_reminder_4h_sent_at")
-        second_due = remaining_seconds <= 2 * 3600 and not req.get("cnaps_reminder_2h_sent_at")
-        if not first_due and not second_due:
+        expiration_dt = timing["cnaps_expiration_dt"]
+        if expiration_dt is None or expiration_dt <= now:
             continue
 
-        formation_name = _formation_full_name(req.get("formation"))
-        expiration_label = timing["cnaps_expiration_label"]
-        recipient_email = (req.get("email") or "").strip()
-        now_db = _to_db_datetime(_now_france())
-
-        if first_due:
-            if recipient_email:
-                html = render_template(
-                    "emails/espace_cnaps_rappel_4h.html",
-                    formation_name=formation_name,
-                    logo_url=url_for("static", filename="logo.png", _external=True),
-                    dracar_url=url_for("static", filename="dracar.png", _external=True),
-                )
-                _send_email_html(recipient_email, "⚠️ Validation CNAPS à faire avant expiration", html)
-            _send_sms(
-                req.get("telephone"),
-                _cnaps_sms_message(req, expiration_label),
-            )
-            conn.execute(
-                "UPDATE public_requests SET cnaps_reminder_4h_sent_at = ? WHERE id = ?",
-                (now_db, req["id"]),
+        for reminder_kind, hours_before in (("4h", 4), ("2h", 2)):
+            column = f"cnaps_reminder_{reminder_kind}_sent_at"
+            if req.get(column):
+                continue
+
+            due_at = expiration_dt - timedelta(hours=hours_before)
+            if due_at > now:
+                _watch(due_at if _is_cnaps_auto_reminder_allowed(due_at) else _next_cnaps_reminder_window(due_at))
+                continue
+            if not _is_cnaps_auto_reminder_allowed(now):
+                _watch(_next_cnaps_reminder_window(now))
+                continue
+
+            claimed = conn.execute(
+                f"UPDATE public_requests SET {column} = ? WHERE id = ? AND COALESCE({column}, '') = ''",
+                (_to_db_datetime(now), req["id"]),
             )
+            if claimed.rowcount == 0:
+                conn.commit()
+                continue
 
-        if second_due:
-            if recipient_email:
-                html = render_template(
-                    "emails/espace_cnaps_rappel_2h.html",
-                    formation_name=formation_name,
-                    logo_url=url_for("static", filename="logo.png", _external=True),
-                    dracar_url=url_for("static", filename="dracar.png", _external=True),
+            try:
+                _deliver_cnaps_reminder(conn, req, reminder_kind, timing["cnaps_expiration_label"])
+            except Exception:
+                app.logger.exception(
+                    "Echec mise en file rappel automatique CNAPS request_id=%s reminder=%s",
+                    req["id"],
+                    reminder_kind,
                 )
-                _send_email_html(recipient_email, "🚨 URGENT – Validation CNAPS avant expiration", html)
-            _send_sms(
-                req.get("telephone"),
-                _cnaps_sms_message(req, expiration_label, urgent=True),
-            )
-            conn.execute(
-                "UPDATE public_requests SET cnaps_reminder_2h_sent_at = ? WHERE id = ?",
-                (now_db, req["id"]),
-            )
+                conn.rollback()
+                _watch(now + timedelta(seconds=REMINDER_SCHEDULER_RETRY_SECONDS))
+            else:
+                conn.commit()
+
+    return next_due
 
 
 def _send_cnaps_manual_reminder(conn, req, reminder_kind: str):
@@ -2254,48 +5080,90 @@ def _send_cnaps_manual_reminder(conn, req, reminder_kind: str):
 
     timing = _compute_cnaps_timing(req)
     expiration_label = timing["cnaps_expiration_label"] or _cnaps_expiration_label(_now_france() + timedelta(hours=12))
-    formation_name = _formation_full_name(req.get("formation"))
-    recipient_email = (req.get("email") or "").strip()
     now_db = _to_db_datetime(_now_france())
 
-    if reminder_kind == "4h":
-        if recipient_email:
-            html = render_template(
-                "emails/espace_cnaps_rappel_4h.html",
-                formation_name=formation_name,
-                logo_url=url_for("static", filename="logo.png", _external=True),
-                dracar_url=url_for("static", filename="dracar.png", _external=True),
-            )
-            _send_email_html(recipient_email, "⚠️ Validation CNAPS à faire avant expiration", html)
+    if not _deliver_cnaps_reminder(conn, req, reminder_kind, expiration_label):
+        raise RuntimeError("Ni email ni téléphone valide pour le rappel")
+    conn.execute(
+        f"UPDATE public_requests SET cnaps_reminder_{reminder_kind}_sent_at = ? WHERE id = ?",
+        (now_db, req["id"]),
+    )
 
-        _send_sms(
-            req.get("telephone"),
-            _cnaps_sms_message(req, expiration_label),
-        )
-        conn.execute(
-            "UPDATE public_requests SET cnaps_reminder_4h_sent_at = ? WHERE id = ?",
-            (now_db, req["id"]),
-        )
-    else:
-        if recipient_email:
-            html = render_template(
-                "emails/espace_cnaps_rappel_2h.html",
-                formation_name=formation_name,
-                logo_url=url_for("static", filename="logo.png", _external=True),
-                dracar_url=url_for("static", filename="dracar.png", _external=True),
-            )
-            _send_email_html(recipient_email, "🚨 URGENT – Validation CNAPS avant expiration", html)
+    return _cnaps_expiration_label(_parse_db_datetime(now_db))
 
-        _send_sms(
-            req.get("telephone"),
-            _cnaps_sms_message(req, expiration_label, urgent=True),
-        )
-        conn.execute(
-            "UPDATE public_requests SET cnaps_reminder_2h_sent_at = ? WHERE id = ?",
-            (now_db, req["id"]),
-        )
 
-    return _cnaps_expiration_label(_parse_db_datetime(now_db))
+# --- Planificateur des rappels CNAPS ---
+# Un thread par worker gunicorn ; un bail en base (scheduler_leases) désigne
+# le seul worker qui envoie réellement les rappels.
+
+_reminder_scheduler_wakeup = threading.Event()
+_reminder_scheduler_pid = None
+
+
+def _acquire_scheduler_lease(conn, name: str, owner: str, lease_seconds: int) -> bool:
+    now = time.time()
+    cur = conn.execute(
+        """
+        INSERT INTO scheduler_leases (name, owner, expires_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            owner = excluded.owner,
+            expires_at = excluded.expires_at
+        WHERE scheduler_leases.owner = excluded.owner
+           OR scheduler_leases.expires_at < ?
+        """,
+        (name, owner, now + lease_seconds, now),
+    )
+    conn.commit()
+    return cur.rowcount > 0
+
+
+def run_cnaps_reminder_scheduler_once(owner: str) -> float:
+    """Un tour du planificateur ; renvoie le nombre de secondes avant le prochain tour."""
+    lease_renewal = REMINDER_SCHEDULER_LEASE_SECONDS / 2
+    with closing(_connect_db()) as conn:
+        if not _acquire_scheduler_lease(conn, "cnaps_reminders", owner, REMINDER_SCHEDULER_LEASE_SECONDS):
+            return lease_renewal
+
+        # url_for(_external=True) dans les gabarits d'email exige un contexte de requête.
+        with app.test_request_context(base_url=PUBLIC_APP_BASE_URL):
+            next_due = _send_cnaps_reminders(conn, _load_cnaps_reminder_candidates(conn))
+
+    if next_due is None:
+        return lease_renewal
+    return min(lease_renewal, max(1.0, (next_due - _now_france()).total_seconds()))
+
+
+def _reminder_scheduler_loop(owner: str):
+    while True:
+        try:
+            delay = run_cnaps_reminder_scheduler_once(owner)
+        except Exception:
+            app.logger.exception("Erreur du planificateur de rappels CNAPS owner=%s", owner)
+            delay = REMINDER_SCHEDULER_RETRY_SECONDS
+        _reminder_scheduler_wakeup.wait(delay)
+        _reminder_scheduler_wakeup.clear()
+
+
+def start_reminder_scheduler():
+    """Démarre le thread de rappels CNAPS de ce processus (idempotent)."""
+    global _reminder_scheduler_pid
+    if not REMINDER_SCHEDULER_ENABLED or _reminder_scheduler_pid == os.getpid():
+        return
+    _reminder_scheduler_pid = os.getpid()
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    threading.Thread(
+        target=_reminder_scheduler_loop,
+        args=(owner,),
+        name="cnaps-reminder-scheduler",
+        daemon=True,
+    ).start()
+
+
+@app.cli.command("reminder-scheduler")
+def reminder_scheduler_command():
+    """Lance le planificateur de rappels CNAPS au premier plan (processus dédié)."""
+    _reminder_scheduler_loop(f"{socket.gethostname()}:{os.getpid()}:cli")
 
 
 def _sanitize_zip_component(value: str) -> str:
@@ -2304,6 +5172,83 @@ def _sanitize_zip_component(value: str) -> str:
     return "_".join(cleaned.split())
 
 
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+# Formats déjà compressés : les recompresser coûte du CPU sans rien gagner.
+ZIP_STORED_EXTENSIONS = frozenset({".pdf", ".jpg", ".jpeg", ".png", ".webp", ".heic", ".zip"})
+
+
+class _ZipStreamBuffer:
+    """Sortie non seekable de ZipFile : garde les octets écrits jusqu'au prochain yield."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_compress_type(arcname: str) -> int:
+    if os.path.splitext(arcname)[1].lower() in ZIP_STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _iter_zip_stream(entries):
+    """Produit une archive ZIP morceau par morceau.
+
+    `entries` est un itérable de (arcname, source) : un chemin lu par blocs de
+    ZIP_STREAM_CHUNK_SIZE, des octets, ou un callable renvoyant l'un ou l'autre,
+    appelé seulement quand l'entrée est écrite. Sans seek, ZipFile place tailles et
+    CRC dans un descripteur après les données : rien n'est gardé en mémoire au-delà
+    d'un bloc.
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for arcname, source in entries:
+            if callable(source):
+                source = source()
+            if isinstance(source, bytes):
+                zinfo = zipfile.ZipInfo(arcname, date_time=datetime.now().timetuple()[:6])
+                zinfo.compress_type = _zip_compress_type(arcname)
+                zf.writestr(zinfo, source)
+            else:
+                zinfo = zipfile.ZipInfo.from_file(source, arcname)
+                zinfo.compress_type = _zip_compress_type(arcname)
+                with open(source, "rb") as src, zf.open(zinfo, "w") as dest:
+                    while chunk := src.read(ZIP_STREAM_CHUNK_SIZE):
+                        dest.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    # Répertoire central, écrit à la fermeture.
+    yield buffer.drain()
+
+
+def _attachment_disposition(download_name: str) -> str:
+    """En-tête Content-Disposition (RFC 6266) tolérant les noms accentués, construit comme send_file."""
+    try:
+        download_name.encode("ascii")
+    except UnicodeEncodeError:
+        fallback = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        options = {"filename": fallback, "filename*": f"UTF-8''{quote(download_name, safe='!#$&+^`|~')}"}
+    else:
+        options = {"filename": download_name}
+    # dump_options_header échappe « " » et « \ » des noms saisis (nom, prénom).
+    return dump_options_header("attachment", options)
+
+
 def _secure_store(file_storage, subfolder):
     original = file_storage.filename or "document"
     ext = os.path.splitext(original)[1]
@@ -2336,9 +5281,9 @@ def _find_recent_duplicate_request(conn, nom, prenom, email, date_naissance, tel
             d.statut_cnaps
         FROM public_requests pr
         LEFT JOIN dossiers d ON d.id = pr.dossier_id
-        WHERE LOWER(TRIM(pr.nom)) = LOWER(TRIM(?))
+        WHERE pr.email_norm = ?
+          AND LOWER(TRIM(pr.nom)) = LOWER(TRIM(?))
           AND LOWER(TRIM(pr.prenom)) = LOWER(TRIM(?))
-          AND LOWER(TRIM(pr.email)) = LOWER(TRIM(?))
           AND TRIM(pr.date_naissance) = TRIM(?)
           AND REPLACE(REPLACE(TRIM(COALESCE(pr.telephone, '')), ' ', ''), '.', '') = REPLACE(REPLACE(TRIM(?), ' ', ''), '.', '')
           AND (
@@ -2348,7 +5293,7 @@ def _find_recent_duplicate_request(conn, nom, prenom, email, date_naissance, tel
         ORDER BY pr.id DESC
         LIMIT 1
         """,
-        (nom, prenom, email, date_naissance, telephone),
+        (_normalize_lookup_email(email), nom, prenom, date_naissance, telephone),
     ).fetchone()
 
 
@@ -2403,8 +5348,7 @@ def public_form():
                 return _render_with_error(f"Le document {f.filename} dépasse 5 Mo. Taille maximale autorisée : 5 Mo.")
         uploaded[doc_type] = cleaned
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         duplicate_request = _find_recent_duplicate_request(
             conn,
             nom,
@@ -2452,6 +5396,8 @@ def public_form():
             (dossier_id, nom, prenom, email, date_naissance, heberge, non_francais, telephone, _new_validation_token()),
         )
         request_id = cur.lastrowid
+        _store_lookup_norms(conn, "dossiers", [dossier_id])
+        _store_lookup_norms(conn, "public_requests", [request_id])
 
         for doc_type, files in uploaded.items():
             for f in files:
@@ -2464,17 +5410,20 @@ def public_form():
                     (request_id, doc_type, original, stored, rel_path),
                 )
 
-    email_html = render_template(
-        "emails/confirmation_depot.html",
-        prenom=prenom,
-        logo_url=url_for("static", filename="logo.png", _external=True),
-        dracar_url=url_for("static", filename="dracar.png", _external=True),
-    )
-    _send_email_html(
-        email,
-        "Confirmation de dépôt dossier CNAPS",
-        email_html,
-    )
+        email_html = render_template(
+            "emails/confirmation_depot.html",
+            prenom=prenom,
+            logo_url=url_for("static", filename="logo.png", _external=True),
+            dracar_url=url_for("static", filename="dracar.png", _external=True),
+        )
+        _enqueue_email(
+            conn,
+            email,
+            "Confirmation de dépôt dossier CNAPS",
+            email_html,
+            request_id=request_id,
+            kind="confirmation_depot",
+        )
 
     return render_template("public_form_success.html", prenom=prenom)
 
@@ -2486,41 +5435,194 @@ def api_a_traiter():
         return jsonify({"success": False, "error": "UNAUTHORIZED"}), 401
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            rows_dict = _load_a_traiter_dataset(conn)
-            _send_cnaps_reminders(conn, rows_dict)
-            for row in rows_dict:
-                timing = _compute_cnaps_timing(row)
-                row.update(timing)
-                if row.get("espace_cnaps") == "Validé":
-                    row["cnaps_is_expired"] = False
+        query = _parse_api_a_traiter_args(request.args)
+    except ValueError as exc:
+        return jsonify({"success": False, "error": "INVALID_PARAMETER", "message": str(exc)}), 400
+
+    limit = query["limit"]
+    try:
+        with get_db() as conn:
+            # Horloge de la base, comme updated_at : à renvoyer tel quel dans `since`.
+            watermark = conn.execute("SELECT datetime('now','localtime')").fetchone()[0]
+            total = _count_a_traiter_dataset(conn, query["filters"])
+            # Une ligne de plus que la page pour savoir s'il reste une suite.
+            rows_dict = _load_a_traiter_dataset(
+                conn,
+                filters=query["filters"],
+                sort=query["sort"],
+                descending=query["descending"],
+                cursor=query["cursor"],
+                limit=limit + 1 if limit is not None else None,
+            )
+            next_cursor = None
+            if limit is not None and len(rows_dict) > limit:
+                rows_dict = rows_dict[:limit]
+                next_cursor = _encode_keyset_cursor(query["sort"], rows_dict[-1])
+
+            _apply_cnaps_timing(rows_dict)
+
+            deleted = None
+            if query["since"] is not None:
+                # Les suppressions ne sont listées qu'en tête de pagination.
+                deleted = _load_a_traiter_tombstones(conn, query["since"]) if query["cursor"] is None else []
 
         api_rows = [_to_json_safe(_filter_api_a_traiter_row(row)) for row in rows_dict]
     except Exception:
         logging.exception("Unexpected error while preparing /api/a-traiter response")
         return jsonify({"success": False, "error": "INTERNAL_ERROR"}), 500
 
-    return jsonify({"success": True, "requests": api_rows})
+    payload = {
+        "success": True,
+        "requests": api_rows,
+        "total": total,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "watermark": watermark,
+    }
+    if deleted is not None:
+        payload["deleted"] = deleted
+
+    response = jsonify(payload)
+    # ETag faible : cnaps_remaining et watermark changent à chaque seconde
+    # sans que les données aient bougé.
+    response.set_etag(_api_a_traiter_etag(payload), weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def _apply_cnaps_timing(rows):
+    for row in rows:
+        timing = _compute_cnaps_timing(row)
+        row.update(timing)
+        if row.get("espace_cnaps") == "Validé":
+            row["cnaps_is_expired"] = False
+
+
+A_TRAITER_PAGE_SIZE = 50
 
 
 @app.route("/a-traiter")
 @login_required
 def a_traiter():
-    with sqlite3.connect(DB_NAME) as conn:
-        rows_dict = _load_a_traiter_dataset(conn)
-        _send_cnaps_reminders(conn, rows_dict)
-        for row in rows_dict:
-            timing = _compute_cnaps_timing(row)
-            row.update(timing)
-            if row.get("espace_cnaps") == "Validé":
-                row["cnaps_is_expired"] = False
-
+    # Coquille seule : les lignes arrivent par pages depuis /a-traiter/rows.json.
     return render_template(
         "a_traiter.html",
-        requests=rows_dict,
         formation_sessions=get_formation_sessions(),
+        page_size=A_TRAITER_PAGE_SIZE,
+    )
+
+
+@app.route("/a-traiter/rows.json")
+@login_required
+def a_traiter_rows():
+    """Une page de lignes /a-traiter (HTML des <tr>), filtres et curseur de /api/a-traiter."""
+    args = request.args.copy()
+    args.setdefault("limit", str(A_TRAITER_PAGE_SIZE))
+    try:
+        query = _parse_api_a_traiter_args(args)
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    limit = query["limit"]
+    with get_db() as conn:
+        rows_dict = _load_a_traiter_dataset(
+            conn,
+            filters=query["filters"],
+            sort=query["sort"],
+            descending=query["descending"],
+            cursor=query["cursor"],
+            limit=limit + 1,
+        )
+        # Le total n'est compté qu'à la première page.
+        total = _count_a_traiter_dataset(conn, query["filters"]) if query["cursor"] is None else None
+
+    next_cursor = None
+    if len(rows_dict) > limit:
+        rows_dict = rows_dict[:limit]
+        next_cursor = _encode_keyset_cursor(query["sort"], rows_dict[-1])
+    _apply_cnaps_timing(rows_dict)
+
+    html = render_template("a_traiter_rows.html", requests=rows_dict, dracar_auth_url=DRACAR_AUTH_URL)
+    return jsonify({
+        "ok": True,
+        "html": html,
+        "count": len(rows_dict),
+        "total": total,
+        "next_cursor": next_cursor,
+    })
+
+
+@app.route("/a-traiter/counts.json")
+@login_required
+def a_traiter_counts():
+    with get_db() as conn:
+        counts = _load_a_traiter_counts(conn)
+    return jsonify({"ok": True, "counts": counts})
+
+
+def _enqueue_espace_cnaps_created_messages(conn, req, token: str):
+    request_id = req["id"]
+    formation_name = _formation_full_name(req["formation"])
+    validation_url = f"{PUBLIC_APP_BASE_URL}{url_for('validate_espace_cnaps', token=token)}"
+    expiration_time = _cnaps_expiration_label(_now_france() + timedelta(hours=12)).split(" à ")[-1]
+    html = render_template(
+        "emails/espace_cnaps_cree.html",
+        prenom=req["prenom"],
+        formation_name=formation_name,
+        logo_url=url_for("static", filename="logo.png", _external=True),
+        dracar2_url=url_for("static", filename="dracar.png", _external=True),
+        validation_url=validation_url,
+        expiration_time=expiration_time,
         dracar_auth_url=DRACAR_AUTH_URL,
     )
+    recipient_email = (req["email"] or "").strip()
+    if recipient_email:
+        _enqueue_email(
+            conn,
+            recipient_email,
+            "⚠️ Formation sécurité Validation de votre compte CNAPS",
+            html,
+            request_id=request_id,
+            kind="espace_cnaps_cree",
+        )
+    else:
+        app.logger.warning(
+            "Email manquant pour l'envoi espace CNAPS request_id=%s",
+            request_id,
+        )
+
+    # espace_cnaps_created_sms_sent_at marque la mise en file du SMS : évite un doublon
+    # si la transition est rejouée.
+    claimed = conn.execute(
+        """
+        UPDATE public_requests
+        SET espace_cnaps_created_sms_sent_at = ?
+        WHERE id = ?
+          AND (espace_cnaps_created_sms_sent_at IS NULL OR TRIM(espace_cnaps_created_sms_sent_at) = '')
+        """,
+        (_to_db_datetime(_now_france()), request_id),
+    )
+    if claimed.rowcount == 0:
+        app.logger.warning(
+            "SMS deja envoye pour request_id=%s, envoi ignore pour eviter doublon",
+            request_id,
+        )
+        return
+
+    sms = _build_espace_cnaps_created_sms(req["prenom"], formation_name, validation_url)
+    try:
+        _enqueue_sms(conn, req["telephone"], sms, request_id=request_id, kind="espace_cnaps_cree")
+    except RuntimeError as exc:
+        conn.execute(
+            "UPDATE public_requests SET espace_cnaps_created_sms_sent_at = NULL WHERE id = ?",
+            (request_id,),
+        )
+        app.logger.warning(
+            "SMS espace CNAPS non mis en file request_id=%s telephone=%r error=%s",
+            request_id,
+            req["telephone"],
+            exc,
+        )
 
 
 @app.route("/a-traiter/<int:request_id>/espace-cnaps", methods=["POST"])
@@ -2535,8 +5637,7 @@ def update_espace_cnaps(request_id):
     if nouvel_etat not in {"A créer", "Créé", "Validé"}:
         return jsonify({"ok": False, "error": "Valeur invalide"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         telephone_expr = _request_phone_select_expr(conn)
         req = conn.execute(
             f"""
@@ -2586,77 +5687,18 @@ def update_espace_cnaps(request_id):
             tuple(params),
         )
 
-    if old_status != "Créé" and nouvel_etat == "Créé":
-        formation_name = _formation_full_name(req["formation"])
-        expiration_time = _cnaps_expiration_label(_now_france() + timedelta(hours=12)).split(" à ")[-1]
-        html = render_template(
-            "emails/espace_cnaps_cree.html",
-            prenom=req["prenom"],
-            formation_name=formation_name,
-            logo_url=url_for("static", filename="logo.png", _external=True),
-            dracar2_url=url_for("static", filename="dracar.png", _external=True),
-            validation_url=f"{PUBLIC_APP_BASE_URL}{url_for('validate_espace_cnaps', token=token)}",
-            expiration_time=expiration_time,
-            dracar_auth_url=DRACAR_AUTH_URL,
-        )
-        recipient_email = (req["email"] or "").strip()
-        if recipient_email:
-            try:
-                _send_email_html(recipient_email, "⚠️ Formation sécurité Validation de votre compte CNAPS", html)
-            except Exception:
-                app.logger.exception(
-                    "Échec envoi email espace CNAPS request_id=%s email=%r",
-                    request_id,
-                    recipient_email,
-                )
+        if old_status != "Créé" and nouvel_etat == "Créé":
+            _enqueue_espace_cnaps_created_messages(conn, req, token)
         else:
             app.logger.warning(
-                "Email manquant pour l'envoi espace CNAPS request_id=%s",
+                "SMS non declenche pour request_id=%s (condition old!=Créé && new==Créé non satisfaite) old=%r new=%r",
                 request_id,
+                old_status,
+                nouvel_etat,
             )
 
-        can_send_sms = False
-        with sqlite3.connect(DB_NAME) as conn_sms:
-            claimed = conn_sms.execute(
-                """
-                UPDATE public_requests
-                SET espace_cnaps_created_sms_sent_at = ?
-                WHERE id = ?
-                  AND (espace_cnaps_created_sms_sent_at IS NULL OR TRIM(espace_cnaps_created_sms_sent_at) = '')
-                """,
-                (_to_db_datetime(_now_france()), request_id),
-            )
-            can_send_sms = claimed.rowcount > 0
-
-        if can_send_sms:
-            validation_url = f"{PUBLIC_APP_BASE_URL}{url_for('validate_espace_cnaps', token=token)}"
-            sms = _build_espace_cnaps_created_sms(req["prenom"], formation_name, validation_url)
-            try:
-                _send_sms(req["telephone"], sms)
-            except Exception as exc:
-                with sqlite3.connect(DB_NAME) as conn_sms:
-                    conn_sms.execute(
-                        "UPDATE public_requests SET espace_cnaps_created_sms_sent_at = NULL WHERE id = ?",
-                        (request_id,),
-                    )
-                app.logger.exception(
-                    "Échec envoi SMS espace CNAPS request_id=%s telephone=%r error=%s",
-                    request_id,
-                    req["telephone"],
-                    exc,
-                )
-        else:
-            app.logger.warning(
-                "SMS deja envoye pour request_id=%s, envoi ignore pour eviter doublon",
-                request_id,
-            )
-    else:
-        app.logger.warning(
-            "SMS non declenche pour request_id=%s (condition old!=Créé && new==Créé non satisfaite) old=%r new=%r",
-            request_id,
-            old_status,
-            nouvel_etat,
-        )
+    # Nouvelle échéance de rappel possible : le planificateur recalcule son réveil.
+    _reminder_scheduler_wakeup.set()
 
     return ("", 204)
 
@@ -2669,8 +5711,7 @@ def send_cnaps_manual_reminder(request_id):
     if reminder_kind not in {"4h", "2h"}:
         return jsonify({"ok": False, "error": "Type de rappel invalide"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         telephone_expr = _request_phone_select_expr(conn)
         req = conn.execute(
             f"""
@@ -2708,8 +5749,7 @@ def validate_espace_cnaps(token):
     if not clean_token:
         abort(404)
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute(
             "SELECT id, prenom, espace_cnaps FROM public_requests WHERE espace_cnaps_validation_token = ?",
             (clean_token,),
@@ -2740,8 +5780,7 @@ def assign_formation(request_id):
     if formation not in formation_sessions or session_date not in formation_sessions.get(formation, []):
         return jsonify({"ok": False, "error": "Paramètres invalides"}), 400
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute("SELECT dossier_id FROM public_requests WHERE id = ?", (request_id,)).fetchone()
         if not req:
             return jsonify({"ok": False, "error": "Demande introuvable"}), 404
@@ -2756,6 +5795,8 @@ def assign_formation(request_id):
                 (formation, session_date, req["dossier_id"]),
             )
 
+    _queue_attestation_prerender(get_db(), request_id)
+
     if request.is_json:
         return jsonify({"ok": True})
     return redirect(url_for("a_traiter"))
@@ -2764,9 +5805,7 @@ def assign_formation(request_id):
 @app.route("/a-traiter/<int:request_id>/delete", methods=["POST"])
 @login_required
 def delete_a_traiter_line(request_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
+    with get_db() as conn:
         req = conn.execute(
             "SELECT dossier_id FROM public_requests WHERE id = ?",
             (request_id,),
@@ -2781,6 +5820,10 @@ def delete_a_traiter_line(request_id):
             (request_id,),
         )
         conn.execute("DELETE FROM public_requests WHERE id = ?", (request_id,))
+        conn.execute(
+            "INSERT OR REPLACE INTO public_request_tombstones (request_id, dossier_id) VALUES (?, ?)",
+            (request_id, req["dossier_id"]),
+        )
 
         if req["dossier_id"]:
             conn.execute("DELETE FROM statut_cnaps_history WHERE dossier_id = ?", (req["dossier_id"],))
@@ -2792,8 +5835,7 @@ def delete_a_traiter_line(request_id):
 @app.route("/a-traiter/<int:request_id>/documents")
 @login_required
 def request_documents(request_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute("SELECT * FROM public_requests WHERE id = ?", (request_id,)).fetchone()
         if not req:
             flash("Ce dossier n'existe plus ou a déjà été traité.", "warning")
@@ -2864,8 +5906,7 @@ def add_request_document(request_id):
         flash(f"Le document {incoming.filename} dépasse 5 Mo. Taille maximale autorisée : 5 Mo.", "error")
         return redirect(url_for("request_documents", request_id=request_id))
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute("SELECT * FROM public_requests WHERE id = ?", (request_id,)).fetchone()
         if not req:
             flash("Ce dossier n'existe plus ou a déjà été traité.", "warning")
@@ -2903,8 +5944,7 @@ def add_request_document(request_id):
 @app.route("/a-traiter/<int:request_id>/documents/review", methods=["POST"])
 @login_required
 def review_documents(request_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         allowed_missing_doc_types = set(DOC_LABELS.keys())
         selected_missing_doc_types = [
             doc_type
@@ -2941,10 +5981,12 @@ def review_documents(request_id):
             )
 
         conn.execute(
-            "UPDATE public_requests SET missing_doc_types = ? WHERE id = ?",
+            "UPDATE public_requests SET missing_doc_types = ?, updated_at = datetime('now','localtime') WHERE id = ?",
             (json.dumps(selected_missing_doc_types, ensure_ascii=False), request_id),
         )
 
+    _queue_attestation_prerender(get_db(), request_id)
+
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return ("", 204)
 
@@ -2954,8 +5996,7 @@ def review_documents(request_id):
 @app.route("/a-traiter/<int:request_id>/notify", methods=["POST"])
 @login_required
 def notify_non_conformities(request_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         telephone_expr = _request_phone_select_expr(conn)
         req = conn.execute(
             f"""
@@ -3002,11 +6043,18 @@ def notify_non_conformities(request_id):
         )
 
         try:
-            _send_email_html(req["email"], "Documents non conformes - dossier CNAPS", html)
+            _enqueue_email(
+                conn,
+                req["email"],
+                "Documents non conformes - dossier CNAPS",
+                html,
+                request_id=request_id,
+                kind="non_conformite",
+            )
         except RuntimeError:
-            app.logger.exception("Échec envoi email non-conformités request_id=%s", request_id)
+            app.logger.exception("Échec mise en file email non-conformités request_id=%s", request_id)
             flash(
-                "Impossible d'envoyer l'email de non-conformité. Vérifie la configuration email (Brevo/SMTP) et réessaie.",
+                "Impossible d'envoyer l'email de non-conformité : adresse email manquante.",
                 "error",
             )
             return redirect(url_for("request_documents", request_id=request_id))
@@ -3016,11 +6064,12 @@ def notify_non_conformities(request_id):
                 f"Bonjour {req['prenom']}, certains documents de votre dossier CNAPS sont à corriger ou manquants. "
                 f"Merci de les remplacer ici : {replace_url}"
             )
-            _send_sms(req["telephone"], sms)
-        except Exception:
-            app.logger.exception("Échec envoi SMS non-conformités request_id=%s", request_id)
+            _enqueue_sms(conn, req["telephone"], sms, request_id=request_id, kind="non_conformite")
+        except RuntimeError:
+            app.logger.exception("Échec mise en file SMS non-conformités request_id=%s", request_id)
 
         conn.execute("INSERT INTO request_non_conformity_notifications (request_id) VALUES (?)", (request_id,))
+        conn.execute("UPDATE public_requests SET updated_at = datetime('now','localtime') WHERE id = ?", (request_id,))
         doc_ids = [doc["id"] for doc in docs]
         conn.executemany(
             "UPDATE request_documents SET review_status = 'notified_expected' WHERE id = ?",
@@ -3032,8 +6081,7 @@ def notify_non_conformities(request_id):
 
 @app.route("/replace-documents/<int:request_id>", methods=["GET", "POST"])
 def replace_documents(request_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         req = conn.execute("SELECT * FROM public_requests WHERE id = ?", (request_id,)).fetchone()
         if not req:
             abort(404)
@@ -3127,60 +6175,263 @@ def replace_documents(request_id):
     )
 
 
+def _bundle_safe_nom(req) -> str:
+    return f"{req['prenom']}_{req['nom']}".replace(" ", "_")
+
+
+def _load_request_bundle(conn, request_id):
+    """(demande, pièces actives, attestation) du dossier complet d'une demande.
+
+    None si la demande n'existe plus ; ValueError si elle n'est pas téléchargeable.
+    """
+    req = conn.execute("SELECT * FROM public_requests WHERE id = ?", (request_id,)).fetchone()
+    if not req:
+        return None
+
+    docs = conn.execute(
+        "SELECT * FROM request_documents WHERE request_id = ? AND is_active = 1",
+        (request_id,),
+    ).fetchall()
+
+    if not docs or any(d["is_conforme"] != 1 for d in docs):
+        raise ValueError("Tous les documents doivent être conformes avant téléchargement.")
+
+    oversized_docs = []
+    for d in docs:
+        source = os.path.join(UPLOAD_DIR, d["storage_path"])
+        if os.path.exists(source) and os.path.getsize(source) > MAX_DOCUMENT_SIZE_BYTES:
+            oversized_docs.append(d["original_name"])
+
+    if oversized_docs:
+        raise ValueError(
+            "Téléchargement impossible : chaque document doit faire 5 Mo maximum. "
+            f"Document(s) à remplacer : {', '.join(oversized_docs)}"
+        )
+
+    return req, docs, _request_attestation_source(conn, request_id)
+
+
+def _attestation_pdf_bytes(key) -> bytes:
+    # Lu d'emblée : une éviction du cache pendant l'envoi ne doit pas casser l'archive.
+    with open(_attestation_cache_path(key), "rb") as handle:
+        return handle.read()
+
+
+def _request_bundle_entries(req, docs, attestation_pdf=None, folder=""):
+    """Entrées ZIP d'un dossier complet : pièces lues au fil du flux, puis l'attestation déjà rendue."""
+    safe_nom = _bundle_safe_nom(req)
+
+    entries = []
+    for i, doc in enumerate(docs, start=1):
+        source = os.path.join(UPLOAD_DIR, doc["storage_path"])
+        label = _sanitize_zip_component(DOC_LABELS.get(doc["doc_type"], doc["doc_type"]))
+        ext = os.path.splitext(doc["original_name"])[1]
+        arcname = _sanitize_zip_component(f"{i:02d}_{label}_{safe_nom}{ext}")
+        if os.path.exists(source):
+            entries.append((folder + arcname, source))
+
+    if attestation_pdf is not None:
+        entries.append((f"{folder}attestation_preinscription_{safe_nom}.pdf", attestation_pdf))
+    return entries
+
+
 @app.route("/a-traiter/<int:request_id>/download")
 @login_required
 def download_full_bundle(request_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        req = conn.execute("SELECT * FROM public_requests WHERE id = ?", (request_id,)).fetchone()
-        if not req:
+    with get_db() as conn:
+        try:
+            bundle = _load_request_bundle(conn, request_id)
+        except ValueError as exc:
+            return str(exc), 400
+        if bundle is None:
             flash("Ce dossier n'existe plus ou a déjà été traité.", "warning")
             return redirect(url_for("a_traiter"))
 
-        docs = conn.execute(
-            "SELECT * FROM request_documents WHERE request_id = ? AND is_active = 1",
-            (request_id,),
-        ).fetchall()
+    req, docs, attestation = bundle
+    attestation_pdf = None
+    if attestation:
+        # Résolue avant le premier octet : une fois le 200 et les pièces partis, un échec
+        # ne laisserait au client qu'une archive tronquée. Même réponse que /attestation/<id>.
+        try:
+            attestation_pdf = _attestation_pdf_bytes(_cached_attestation_pdf(*attestation))
+        except TimeoutError:
+            return "Attestation en cours de génération, réessayez dans quelques secondes.", 503, {"Retry-After": "5"}
+
+    return Response(
+        _iter_zip_stream(_request_bundle_entries(req, docs, attestation_pdf)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": _attachment_disposition(f"dossier_cnaps_{_bundle_safe_nom(req)}.zip")},
+    )
 
-        if not docs or any(d["is_conforme"] != 1 for d in docs):
-            return "Tous les documents doivent être conformes avant téléchargement.", 400
 
-        oversized_docs = []
-        for d in docs:
-            source = os.path.join(UPLOAD_DIR, d["storage_path"])
-            if os.path.exists(source) and os.path.getsize(source) > MAX_DOCUMENT_SIZE_BYTES:
-                oversized_docs.append(d["original_name"])
-
-        if oversized_docs:
-            return (
-                "Téléchargement impossible : chaque document doit faire 5 Mo maximum. "
-                f"Document(s) à remplacer : {', '.join(oversized_docs)}",
-                400,
-            )
+# --- Export groupé d'une session ---
+# Une archive pour plusieurs stagiaires (une session, ou une liste de demandes), un
+# dossier par stagiaire. Les grandes sélections sont découpées en parties de
+# SESSION_EXPORT_BATCH_SIZE demandes : chaque partie indique la suivante par un jeton
+# de reprise (dernier id exporté, lié à la sélection).
+
+
+def _parse_session_export_args(args):
+    """Lit la sélection (formation + session_date, ou request_id répétés) et le jeton de reprise."""
+    formation = (args.get("formation") or "").strip()
+    session_date = (args.get("session_date") or "").strip()
+    raw_ids = [value.strip() for value in args.getlist("request_id") if value.strip()]
+
+    request_ids = None
+    if raw_ids:
+        if formation or session_date:
+            raise ValueError("request_id ne se combine pas avec formation / session_date")
+        try:
+            request_ids = sorted({int(value) for value in raw_ids})
+        except ValueError:
+            raise ValueError("request_id doit être un entier")
+        if len(request_ids) > INTEGRATION_BATCH_MAX_ITEMS:
+            raise ValueError(f"{INTEGRATION_BATCH_MAX_ITEMS} demandes au maximum")
+        digest = hashlib.sha256(",".join(map(str, request_ids)).encode("ascii")).hexdigest()
+        signature = f"ids:{digest[:16]}"
+    elif formation and session_date:
+        signature = f"session:{formation}:{session_date}"
+    else:
+        raise ValueError("formation et session_date, ou request_id, sont obligatoires")
+
+    after_id = 0
+    if args.get("resume"):
+        token_signature, after_id = _decode_keyset_cursor("export", args["resume"].strip())
+        if token_signature != signature:
+            raise ValueError("resume ne correspond pas à cette sélection")
+
+    return {
+        "formation": formation,
+        "session_date": session_date,
+        "request_ids": request_ids,
+        "signature": signature,
+        "after_id": after_id,
+    }
 
-        dossier = conn.execute("SELECT * FROM dossiers WHERE id = ?", (req["dossier_id"],)).fetchone()
 
-    memory_file = BytesIO()
-    safe_nom = f"{req['prenom']}_{req['nom']}".replace(" ", "_")
+def _session_export_selection(conn, export):
+    """(ids de la partie demandée + 1 pour savoir s'il en reste, total de la sélection, déjà exportés)."""
+    limit = SESSION_EXPORT_BATCH_SIZE + 1
+    after_id = export["after_id"]
+    if export["request_ids"] is not None:
+        # Les ids inconnus restent dans la sélection : le manifeste les signale.
+        ids = export["request_ids"]
+        return [value for value in ids if value > after_id][:limit], len(ids), sum(value <= after_id for value in ids)
+
+    params = (export["formation"], export["session_date"])
+    total, exported = conn.execute(
+        """
+        SELECT COUNT(*), COALESCE(SUM(id <= ?), 0)
+        FROM public_requests
+        WHERE formation = ? AND session_date = ?
+        """,
+        (after_id, *params),
+    ).fetchone()
+    rows = conn.execute(
+        """
+        SELECT id FROM public_requests
+        WHERE formation = ? AND session_date = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+        """,
+        (*params, after_id, limit),
+    ).fetchall()
+    return [row[0] for row in rows], total, exported
 
-    with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as zf:
-        for i, doc in enumerate(docs, start=1):
-            source = os.path.join(UPLOAD_DIR, doc["storage_path"])
-            label = _sanitize_zip_component(DOC_LABELS.get(doc["doc_type"], doc["doc_type"]))
-            ext = os.path.splitext(doc["original_name"])[1]
-            arcname = _sanitize_zip_component(f"{i:02d}_{label}_{safe_nom}{ext}")
-            if os.path.exists(source):
-                zf.write(source, arcname)
 
-        formation = _formation_code(dossier["formation"] if dossier else req["formation"])
-        if formation:
-            html = render_template(f"attestation_{formation.lower()}.html", stagiaire=dossier or req)
-            pdf = HTML(string=html, base_url=os.getcwd()).write_pdf()
-            zf.writestr(f"attestation_preinscription_{safe_nom}.pdf", pdf)
+@app.route("/a-traiter/export")
+@login_required
+def export_session_bundle():
+    """Archive groupée : ?formation=...&session_date=... ou ?request_id=1&request_id=2, puis &resume=<jeton>."""
+    try:
+        export = _parse_session_export_args(request.args)
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    with get_db() as conn:
+        part_ids, total, exported = _session_export_selection(conn, export)
+        if not total:
+            return jsonify({"ok": False, "error": "Aucune demande pour cette sélection"}), 404
+
+        resume = None
+        if len(part_ids) > SESSION_EXPORT_BATCH_SIZE:
+            part_ids = part_ids[:SESSION_EXPORT_BATCH_SIZE]
+            resume = _encode_keyset_cursor("export", {"export": export["signature"], "id": part_ids[-1]})
+
+        # Toutes les attestations de la partie partent d'emblée dans le pool (PDF_RENDER_WORKERS
+        # rendus simultanés) et sont attendues avant le premier octet, sous un délai commun.
+        rows = []
+        for request_id in part_ids:
+            try:
+                bundle = _load_request_bundle(conn, request_id)
+            except ValueError as exc:
+                req = conn.execute("SELECT nom, prenom FROM public_requests WHERE id = ?", (request_id,)).fetchone()
+                rows.append(([request_id, req["nom"], req["prenom"], "", str(exc)], None))
+                continue
+            if bundle is None:
+                rows.append(([request_id, "", "", "", "Demande introuvable"], None))
+                continue
+            req, docs, attestation = bundle
+            future = _submit_attestation_render(*attestation) if attestation else None
+            folder = _sanitize_zip_component(f"{_bundle_safe_nom(req)}_{request_id}") + "/"
+            rows.append(([request_id, req["nom"], req["prenom"], folder, "exporté"], (req, docs, future, folder)))
+
+    pending = [trainee[2] for _row, trainee in rows if trainee and trainee[2] is not None]
+    wait_futures(pending, timeout=PDF_RENDER_TIMEOUT_SECONDS)
+
+    # Pièces lues une à une pendant le flux ; un échec d'attestation reste visible dans le manifeste.
+    manifest = StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["request_id", "nom", "prenom", "dossier", "statut"])
+    entries = []
+    for row, trainee in rows:
+        if trainee is not None:
+            req, docs, future, folder = trainee
+            attestation_pdf = None
+            if future is not None and not future.done():
+                row[4] = "exporté sans attestation : génération en cours, relancer cette partie"
+            elif future is not None:
+                try:
+                    attestation_pdf = _attestation_pdf_bytes(future.result())
+                except Exception:
+                    app.logger.exception("Attestation non générée pour l'export request_id=%s", row[0])
+                    row[4] = "exporté sans attestation : échec de génération"
+            entries.extend(_request_bundle_entries(req, docs, attestation_pdf, folder=folder))
+        writer.writerow(row)
+
+    selection = {key: export[key] for key in ("formation", "session_date") if export[key]}
+    if export["request_ids"] is not None:
+        selection["request_id"] = export["request_ids"]
+    head = [("manifeste.csv", manifest.getvalue().encode("utf-8"))]
+    if resume:
+        next_url = url_for("export_session_bundle", _external=True, resume=resume, **selection)
+        head.append((
+            "reprise.txt",
+            f"Export partiel : {exported + len(part_ids)} / {total} demandes.\n"
+            f"Partie suivante : {next_url}\n".encode("utf-8"),
+        ))
+
+    name = "selection"
+    if export["request_ids"] is None:
+        name = _sanitize_zip_component(f"{export['formation']}_{export['session_date']}")
+    if total > SESSION_EXPORT_BATCH_SIZE:
+        name += f"_partie{exported // SESSION_EXPORT_BATCH_SIZE + 1}"
+
+    headers = {
+        "Content-Disposition": _attachment_disposition(f"export_cnaps_{name}.zip"),
+        "X-Export-Total": str(total),
+        "X-Export-Done": str(exported + len(part_ids)),
+    }
+    if resume:
+        headers["X-Export-Resume-Token"] = resume
+    return Response(_iter_zip_stream(head + entries), mimetype="application/zip", headers=headers)
 
-    memory_file.seek(0)
-    return send_file(memory_file, as_attachment=True, download_name=f"dossier_cnaps_{safe_nom}.zip", mimetype="application/zip")
+
+# En fin de module : les migrations s'appuient sur les helpers définis plus haut.
+init_db()
 
 
 if __name__ == "__main__":
+    start_reminder_scheduler()
+    start_outbox_workers()
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "10000")))
@@ -0,0 +1,21 @@
+# Chargé automatiquement par `gunicorn app:app` (Procfile / render.yaml).
+import os
+
+# Workers à threads : les appels simultanés aux JSON publics d'un même processus
+# partagent un seul recalcul (cache de app.py) ; avec des workers sync, chaque
+# processus ne traite qu'une requête à la fois et ce regroupement ne joue jamais.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+
+def post_worker_init(worker):
+    # Chaque worker lance son thread de rappels CNAPS ; un bail en base
+    # garantit qu'un seul d'entre eux envoie effectivement les rappels.
+    # Les threads d'envoi outbox réservent les messages de façon atomique :
+    # ils tournent dans tous les workers.
+    # Le pool de rendu PDF est forké en premier, avant que ces threads n'existent.
+    from app import start_outbox_workers, start_pdf_render_pool, start_reminder_scheduler
+
+    start_pdf_render_pool()
+    start_reminder_scheduler()
+    start_outbox_workers()
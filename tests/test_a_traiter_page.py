@@ -0,0 +1,216 @@
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+ESPACE_VALUES = [None, "A créer", " A créer ", "Créé", "Validé", "Validé ", "Validé"]
+STATUT_VALUES = [None, "", "--", " -- ", "INSTRUCTION", "ACCEPTÉ", "TRANSMIS"]
+FORMATION_VALUES = [None, "", "APS", "A3P"]
+SESSION_VALUES = [None, "", "12/03/2026"]
+ROW_ID_RE = re.compile(r'<tr data-request-id="(\d+)"')
+
+
+class ATraiterPageTests(unittest.TestCase):
+    """/a-traiter en coquille : pages JSON, onglets et badges calculés côté serveur."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+        self._seed(random.Random(20260412), 120)
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _seed(self, rng, count):
+        with sqlite3.connect(self.db_path) as conn:
+            for index in range(count):
+                dossier_id = None
+                if rng.random() < 0.8:
+                    dossier_id = conn.execute(
+                        "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES (?, ?, ?)",
+                        (f"Nom{index}", f"Prenom{index}", rng.choice(STATUT_VALUES)),
+                    ).lastrowid
+                missing_doc_types = rng.choice([None, "", "[]", '["identity"]', '["inconnu"]', "{}", "pas du json"])
+                request_id = conn.execute(
+                    """
+                    INSERT INTO public_requests
+                        (dossier_id, nom, prenom, email, date_naissance, formation, session_date, espace_cnaps, missing_doc_types)
+                    VALUES (?, ?, ?, ?, '01/01/1990', ?, ?, ?, ?)
+                    """,
+                    (
+                        dossier_id,
+                        f"Nom{index}",
+                        f"Prenom{index}",
+                        f"user{index}@example.com",
+                        rng.choice(FORMATION_VALUES),
+                        rng.choice(SESSION_VALUES),
+                        rng.choice(ESPACE_VALUES) or "A créer",
+                        missing_doc_types,
+                    ),
+                ).lastrowid
+                if rng.random() < 0.5:
+                    conn.execute("INSERT INTO request_non_conformity_notifications (request_id) VALUES (?)", (request_id,))
+                for _ in range(rng.randint(0, 3)):
+                    is_conforme = rng.choice([None, 0, 1, 1, 1, 1])
+                    conn.execute(
+                        """
+                        INSERT INTO request_documents
+                            (request_id, doc_type, original_name, stored_name, storage_path, is_active, is_conforme, review_status)
+                        VALUES (?, 'identity', 'id.pdf', 'id.pdf', 'id.pdf', ?, ?, ?)
+                        """,
+                        (
+                            request_id,
+                            int(rng.random() < 0.9),
+                            is_conforme,
+                            "notified_expected" if is_conforme == 0 and rng.random() < 0.5 else "pending",
+                        ),
+                    )
+
+    def _template_views(self):
+        """Onglets d'après les règles de la page (badges Jinja et shouldShowDemande)."""
+        with cnaps_app.app.app_context():
+            rows = cnaps_app._load_a_traiter_dataset(cnaps_app.get_db())
+
+        views = {name: [] for name in cnaps_app.A_TRAITER_VIEWS}
+        counts = {"documents": 0, "non-conformes": 0}
+        for row in rows:
+            espace = (row["espace_cnaps"] or "A créer").strip()
+            statut = (row["statut_cnaps"] or "").strip()
+            all_docs_conformes = row["total_docs"] > 0 and row["total_docs"] == row["conformes"]
+            checks = {
+                "nouveau": not (row["formation"] and row["session_date"]),
+                "demande": (
+                    all_docs_conformes
+                    and row["en_attente"] == 0
+                    and row["missing_docs_pending"] == 0
+                    and espace == "Validé"
+                    and statut in ("", "--")
+                ),
+                "compte": espace == "A créer",
+                "compte-en-attente-validation": espace == "Créé",
+                "instruction": statut == "INSTRUCTION",
+            }
+            for name, matches in checks.items():
+                if matches:
+                    views[name].append(row["id"])
+            counts["documents"] += row["en_attente"]
+            counts["non-conformes"] += row["notified_expected"]
+        counts.update({name: len(ids) for name, ids in views.items()})
+        return views, counts
+
+    def _fetch_all(self, **params):
+        ids, totals, cursor = [], [], None
+        while True:
+            query = {"limit": 7, **params}
+            if cursor:
+                query["cursor"] = cursor
+            body = self.client.get("/a-traiter/rows.json", query_string=query).get_json()
+            self.assertTrue(body["ok"], body)
+            page_ids = [int(value) for value in ROW_ID_RE.findall(body["html"])]
+            self.assertEqual(len(page_ids), body["count"])
+            ids.extend(page_ids)
+            totals.append(body["total"])
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids, totals
+
+    def test_views_and_counts_match_page_rules(self):
+        expected_views, expected_counts = self._template_views()
+        # Le jeu aléatoire doit exercer chaque onglet.
+        self.assertTrue(all(expected_views.values()), expected_counts)
+
+        for name, expected_ids in expected_views.items():
+            with self.subTest(view=name):
+                ids, totals = self._fetch_all(view=name)
+                self.assertEqual(ids, sorted(expected_ids, reverse=True))
+                self.assertEqual(totals[0], len(expected_ids))
+                self.assertTrue(all(total is None for total in totals[1:]))
+
+        counts = self.client.get("/a-traiter/counts.json").get_json()["counts"]
+        self.assertEqual(counts, expected_counts)
+
+    def test_pages_cover_every_request_once(self):
+        with sqlite3.connect(self.db_path) as conn:
+            all_ids = [row[0] for row in conn.execute("SELECT id FROM public_requests ORDER BY id DESC")]
+
+        ids, totals = self._fetch_all()
+
+        self.assertEqual(ids, all_ids)
+        self.assertEqual(totals[0], len(all_ids))
+        search_ids, _ = self._fetch_all(q="nom17")
+        self.assertEqual(search_ids, [all_ids[-18]])
+
+    def test_shell_does_not_load_requests(self):
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            response = self.client.get("/a-traiter")
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        self.assertEqual(response.status_code, 200)
+        html = response.get_data(as_text=True)
+        self.assertIn('id="requestRows"', html)
+        self.assertNotIn("Nom17", html)
+        self.assertFalse([sql for sql in statements if "public_requests" in sql])
+
+    def test_rows_endpoint_validates_arguments_and_requires_login(self):
+        self.assertEqual(self.client.get("/a-traiter/rows.json?view=inconnu").status_code, 400)
+        self.assertEqual(self.client.get("/a-traiter/rows.json?limit=0").status_code, 400)
+
+        anonymous = cnaps_app.app.test_client()
+        self.assertEqual(anonymous.get("/a-traiter/rows.json").status_code, 302)
+        self.assertEqual(anonymous.get("/a-traiter/counts.json").status_code, 302)
+
+    def test_api_a_traiter_accepts_views(self):
+        expected_views, _ = self._template_views()
+        saved_token = cnaps_app.CNAPSV3_API_TOKEN
+        cnaps_app.CNAPSV3_API_TOKEN = "api-token"
+        try:
+            body = self.client.get(
+                "/api/a-traiter",
+                query_string={"view": "instruction"},
+                headers={"Authorization": "Bearer api-token"},
+            ).get_json()
+        finally:
+            cnaps_app.CNAPSV3_API_TOKEN = saved_token
+
+        self.assertEqual(body["total"], len(expected_views["instruction"]))
+        self.assertEqual([row["id"] for row in body["requests"]], expected_views["instruction"])
+
+
+if __name__ == "__main__":
+    unittest.main()
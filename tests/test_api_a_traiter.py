@@ -113,6 +113,117 @@ class ApiATraiterTests(unittest.TestCase):
         self.assertNotIn("dracar_password", request_payload)
         self.assertNotIn("espace_cnaps_validation_token", request_payload)
 
+    def test_api_a_traiter_paginates_with_keyset_cursor(self):
+        ids = [self._insert_request() for _ in range(5)]
+
+        first = self.client.get("/api/a-traiter?limit=2", headers=self._auth_headers()).get_json()
+        self.assertEqual([row["id"] for row in first["requests"]], [ids[4], ids[3]])
+        self.assertEqual(first["total"], 5)
+        self.assertIsNotNone(first["next_cursor"])
+
+        second = self.client.get(
+            f"/api/a-traiter?limit=2&cursor={first['next_cursor']}",
+            headers=self._auth_headers(),
+        ).get_json()
+        self.assertEqual([row["id"] for row in second["requests"]], [ids[2], ids[1]])
+
+        last = self.client.get(
+            f"/api/a-traiter?limit=2&cursor={second['next_cursor']}",
+            headers=self._auth_headers(),
+        ).get_json()
+        self.assertEqual([row["id"] for row in last["requests"]], [ids[0]])
+        self.assertIsNone(last["next_cursor"])
+
+    def test_api_a_traiter_filters_in_sql(self):
+        created_id = self._insert_request()
+        self._insert_request()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE public_requests SET espace_cnaps = 'Créé' WHERE id = ?", (created_id,))
+            conn.execute(
+                """
+                INSERT INTO request_documents (request_id, doc_type, original_name, stored_name, storage_path)
+                VALUES (?, 'identity', 'id.pdf', 'id.pdf', 'id.pdf')
+                """,
+                (created_id,),
+            )
+
+        by_espace = self.client.get(
+            "/api/a-traiter?espace_cnaps=Créé",
+            headers=self._auth_headers(),
+        ).get_json()
+        self.assertEqual([row["id"] for row in by_espace["requests"]], [created_id])
+        self.assertEqual(by_espace["total"], 1)
+
+        pending = self.client.get(
+            "/api/a-traiter?has_pending_docs=1&formation=APS",
+            headers=self._auth_headers(),
+        ).get_json()
+        self.assertEqual([row["id"] for row in pending["requests"]], [created_id])
+
+        future = self.client.get(
+            "/api/a-traiter?updated_since=2999-01-01T00:00:00",
+            headers=self._auth_headers(),
+        ).get_json()
+        self.assertEqual(future["requests"], [])
+        self.assertEqual(future["total"], 0)
+
+    def test_api_a_traiter_rejects_invalid_parameters(self):
+        for query in ("limit=0", "limit=abc", "sort=nom", "cursor=not-a-cursor", "updated_since=hier"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/a-traiter?{query}", headers=self._auth_headers())
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()["error"], "INVALID_PARAMETER")
+
+    def test_api_a_traiter_since_returns_changed_rows_and_tombstones(self):
+        with sqlite3.connect(self.db_path) as conn:
+            dossier_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Dupont', 'Jean', 'INSTRUCTION')"
+            ).lastrowid
+        changed_id = self._insert_request()
+        untouched_id = self._insert_request()
+        deleted_id = self._insert_request()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE public_requests SET dossier_id = ? WHERE id = ?", (dossier_id, changed_id))
+            conn.execute("UPDATE public_requests SET updated_at = '2000-01-01 00:00:00'")
+
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+        self.client.post(f"/nub/{dossier_id}", json={"nub": "NUB-123"})
+        self.client.post(f"/a-traiter/{deleted_id}/delete")
+
+        response = self.client.get(
+            "/api/a-traiter?since=2020-01-01T00:00:00",
+            headers=self._auth_headers(),
+        )
+
+        body = response.get_json()
+        self.assertEqual([row["id"] for row in body["requests"]], [changed_id])
+        self.assertEqual(body["requests"][0]["nub"], "NUB-123")
+        self.assertEqual([row["id"] for row in body["deleted"]], [deleted_id])
+        self.assertNotIn(untouched_id, [row["id"] for row in body["requests"]])
+        self.assertTrue(body["watermark"])
+
+    def test_api_a_traiter_returns_304_when_etag_matches(self):
+        self._insert_request()
+
+        first = self.client.get("/api/a-traiter", headers=self._auth_headers())
+        etag = first.headers["ETag"]
+        self.assertTrue(etag)
+
+        unchanged = self.client.get(
+            "/api/a-traiter",
+            headers={**self._auth_headers(), "If-None-Match": etag},
+        )
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.get_data(), b"")
+
+        self._insert_request()
+        changed = self.client.get(
+            "/api/a-traiter",
+            headers={**self._auth_headers(), "If-None-Match": etag},
+        )
+        self.assertEqual(changed.status_code, 200)
+
     def test_html_a_traiter_still_requires_user_login(self):
         response = self.client.get("/a-traiter")
 
@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class AttestationCacheTests(unittest.TestCase):
+    """PDF d'attestation rendu une fois par contenu puis resservi depuis le disque."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+        self.cache_dir = os.path.join(self.tmpdir.name, "attestations")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        self._saved = (
+            cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.ATTESTATION_CACHE_MAX_BYTES, cnaps_app.HTML, cnaps_app.PDF_RENDER_WORKERS,
+        )
+        cnaps_app.ATTESTATION_CACHE_DIR = self.cache_dir
+        # Rendu dans ce processus : le HTML de test compte les appels.
+        cnaps_app.PDF_RENDER_WORKERS = 0
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            self.dossier_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, formation, session) VALUES ('Martin', 'Jean', 'APS', '12/03/2026')"
+            ).lastrowid
+
+        self.renders = []
+        renders = self.renders
+
+        class CountingHTML:
+            def __init__(self, string=None, base_url=None, **kwargs):
+                self.string = string
+
+            def write_pdf(self, target=None, **kwargs):
+                renders.append(self.string)
+                target.write(b"%PDF-1.4\n" + self.string.encode("utf-8"))
+
+        cnaps_app.HTML = CountingHTML
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        (
+            cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.ATTESTATION_CACHE_MAX_BYTES, cnaps_app.HTML, cnaps_app.PDF_RENDER_WORKERS,
+        ) = self._saved
+        self.tmpdir.cleanup()
+
+    def _cached_files(self):
+        return sorted(
+            name for _root, _dirs, files in os.walk(self.cache_dir) for name in files
+        )
+
+    def test_repeat_downloads_are_served_from_the_cache(self):
+        first = self.client.get(f"/attestation/{self.dossier_id}")
+        second = self.client.get(f"/attestation/{self.dossier_id}")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.mimetype, "application/pdf")
+        self.assertIn("attestation_APS_Martin.pdf", first.headers["Content-Disposition"])
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(len(self.renders), 1)
+        self.assertEqual(self._cached_files(), [f"{first.headers['ETag'].strip(chr(34))}.pdf"])
+
+        revalidated = self.client.get(
+            f"/attestation/{self.dossier_id}",
+            headers={"If-None-Match": first.headers["ETag"]},
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_content_changes_render_a_new_pdf(self):
+        self.client.get(f"/attestation/{self.dossier_id}")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE dossiers SET session = '04/05/2026' WHERE id = ?", (self.dossier_id,))
+
+        response = self.client.get(f"/attestation/{self.dossier_id}")
+
+        self.assertEqual(len(self.renders), 2)
+        self.assertIn(b"04/05/2026", response.get_data())
+
+        key = cnaps_app._attestation_cache_key("attestation_aps.html", self.renders[-1])
+        self.assertNotEqual(key, cnaps_app._attestation_cache_key("attestation_a3p.html", self.renders[-1]))
+        saved_static_folder = cnaps_app.app.static_folder
+        cnaps_app.app.static_folder = self.tmpdir.name
+        try:
+            self.assertNotEqual(key, cnaps_app._attestation_cache_key("attestation_aps.html", self.renders[-1]))
+        finally:
+            cnaps_app.app.static_folder = saved_static_folder
+
+    def test_least_recently_served_pdfs_are_evicted(self):
+        keys = [cnaps_app._cached_attestation_pdf("attestation_aps.html", f"<p>{index}</p>" * 50) for index in range(3)]
+        size = os.path.getsize(cnaps_app._attestation_cache_path(keys[0]))
+        # keys[0] est relu : keys[1] devient le moins récemment servi.
+        os.utime(cnaps_app._attestation_cache_path(keys[1]), ns=(1, 1))
+        cnaps_app._cached_attestation_pdf("attestation_aps.html", "<p>0</p>" * 50)
+
+        cnaps_app.ATTESTATION_CACHE_MAX_BYTES = 2 * size
+        self.assertEqual(cnaps_app._evict_attestation_cache(), 1)
+
+        self.assertEqual(self._cached_files(), sorted(f"{key}.pdf" for key in (keys[0], keys[2])))
+        self.assertEqual(len(self.renders), 3)
+
+    def test_renders_walk_neither_static_nor_cache_under_the_limit(self):
+        cnaps_app._cached_attestation_pdf("attestation_aps.html", "<p>premier</p>")
+        walked = []
+        original_walk = os.walk
+
+        def traced_walk(top, *args, **kwargs):
+            walked.append(top)
+            return original_walk(top, *args, **kwargs)
+
+        os.walk = traced_walk
+        try:
+            keys = [cnaps_app._cached_attestation_pdf("attestation_aps.html", f"<p>{index}</p>") for index in range(3)]
+            self.assertEqual(walked, [])
+
+            # Estimation au-delà de la limite : un seul parcours, qui évince.
+            cnaps_app.ATTESTATION_CACHE_MAX_BYTES = 3 * os.path.getsize(cnaps_app._attestation_cache_path(keys[0]))
+            last = cnaps_app._cached_attestation_pdf("attestation_aps.html", "<p>3</p>")
+        finally:
+            os.walk = original_walk
+
+        self.assertEqual(walked, [self.cache_dir])
+        self.assertEqual(self._cached_files(), sorted(f"{key}.pdf" for key in (keys[1], keys[2], last)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class AttestationPrerenderTests(unittest.TestCase):
+    """Attestation rendue en tâche de fond dès que la demande devient téléchargeable."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+        self.cache_dir = os.path.join(self.tmpdir.name, "attestations")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        self._saved = (cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.PDF_RENDER_WORKERS)
+        cnaps_app.ATTESTATION_CACHE_DIR = self.cache_dir
+        cnaps_app.PDF_RENDER_WORKERS = 1
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            self.dossier_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, formation, session) VALUES ('Martin', 'Jean', 'APS', '12/03/2026')"
+            ).lastrowid
+            self.request_id = conn.execute(
+                """
+                INSERT INTO public_requests (dossier_id, nom, prenom, email, date_naissance, formation, session_date)
+                VALUES (?, 'Martin', 'Jean', 'jean@example.com', '01/01/1990', 'APS', '12/03/2026')
+                """,
+                (self.dossier_id,),
+            ).lastrowid
+            self.doc_ids = [
+                conn.execute(
+                    """
+                    INSERT INTO request_documents
+                        (request_id, doc_type, original_name, stored_name, storage_path, is_active)
+                    VALUES (?, ?, 'doc.pdf', 'doc.pdf', 'doc.pdf', 1)
+                    """,
+                    (self.request_id, doc_type),
+                ).lastrowid
+                for doc_type in ("identity", "proof_address")
+            ]
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        cnaps_app._wait_for_attestation_prerenders(timeout=30)
+        cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.PDF_RENDER_WORKERS = self._saved
+        self.tmpdir.cleanup()
+
+    def _review(self, *statuses):
+        form = {f"status_{doc_id}": status for doc_id, status in zip(self.doc_ids, statuses)}
+        response = self.client.post(f"/a-traiter/{self.request_id}/documents/review", data=form)
+        self.assertEqual(response.status_code, 302)
+        _done, not_done = cnaps_app._wait_for_attestation_prerenders(timeout=30)
+        self.assertFalse(not_done)
+
+    def _cached_files(self):
+        return sorted(name for _root, _dirs, files in os.walk(self.cache_dir) for name in files)
+
+    def test_all_conformes_prerenders_the_attestation(self):
+        self._review("conforme", "non_conforme")
+        self.assertEqual(self._cached_files(), [])
+
+        self._review("conforme", "conforme")
+
+        cached = self._cached_files()
+        self.assertEqual(len(cached), 1)
+        # Le clic sur "télécharger" trouve le PDF déjà rendu.
+        original_html = cnaps_app.HTML
+        cnaps_app.HTML = None
+        try:
+            response = self.client.get(f"/attestation/{self.dossier_id}")
+        finally:
+            cnaps_app.HTML = original_html
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(f"{response.headers['ETag'].strip(chr(34))}.pdf", cached[0])
+
+        # Déjà en cache : rien n'est remis en file.
+        with cnaps_app.app.test_request_context():
+            self.assertIsNone(cnaps_app._queue_attestation_prerender(cnaps_app.get_db(), self.request_id))
+
+    def test_printed_field_changes_render_a_new_pdf(self):
+        self._review("conforme", "conforme")
+
+        response = self.client.post(
+            f"/a-traiter/{self.request_id}/identity",
+            json={"field": "nom", "value": "Bernard"},
+        )
+        self.assertEqual(response.status_code, 200)
+        cnaps_app._wait_for_attestation_prerenders(timeout=30)
+
+        with cnaps_app.app.app_context():
+            session_label = cnaps_app.get_formation_sessions()["A3P"][0]
+        response = self.client.post(
+            f"/a-traiter/{self.request_id}/assign",
+            data={"formation": "A3P", "session_date": session_label},
+        )
+        self.assertEqual(response.status_code, 302)
+        cnaps_app._wait_for_attestation_prerenders(timeout=30)
+
+        self.assertEqual(len(self._cached_files()), 3)
+        with cnaps_app.app.test_request_context():
+            template_name, html = cnaps_app._request_attestation_source(cnaps_app.get_db(), self.request_id)
+        self.assertEqual(template_name, "attestation_a3p.html")
+        self.assertIn("Bernard", html)
+        key = cnaps_app._attestation_cache_key(template_name, html)
+        self.assertIn(f"{key}.pdf", self._cached_files())
+
+    def test_disabled_pool_queues_nothing(self):
+        cnaps_app.PDF_RENDER_WORKERS = 0
+
+        self._review("conforme", "conforme")
+        self.assertEqual(self._cached_files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import Future
+
+from werkzeug.http import parse_options_header
+
+import app as cnaps_app
+
+
+class BundleDownloadTests(unittest.TestCase):
+    """Archive du dossier complet produite en flux, sans passer par un BytesIO."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+        self.upload_dir = os.path.join(self.tmpdir.name, "uploads")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        self._saved_upload_dir = cnaps_app.UPLOAD_DIR
+        self._saved_cache_dir = cnaps_app.ATTESTATION_CACHE_DIR
+        self._saved_render_workers = cnaps_app.PDF_RENDER_WORKERS
+        cnaps_app.PDF_RENDER_WORKERS = 0
+        cnaps_app.UPLOAD_DIR = self.upload_dir
+        cnaps_app.ATTESTATION_CACHE_DIR = os.path.join(self.tmpdir.name, "attestations")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+
+        self.files = {
+            "identity": ("carte.pdf", os.urandom(600 * 1024)),
+            "proof_address": ("facture.txt", b"justificatif de domicile\n" * 4000),
+        }
+        with sqlite3.connect(self.db_path) as conn:
+            dossier_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, formation, session) VALUES ('Lefèvre', 'Élodie', 'APS', '12/03/2026')"
+            ).lastrowid
+            self.request_id = conn.execute(
+                """
+                INSERT INTO public_requests (dossier_id, nom, prenom, email, date_naissance, formation)
+                VALUES (?, 'Lefèvre', 'Élodie', 'elodie@example.com', '01/01/1990', 'APS')
+                """,
+                (dossier_id,),
+            ).lastrowid
+            os.makedirs(self.upload_dir, exist_ok=True)
+            for doc_type, (name, content) in self.files.items():
+                with open(os.path.join(self.upload_dir, name), "wb") as handle:
+                    handle.write(content)
+                conn.execute(
+                    """
+                    INSERT INTO request_documents
+                        (request_id, doc_type, original_name, stored_name, storage_path, is_active, is_conforme)
+                    VALUES (?, ?, ?, ?, ?, 1, 1)
+                    """,
+                    (self.request_id, doc_type, name, name, name),
+                )
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        cnaps_app.UPLOAD_DIR = self._saved_upload_dir
+        cnaps_app.ATTESTATION_CACHE_DIR = self._saved_cache_dir
+        cnaps_app.PDF_RENDER_WORKERS = self._saved_render_workers
+        self.tmpdir.cleanup()
+
+    def test_attestation_is_rendered_before_the_archive_is_streamed(self):
+        events = []
+        original_html = cnaps_app.HTML
+
+        class TracedHTML(original_html):
+            def write_pdf(self, target=None, **kwargs):
+                events.append("render")
+                target.write(b"%PDF-1.4 attestation")
+
+        cnaps_app.HTML = TracedHTML
+        try:
+            response = self.client.get(f"/a-traiter/{self.request_id}/download")
+            self.assertTrue(response.is_streamed)
+            chunks = []
+            for chunk in response.response:
+                events.append("chunk")
+                chunks.append(chunk)
+        finally:
+            cnaps_app.HTML = original_html
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/zip")
+        self.assertIn("filename*=UTF-8''dossier_cnaps_%C3%89lodie_Lef%C3%A8vre.zip", response.headers["Content-Disposition"])
+        # Attestation prête avant le premier octet ; les pièces partent ensuite par blocs bornés.
+        self.assertEqual(events[0], "render")
+        self.assertGreater(len(chunks), 5)
+        self.assertLessEqual(max(len(chunk) for chunk in chunks[:-1]), 2 * cnaps_app.ZIP_STREAM_CHUNK_SIZE)
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            infos = {info.filename: info for info in archive.infolist()}
+            self.assertEqual(
+                sorted(infos),
+                [
+                    "01_Pièce_d'identité_(recto-verso)_ou_passeport_Élodie_Lefèvre.pdf",
+                    "02_Justificatif_de_domicile_de_moins_de_3_mois_Élodie_Lefèvre.txt",
+                    "attestation_preinscription_Élodie_Lefèvre.pdf",
+                ],
+            )
+            pdf_info = infos["01_Pièce_d'identité_(recto-verso)_ou_passeport_Élodie_Lefèvre.pdf"]
+            self.assertEqual(pdf_info.compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.read(pdf_info), self.files["identity"][1])
+            text_info = infos["02_Justificatif_de_domicile_de_moins_de_3_mois_Élodie_Lefèvre.txt"]
+            self.assertEqual(text_info.compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(archive.read(text_info), self.files["proof_address"][1])
+            self.assertEqual(archive.read("attestation_preinscription_Élodie_Lefèvre.pdf"), b"%PDF-1.4 attestation")
+
+    def test_slow_attestation_returns_503_before_any_byte(self):
+        pending = Future()
+        saved = (cnaps_app._submit_pdf_job, cnaps_app.PDF_RENDER_TIMEOUT_SECONDS)
+        cnaps_app._submit_pdf_job = lambda *args: pending
+        cnaps_app.PDF_RENDER_WORKERS = 1
+        cnaps_app.PDF_RENDER_TIMEOUT_SECONDS = 0.01
+        try:
+            response = self.client.get(f"/a-traiter/{self.request_id}/download")
+        finally:
+            cnaps_app._submit_pdf_job, cnaps_app.PDF_RENDER_TIMEOUT_SECONDS = saved
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "5")
+        self.assertNotEqual(response.mimetype, "application/zip")
+
+    def test_download_names_are_quoted_like_send_file(self):
+        for name in ('dossier_cnaps_Jean_"Jo"_Dupont.zip', 'dossier_cnaps_Lef\\èvre_"Élodie".zip', "export; x=1.zip"):
+            with self.subTest(name=name):
+                header = cnaps_app._attachment_disposition(name)
+                disposition, options = parse_options_header(header)
+                self.assertEqual(disposition, "attachment")
+                # filename* l'emporte quand il est présent, comme chez les navigateurs.
+                self.assertEqual(options["filename"], name)
+                self.assertNotIn("\n", header)
+
+    def test_non_conforme_documents_block_the_download(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE request_documents SET is_conforme = 0 WHERE doc_type = 'identity'")
+
+        response = self.client.get(f"/a-traiter/{self.request_id}/download")
+
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class CnapsEnumCodeTests(unittest.TestCase):
+    """Colonnes générées espace_cnaps_code / statut_cnaps_code."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    session TEXT,
+                    statut_cnaps TEXT
+                )
+                """
+            )
+            # Ligne antérieure aux migrations : son code doit être indexé dès la création.
+            conn.execute("INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Ancien', 'Dossier', 'Accepté')")
+        cnaps_app.init_db()
+
+    def tearDown(self):
+        cnaps_app._invalidate_public_json_cache()
+        self.tmpdir.cleanup()
+
+    def _insert_request(self, conn, espace_cnaps, dossier_id=None):
+        return conn.execute(
+            """
+            INSERT INTO public_requests (dossier_id, nom, prenom, email, date_naissance, espace_cnaps)
+            VALUES (?, 'Dupont', 'Jean', 'jean@example.com', '01/01/1990', ?)
+            """,
+            (dossier_id, espace_cnaps),
+        ).lastrowid
+
+    def test_labels_map_to_canonical_codes(self):
+        espace_cases = {
+            "A créer": "a_creer",
+            " a creer ": "a_creer",
+            "A_CRÉER": "a_creer",
+            "Créé": "cree",
+            "cree\t": "cree",
+            "Validé": "valide",
+            " VALIDÉ ": "valide",
+            "": "",
+            "Bloqué": "autre",
+        }
+        statut_cases = {
+            None: "",
+            "--": "",
+            "INSTRUCTION": "instruction",
+            " instruction ": "instruction",
+            "ACCEPTÉ": "accepte",
+            "Accepte": "accepte",
+            "REFUSÉ": "refuse",
+            "ENREGISTRÉ": "enregistre",
+            "DOCS COMPLEMENTAIRES": "docs_complementaires",
+            "EN COURS": "autre",
+        }
+        with sqlite3.connect(self.db_path) as conn:
+            for label, code in espace_cases.items():
+                with self.subTest(espace_cnaps=label):
+                    request_id = self._insert_request(conn, label)
+                    stored = conn.execute(
+                        "SELECT espace_cnaps_code FROM public_requests WHERE id = ?", (request_id,)
+                    ).fetchone()[0]
+                    self.assertEqual(stored, code)
+            for label, code in statut_cases.items():
+                with self.subTest(statut_cnaps=label):
+                    dossier_id = conn.execute(
+                        "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('N', 'P', ?)", (label,)
+                    ).lastrowid
+                    stored = conn.execute(
+                        "SELECT statut_cnaps_code FROM dossiers WHERE id = ?", (dossier_id,)
+                    ).fetchone()[0]
+                    self.assertEqual(stored, code)
+
+    def test_codes_follow_updates_and_existing_rows(self):
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(
+                conn.execute("SELECT id FROM dossiers INDEXED BY idx_dossiers_statut_cnaps_code WHERE statut_cnaps_code = 'accepte'").fetchall(),
+                [(1,)],
+            )
+            request_id = self._insert_request(conn, "A créer")
+            conn.execute("UPDATE public_requests SET espace_cnaps = 'Créé' WHERE id = ?", (request_id,))
+            self.assertEqual(
+                conn.execute("SELECT id FROM public_requests WHERE espace_cnaps_code = 'cree'").fetchall(),
+                [(request_id,)],
+            )
+
+    def test_public_endpoints_keep_their_original_predicates(self):
+        with sqlite3.connect(self.db_path) as conn:
+            self._insert_request(conn, " créé ")
+            self._insert_request(conn, "Créé", dossier_id=1)
+            self._insert_request(conn, "Validé")
+            self._insert_request(conn, "A  créer")
+            conn.execute("INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Exact', 'Dossier', 'INSTRUCTION')")
+            conn.execute("INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Espaces', 'Dossier', ' instruction ')")
+            conn.execute("INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Partiel', 'Dossier', 'Non accepté')")
+
+        client = cnaps_app.app.test_client()
+        notifications = client.get("/notifications_espace_cnaps_a_valider.json").get_json()
+        recent = client.get("/recent_acceptes.json").get_json()
+        data = client.get("/data.json").get_json()
+
+        self.assertEqual(notifications["count"], 2)
+        # LIKE '%accepte%' d'origine : un libellé qui contient « accepté » compte aussi.
+        self.assertEqual([row["nom"] for row in recent["recent_acceptes"]], ["Partiel", "Ancien"])
+        # Égalité exacte sur 'INSTRUCTION' ; « A  créer » (double espace) n'est pas « a creer ».
+        self.assertEqual(data["instruction"], 1)
+        self.assertEqual(data["comptes_cnaps_a_creer"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import app as cnaps_app
+
+
+class CnapsReminderSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        cnaps_app.CNAPSV3_API_TOKEN = "expected-token"
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+
+        self.sent = []
+        self._original_email = cnaps_app._send_email_html
+        self._original_sms = cnaps_app._send_sms
+        cnaps_app._send_email_html = lambda to, subject, html: self.sent.append(("email", to, subject))
+        cnaps_app._send_sms = lambda phone, message: self.sent.append(("sms", phone, message[:6]))
+
+        self.now = datetime(2026, 3, 10, 12, 0, tzinfo=cnaps_app.FRANCE_TZ)
+
+    def tearDown(self):
+        cnaps_app._send_email_html = self._original_email
+        cnaps_app._send_sms = self._original_sms
+        self.tmpdir.cleanup()
+
+    def _insert_created_request(self, created_at, telephone="0612345678"):
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute(
+                """
+                INSERT INTO public_requests
+                    (nom, prenom, email, date_naissance, telephone, espace_cnaps, espace_cnaps_created_at)
+                VALUES ('Dupont', 'Jean', 'jean@example.com', '01/01/1990', ?, 'Créé', ?)
+                """,
+                (telephone, cnaps_app._to_db_datetime(created_at)),
+            )
+            return cur.lastrowid
+
+    def _run(self, now):
+        with sqlite3.connect(self.db_path) as conn, cnaps_app.app.test_request_context():
+            conn.row_factory = sqlite3.Row
+            next_due = cnaps_app._send_cnaps_reminders(
+                conn,
+                cnaps_app._load_cnaps_reminder_candidates(conn),
+                now_dt=now,
+            )
+        cnaps_app.drain_outbox("test-worker")
+        return next_due
+
+    def test_due_reminder_is_sent_once_and_next_deadline_returned(self):
+        request_id = self._insert_created_request(self.now - timedelta(hours=9))
+
+        next_due = self._run(self.now)
+
+        self.assertEqual([kind for kind, _, _ in self.sent], ["email", "sms"])
+        self.assertEqual(next_due, self.now + timedelta(hours=1))
+        with sqlite3.connect(self.db_path) as conn:
+            sent_4h, sent_2h = conn.execute(
+                "SELECT cnaps_reminder_4h_sent_at, cnaps_reminder_2h_sent_at FROM public_requests WHERE id = ?",
+                (request_id,),
+            ).fetchone()
+        self.assertTrue(sent_4h)
+        self.assertIsNone(sent_2h)
+
+        self.sent.clear()
+        self._run(self.now + timedelta(minutes=5))
+        self.assertEqual(self.sent, [])
+
+    def test_reminders_wait_for_allowed_window(self):
+        night = datetime(2026, 3, 10, 23, 0, tzinfo=cnaps_app.FRANCE_TZ)
+        self._insert_created_request(night - timedelta(hours=9))
+
+        next_due = self._run(night)
+
+        self.assertEqual(self.sent, [])
+        self.assertEqual(next_due, datetime(2026, 3, 11, 7, 0, tzinfo=cnaps_app.FRANCE_TZ))
+
+    def test_failed_enqueue_releases_claim(self):
+        request_id = self._insert_created_request(self.now - timedelta(hours=9))
+
+        with mock.patch.object(cnaps_app, "_enqueue_email", side_effect=sqlite3.OperationalError("database is locked")):
+            next_due = self._run(self.now)
+
+        self.assertEqual(next_due, self.now + timedelta(seconds=cnaps_app.REMINDER_SCHEDULER_RETRY_SECONDS))
+        with sqlite3.connect(self.db_path) as conn:
+            sent_4h = conn.execute(
+                "SELECT cnaps_reminder_4h_sent_at FROM public_requests WHERE id = ?",
+                (request_id,),
+            ).fetchone()[0]
+            queued = conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        self.assertIsNone(sent_4h)
+        self.assertEqual(queued, 0)
+        self.assertEqual(self.sent, [])
+
+    def test_missing_phone_still_sends_the_email(self):
+        request_id = self._insert_created_request(self.now - timedelta(hours=9), telephone="")
+
+        with self.assertLogs(cnaps_app.app.logger, level="WARNING") as logs:
+            next_due = self._run(self.now)
+
+        self.assertEqual([kind for kind, _, _ in self.sent], ["email"])
+        self.assertEqual(next_due, self.now + timedelta(hours=1))
+        self.assertTrue(any("SMS rappel CNAPS non mis en file" in line for line in logs.output))
+        self.assertFalse([record for record in logs.records if record.exc_info])
+        with sqlite3.connect(self.db_path) as conn:
+            sent_4h = conn.execute(
+                "SELECT cnaps_reminder_4h_sent_at FROM public_requests WHERE id = ?",
+                (request_id,),
+            ).fetchone()[0]
+        self.assertTrue(sent_4h)
+
+        # Le rappel est acquis : rien n'est retenté ni reloggé au passage suivant.
+        self.sent.clear()
+        self._run(self.now + timedelta(minutes=1))
+        self.assertEqual(self.sent, [])
+
+    def test_only_one_owner_holds_the_lease(self):
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertTrue(cnaps_app._acquire_scheduler_lease(conn, "cnaps_reminders", "worker-a", 60))
+            self.assertFalse(cnaps_app._acquire_scheduler_lease(conn, "cnaps_reminders", "worker-b", 60))
+            self.assertTrue(cnaps_app._acquire_scheduler_lease(conn, "cnaps_reminders", "worker-a", 60))
+            conn.execute("UPDATE scheduler_leases SET expires_at = 0")
+            self.assertTrue(cnaps_app._acquire_scheduler_lease(conn, "cnaps_reminders", "worker-b", 60))
+
+    def test_api_a_traiter_no_longer_sends_reminders(self):
+        self._insert_created_request(cnaps_app._now_france() - timedelta(hours=11))
+
+        response = cnaps_app.app.test_client().get(
+            "/api/a-traiter",
+            headers={"Authorization": "Bearer expected-token"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+ESPACE_VALUES = ["", "A créer", " A créer ", "a creer", "A créer", "Créé", "Validé", " Validé\t", "valide", "VALIDÉ"]
+STATUT_VALUES = [None, "", "--", " -- ", "INSTRUCTION", " instruction ", "TRANSMIS", "ACCEPTÉ"]
+ACTION_VALUES = [None, "", "Demande à faire", "demande_a_faire", " A faire ", "demandes-a-faire", "Fait"]
+FORMATION_VALUES = [None, "", "APS", " A3P ", "\t"]
+SESSION_VALUES = [None, "", "12/03/2026", "  "]
+
+
+class DashboardCountersParityTests(unittest.TestCase):
+    """Le moteur SQL doit rendre exactement les compteurs des anciens prédicats Python."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("ALTER TABLE public_requests ADD COLUMN action_cnaps TEXT")
+            # Nouveau schéma : triggers à réinstaller, comme `flask dashboard-counters rebuild`.
+            cnaps_app._rebuild_dashboard_counters(conn)
+
+        self._seed(random.Random(20260310), 300)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _seed(self, rng, count):
+        with sqlite3.connect(self.db_path) as conn:
+            for index in range(count):
+                dossier_id = None
+                if rng.random() < 0.8:
+                    dossier_id = conn.execute(
+                        "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES (?, ?, ?)",
+                        (f"Nom{index}", f"Prenom{index}", rng.choice(STATUT_VALUES)),
+                    ).lastrowid
+                request_id = conn.execute(
+                    """
+                    INSERT INTO public_requests
+                        (dossier_id, nom, prenom, email, date_naissance, formation, session_date, espace_cnaps, action_cnaps)
+                    VALUES (?, ?, ?, ?, '01/01/1990', ?, ?, ?, ?)
+                    """,
+                    (
+                        dossier_id,
+                        f"Nom{index}",
+                        f"Prenom{index}",
+                        f"user{index}@example.com",
+                        rng.choice(FORMATION_VALUES),
+                        rng.choice(SESSION_VALUES),
+                        rng.choice(ESPACE_VALUES),
+                        rng.choice(ACTION_VALUES),
+                    ),
+                ).lastrowid
+                for doc_index in range(rng.randint(0, 4)):
+                    conn.execute(
+                        """
+                        INSERT INTO request_documents
+                            (request_id, doc_type, original_name, stored_name, storage_path, is_active, is_conforme)
+                        VALUES (?, 'identity', 'id.pdf', 'id.pdf', 'id.pdf', ?, ?)
+                        """,
+                        (request_id, int(rng.random() < 0.85), rng.choice([None, 0, 1, 1, 1])),
+                    )
+
+    def _python_counters(self):
+        with cnaps_app.app.app_context():
+            conn = cnaps_app.get_db()
+            rows, _ = cnaps_app._load_summary_source_data(conn)
+            demande_a_faire, _ = cnaps_app._compute_demandes_a_faire(conn)
+            documents_a_controler = conn.execute(
+                "SELECT COUNT(*) FROM request_documents WHERE is_active = 1 AND is_conforme IS NULL"
+            ).fetchone()[0]
+            dossiers_documents_a_controler = conn.execute(
+                "SELECT COUNT(DISTINCT request_id) FROM request_documents WHERE is_active = 1 AND is_conforme IS NULL"
+            ).fetchone()[0]
+            instruction = conn.execute(
+                "SELECT COUNT(*) FROM dossiers WHERE statut_cnaps = 'INSTRUCTION'"
+            ).fetchone()[0]
+            comptes_cnaps_a_creer = conn.execute(
+                f"SELECT COUNT(*) FROM public_requests pr WHERE {cnaps_app.ESPACE_CNAPS_NORMALIZED_SQL} = 'a creer'"
+            ).fetchone()[0]
+
+        return {
+            "request_count": len(rows),
+            "instruction": instruction,
+            "summary_instruction": sum(cnaps_app._is_instruction_row(row) for row in rows),
+            "nouveau_dossier": sum(cnaps_app._is_nouveau_dossier(row) for row in rows),
+            "summary_demandes_a_faire": sum(cnaps_app._is_demande_a_faire_summary(row) for row in rows),
+            "demande_a_faire": demande_a_faire,
+            "documents_a_controler": documents_a_controler,
+            "dossiers_documents_a_controler": dossiers_documents_a_controler,
+            "summary_documents_a_controler": sum(cnaps_app._has_documents_to_review(row) for row in rows),
+            "comptes_cnaps_a_creer": comptes_cnaps_a_creer,
+            "summary_comptes_cnaps_a_creer": sum(cnaps_app._is_compte_cnaps_a_creer(row) for row in rows),
+        }
+
+    def test_engine_matches_python_predicates(self):
+        expected = self._python_counters()
+        with sqlite3.connect(self.db_path) as conn:
+            counters = cnaps_app._compute_dashboard_counters(conn)
+
+        self.assertEqual(counters, expected)
+        # Le jeu aléatoire doit exercer chaque compteur.
+        self.assertTrue(all(value > 0 for value in expected.values()), expected)
+
+    def test_endpoints_share_the_engine(self):
+        expected = self._python_counters()
+        client = cnaps_app.app.test_client()
+
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            summary = client.get("/summary.json").get_json()
+            data = client.get("/data.json").get_json()
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        self.assertEqual(
+            summary,
+            {
+                "nouveau_dossier": expected["nouveau_dossier"],
+                "nouveaux_dossiers": expected["nouveau_dossier"],
+                "demandes_a_faire": expected["summary_demandes_a_faire"],
+                "documents_a_controler": expected["summary_documents_a_controler"],
+                "comptes_cnaps_a_creer": expected["summary_comptes_cnaps_a_creer"],
+                "instruction": expected["summary_instruction"],
+            },
+        )
+        self.assertEqual(data["instruction"], expected["instruction"])
+        self.assertEqual(data["demande_a_faire"], expected["demande_a_faire"])
+        self.assertEqual(data["documents_a_controler"], expected["documents_a_controler"])
+        self.assertEqual(data["dossiers_documents_a_controler"], expected["dossiers_documents_a_controler"])
+        self.assertEqual(data["comptes_cnaps_a_creer"], expected["comptes_cnaps_a_creer"])
+        self.assertNotIn("warnings", data)
+
+        # Hors relecture de la génération du cache des JSON publics.
+        selects = [
+            sql for sql in statements
+            if sql.lstrip().upper().startswith(("SELECT", "WITH")) and "public_json_cache_state" not in sql
+        ]
+        self.assertEqual(len(selects), 2)
+
+    def test_triggers_keep_counters_in_sync(self):
+        rng = random.Random(20260311)
+        with sqlite3.connect(self.db_path) as conn:
+            request_ids = [row[0] for row in conn.execute("SELECT id FROM public_requests")]
+            dossier_ids = [row[0] for row in conn.execute("SELECT id FROM dossiers")]
+            document_ids = [row[0] for row in conn.execute("SELECT id FROM request_documents")]
+            for _ in range(200):
+                conn.execute(
+                    "UPDATE public_requests SET espace_cnaps = ?, action_cnaps = ?, session_date = ? WHERE id = ?",
+                    (rng.choice(ESPACE_VALUES), rng.choice(ACTION_VALUES), rng.choice(SESSION_VALUES), rng.choice(request_ids)),
+                )
+                conn.execute(
+                    "UPDATE dossiers SET statut_cnaps = ? WHERE id = ?",
+                    (rng.choice(STATUT_VALUES), rng.choice(dossier_ids)),
+                )
+                conn.execute(
+                    "UPDATE request_documents SET is_active = ?, is_conforme = ?, request_id = ? WHERE id = ?",
+                    (int(rng.random() < 0.85), rng.choice([None, 0, 1]), rng.choice(request_ids), rng.choice(document_ids)),
+                )
+            conn.execute("DELETE FROM request_documents WHERE id IN (?, ?)", tuple(document_ids[:2]))
+            conn.execute("DELETE FROM public_requests WHERE id = ?", (request_ids[0],))
+            conn.execute("DELETE FROM dossiers WHERE id = ?", (dossier_ids[-1],))
+        self._seed(rng, 20)
+
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(cnaps_app._verify_dashboard_counters(conn), {})
+
+    def test_verify_reports_drift_and_rebuild_repairs_it(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE dashboard_counters SET demande_a_faire = demande_a_faire + 3")
+            drift = cnaps_app._verify_dashboard_counters(conn)
+            self.assertEqual(list(drift), ["demande_a_faire"])
+            stored, actual = drift["demande_a_faire"]
+            self.assertEqual(stored - actual, 3)
+
+            cnaps_app._rebuild_dashboard_counters(conn)
+            self.assertEqual(cnaps_app._verify_dashboard_counters(conn), {})
+
+    def test_summary_without_requests_reports_no_data(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM request_documents")
+            conn.execute("DELETE FROM public_requests")
+
+        summary = cnaps_app.app.test_client().get("/summary.json").get_json()
+
+        self.assertEqual(summary["error"], "no_data_loaded")
+
+
+if __name__ == "__main__":
+    unittest.main()
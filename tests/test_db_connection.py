@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class DbConnectionTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        cnaps_app.init_db()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_init_db_switches_database_to_wal(self):
+        with sqlite3.connect(self.db_path) as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+        self.assertEqual(journal_mode, "wal")
+
+    def test_get_db_reuses_one_connection_per_app_context(self):
+        with cnaps_app.app.app_context():
+            first = cnaps_app.get_db()
+            second = cnaps_app.get_db()
+            self.assertIs(first, second)
+            self.assertEqual(first.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(
+                first.execute("PRAGMA busy_timeout").fetchone()[0],
+                cnaps_app.SQLITE_BUSY_TIMEOUT_MS,
+            )
+
+        with self.assertRaises(sqlite3.ProgrammingError):
+            first.execute("SELECT 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
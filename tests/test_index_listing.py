@@ -0,0 +1,155 @@
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+import app as cnaps_app
+
+
+STATUT_VALUES = [None, "", "TRANSMIS", "INSTRUCTION", "ACCEPTÉ", "ACCEPTÉ", "REFUSÉ"]
+FORMATION_VALUES = [None, "", "APS", "A3P"]
+ROW_ID_RE = re.compile(r'href="/attestation/(\d+)"')
+NEXT_RE = re.compile(r'<a href="([^"]+)">Page suivante')
+
+
+class IndexListingTests(unittest.TestCase):
+    """Liste des dossiers paginée par curseur, triée et comptée côté serveur."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        self._saved_page_size = cnaps_app.DOSSIERS_PAGE_SIZE
+        cnaps_app.DOSSIERS_PAGE_SIZE = 9
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    lien TEXT,
+                    statut TEXT,
+                    commentaire TEXT,
+                    statut_cnaps TEXT
+                )
+                """
+            )
+            rng = random.Random(20260501)
+            for index in range(80):
+                conn.execute(
+                    "INSERT INTO dossiers (nom, prenom, formation, session, statut_cnaps) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        rng.choice(["Martin", "Bernard", "Durand", "Petit"]),
+                        f"Prenom{index}",
+                        rng.choice(FORMATION_VALUES),
+                        rng.choice([None, "2026-03-12", "2026-05-04"]),
+                        rng.choice(STATUT_VALUES),
+                    ),
+                )
+        cnaps_app.init_db()
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        cnaps_app.DOSSIERS_PAGE_SIZE = self._saved_page_size
+        self.tmpdir.cleanup()
+
+    def _fetch_all(self, **params):
+        ids, pages = [], []
+        url, query = "/", params
+        while True:
+            response = self.client.get(url, query_string=query)
+            self.assertEqual(response.status_code, 200)
+            html = response.get_data(as_text=True)
+            page_ids = [int(value) for value in ROW_ID_RE.findall(html)]
+            self.assertLessEqual(len(page_ids), cnaps_app.DOSSIERS_PAGE_SIZE)
+            ids.extend(page_ids)
+            pages.append(html)
+            next_link = NEXT_RE.search(html)
+            if not next_link:
+                return ids, pages
+            parts = urlsplit(next_link.group(1).replace("&amp;", "&"))
+            url, query = parts.path, {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+    def _expected(self, where="1", order="id DESC", params=()):
+        with sqlite3.connect(self.db_path) as conn:
+            return [row[0] for row in conn.execute(f"SELECT id FROM dossiers WHERE {where} ORDER BY {order}", params)]
+
+    def test_pages_follow_filter_and_sort(self):
+        cases = [
+            ({}, "statut_cnaps NOT IN ('ACCEPTÉ', 'REFUSÉ')", "id DESC", ()),
+            ({"filtre_cnaps": "Tous"}, "1", "id DESC", ()),
+            ({"filtre_cnaps": "ACCEPTÉ"}, "statut_cnaps = ?", "id DESC", ("ACCEPTÉ",)),
+            ({"filtre_cnaps": "Tous", "sort": "nom"}, "1", "nom ASC, id ASC", ()),
+            (
+                {"filtre_cnaps": "Tous", "sort": "formation", "order": "desc"},
+                "1", "COALESCE(formation, '') DESC, id DESC", (),
+            ),
+            ({"sort": "session"}, "statut_cnaps NOT IN ('ACCEPTÉ', 'REFUSÉ')", "COALESCE(session, ''), id", ()),
+        ]
+        for params, where, order, where_params in cases:
+            with self.subTest(params=params):
+                expected = self._expected(where, order, where_params)
+                ids, pages = self._fetch_all(**params)
+                self.assertEqual(ids, expected)
+                self.assertGreater(len(pages), 1)
+                self.assertIn(f"{len(expected)} dossier", pages[0])
+
+    def test_statut_counts_come_from_one_grouped_query(self):
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            html = self.client.get("/").get_data(as_text=True)
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        with sqlite3.connect(self.db_path) as conn:
+            accepted = conn.execute("SELECT COUNT(*) FROM dossiers WHERE statut_cnaps = 'ACCEPTÉ'").fetchone()[0]
+        self.assertIn(f"ACCEPTÉ ({accepted})", html)
+        self.assertIn("Tous (80)", html)
+        dossier_queries = [sql for sql in statements if "FROM dossiers" in sql]
+        self.assertEqual(len(dossier_queries), 2, dossier_queries)
+        self.assertFalse([sql for sql in statements if "FROM public_requests" in sql])
+
+    def test_search_restricts_the_listing(self):
+        ids, pages = self._fetch_all(filtre_cnaps="Tous", q="marti")
+
+        self.assertEqual(ids, self._expected("nom = 'Martin'"))
+        self.assertIn(f"{len(ids)} dossiers pour « marti »", pages[0])
+
+    def test_sorted_pages_use_an_index(self):
+        with sqlite3.connect(self.db_path) as conn:
+            plan = " ".join(
+                row[3] for row in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT d.id FROM dossiers d "
+                    "ORDER BY COALESCE(d.nom, '') ASC, d.id ASC LIMIT 10"
+                )
+            )
+        self.assertIn("idx_dossiers_sort_nom", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_invalid_arguments_are_rejected(self):
+        self.assertEqual(self.client.get("/?sort=commentaire").status_code, 400)
+        self.assertEqual(self.client.get("/?order=sideways").status_code, 400)
+        self.assertEqual(self.client.get("/?sort=nom&cursor=pas-un-curseur").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
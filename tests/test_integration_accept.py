@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class IntegrationAcceptBatchTests(unittest.TestCase):
+    """Acceptation groupée : une résolution, une transaction, un résultat par élément."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        cnaps_app.GESTIONSTAGIAIRE_SYNC_TOKEN = "expected-token"
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    statut_cnaps TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+
+        with sqlite3.connect(self.db_path) as conn:
+            self.instruction_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Dupont', 'Jean', 'INSTRUCTION')"
+            ).lastrowid
+            self.accepted_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Martin', 'Paul', 'ACCEPTÉ')"
+            ).lastrowid
+            self.transmis_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES ('Durand', 'Marie', 'TRANSMIS')"
+            ).lastrowid
+            self.request_id = conn.execute(
+                """
+                INSERT INTO public_requests (dossier_id, nom, prenom, email, date_naissance, updated_at)
+                VALUES (?, 'Durand', 'Marie', 'marie@example.com', '1990-01-01', '2000-01-01 00:00:00')
+                """,
+                (self.transmis_id,),
+            ).lastrowid
+            self.orphan_request_id = conn.execute(
+                """
+                INSERT INTO public_requests (nom, prenom, email, date_naissance)
+                VALUES ('Sans', 'Dossier', 'sans@example.com', '1990-01-01')
+                """
+            ).lastrowid
+
+        self.client = cnaps_app.app.test_client()
+
+    def tearDown(self):
+        cnaps_app._invalidate_public_json_cache()
+        self.tmpdir.cleanup()
+
+    def _post(self, payload, token="expected-token"):
+        return self.client.post(
+            "/integrations/gestionstagiaire/cnaps/accept/batch",
+            headers={"Authorization": f"Bearer {token}"},
+            json=payload,
+        )
+
+    def test_batch_returns_per_item_outcomes(self):
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            response = self._post({
+                "items": [
+                    {"dossier_id": self.instruction_id},
+                    {"request_id": self.request_id},
+                    {"dossier_id": self.accepted_id},
+                    {"dossier_id": 9999},
+                    {"request_id": 9999},
+                    {"request_id": self.orphan_request_id},
+                    {},
+                    {"dossier_id": self.instruction_id},
+                ]
+            })
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["accepted"], 2)
+        self.assertEqual(
+            [(r["index"], r["ok"], r.get("error"), r.get("previous_statut_cnaps")) for r in body["results"]],
+            [
+                (0, True, None, "INSTRUCTION"),
+                (1, True, None, "TRANSMIS"),
+                (2, True, None, "ACCEPTÉ"),
+                (3, False, "dossier_not_found", None),
+                (4, False, "request_not_found", None),
+                (5, False, "request_not_found", None),
+                (6, False, "missing_identifier", None),
+                (7, True, None, "ACCEPTÉ"),
+            ],
+        )
+        self.assertEqual(body["results"][1]["dossier_id"], self.transmis_id)
+
+        # Une seule résolution et une seule transaction pour tout le lot.
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(sum(sql.strip().upper() == "BEGIN" for sql in statements), 1)
+        self.assertEqual(sum(sql.strip().upper() == "COMMIT" for sql in statements), 1)
+
+        with sqlite3.connect(self.db_path) as conn:
+            statuts = dict(conn.execute("SELECT id, statut_cnaps FROM dossiers"))
+            history = conn.execute("SELECT dossier_id, statut_cnaps FROM statut_cnaps_history ORDER BY id").fetchall()
+            updated_at = conn.execute(
+                "SELECT updated_at FROM public_requests WHERE id = ?", (self.request_id,)
+            ).fetchone()[0]
+
+        self.assertEqual(set(statuts.values()), {"ACCEPTÉ"})
+        self.assertEqual(history, [(self.instruction_id, "ACCEPTÉ"), (self.transmis_id, "ACCEPTÉ")])
+        self.assertNotEqual(updated_at, "2000-01-01 00:00:00")
+
+    def test_batch_outcomes_share_the_unitary_types(self):
+        # Les deux routes renvoient l'identifiant du dossier tel qu'en base, qu'on leur
+        # passe un dossier_id (entier ou chaîne) ou un request_id.
+        def accept(payload):
+            return self.client.post(
+                "/integrations/gestionstagiaire/cnaps/accept",
+                headers={"Authorization": "Bearer expected-token"},
+                json=payload,
+            ).get_json()
+
+        singles = [
+            accept({"dossier_id": str(self.instruction_id)}),
+            accept({"dossier_id": self.accepted_id}),
+            accept({"request_id": self.request_id}),
+            accept({"request_id": str(self.request_id)}),
+        ]
+        self.assertEqual(
+            [single["dossier_id"] for single in singles],
+            [self.instruction_id, self.accepted_id, self.transmis_id, self.transmis_id],
+        )
+
+        batch = self._post({"items": [
+            {"dossier_id": str(self.instruction_id)},
+            {"dossier_id": self.accepted_id},
+            {"request_id": self.request_id},
+            {"request_id": str(self.request_id)},
+        ]}).get_json()
+        self.assertEqual(
+            [result["dossier_id"] for result in batch["results"]],
+            [single["dossier_id"] for single in singles],
+        )
+        for result, single in zip(batch["results"], singles):
+            self.assertEqual(
+                {key: type(value) for key, value in result.items() if key != "index"},
+                {key: type(value) for key, value in single.items()},
+            )
+
+    def test_batch_rejects_unauthorized_and_invalid_payloads(self):
+        self.assertEqual(self._post({"items": []}, token="bad-token").status_code, 401)
+        self.assertEqual(self._post({"items": {"dossier_id": 1}}).status_code, 400)
+
+        saved_limit = cnaps_app.INTEGRATION_BATCH_MAX_ITEMS
+        cnaps_app.INTEGRATION_BATCH_MAX_ITEMS = 2
+        try:
+            too_many = self._post({"items": [{"dossier_id": self.instruction_id}] * 3})
+        finally:
+            cnaps_app.INTEGRATION_BATCH_MAX_ITEMS = saved_limit
+        self.assertEqual(too_many.status_code, 400)
+
+        empty = self._post({"items": []}).get_json()
+        self.assertEqual((empty["accepted"], empty["results"]), (0, []))
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM statut_cnaps_history").fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -36,13 +36,19 @@ class IntegrationLookupCnapsTests(unittest.TestCase):
     def _auth_headers(self, token="expected-token"):
         return {"Authorization": f"Bearer {token}"}
 
+    def _backfill(self):
+        # Lignes écrites hors de l'application : normalisées par `lookup-norms backfill`.
+        result = cnaps_app.app.test_cli_runner().invoke(args=["lookup-norms", "backfill"])
+        self.assertEqual(result.exit_code, 0, result.output)
+
     def _insert_dossier(self, nom, prenom):
         with sqlite3.connect(self.db_path) as conn:
             cur = conn.execute(
                 "INSERT INTO dossiers (nom, prenom, statut_cnaps) VALUES (?, ?, ?)",
                 (nom, prenom, "INSTRUCTION"),
             )
-            return cur.lastrowid
+        self._backfill()
+        return cur.lastrowid
 
     def _insert_request(self, dossier_id, email):
         with sqlite3.connect(self.db_path) as conn:
@@ -53,7 +59,8 @@ class IntegrationLookupCnapsTests(unittest.TestCase):
                 """,
                 (dossier_id, "Nom", "Prenom", email, "1990-01-01"),
             )
-            return cur.lastrowid
+        self._backfill()
+        return cur.lastrowid
 
     def test_lookup_returns_401_when_token_missing_or_invalid(self):
         payload = {"first_name": "Jean", "last_name": "Dupont"}
@@ -119,6 +126,144 @@ class IntegrationLookupCnapsTests(unittest.TestCase):
             {"request_id": str(request_id), "dossier_id": str(dossier_id)},
         )
 
+    def test_identity_edit_writes_lookup_norms_and_lookups_only_read(self):
+        dossier_id = self._insert_dossier("Martin", "Paul")
+        request_id = self._insert_request(dossier_id, "paul@example.com")
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+        response = self.client.post(f"/a-traiter/{request_id}/identity", json={"field": "nom", "value": "Martin Durand"})
+
+        self.assertEqual(response.status_code, 200)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(
+                conn.execute("SELECT nom_norm, prenom_norm FROM dossiers WHERE id = ?", (dossier_id,)).fetchone(),
+                ("martindurand", "paul"),
+            )
+
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            integration = self.client.post(
+                "/integrations/gestionstagiaire/cnaps/lookup",
+                headers=self._auth_headers(),
+                json={"first_name": "Paul", "last_name": "Martin-Durand"},
+            )
+            public = self.client.get("/lookup_cnaps.json?nom=martin durand&prenom=paul")
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        self.assertEqual(integration.get_json()["dossier_id"], str(dossier_id))
+        self.assertEqual(public.get_json()["id"], dossier_id)
+        writes = [sql for sql in statements if sql.lstrip().upper().startswith(("BEGIN", "UPDATE", "INSERT", "ALTER", "CREATE"))]
+        self.assertEqual(writes, [])
+
+    def test_renames_made_outside_the_app_wait_for_the_backfill(self):
+        dossier_id = self._insert_dossier("Martin", "Paul")
+        payload = {"first_name": "Paul", "last_name": "Martin-Durand"}
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE dossiers SET nom = 'Martin Durand' WHERE id = ?", (dossier_id,))
+
+        # Nom périmé effacé par le trigger : ni l'ancien ni le nouveau nom ne correspondent.
+        self.assertEqual(
+            self.client.post("/integrations/gestionstagiaire/cnaps/lookup", headers=self._auth_headers(), json=payload).status_code,
+            404,
+        )
+        self._backfill()
+
+        response = self.client.post("/integrations/gestionstagiaire/cnaps/lookup", headers=self._auth_headers(), json=payload)
+        self.assertEqual(response.get_json()["dossier_id"], str(dossier_id))
+
+    def test_lookup_cnaps_json_accepts_swapped_names(self):
+        dossier_id = self._insert_dossier("Lefèvre", "Anne-Marie")
+
+        response = self.client.get("/lookup_cnaps.json?nom=anne marie&prenom=LEFEVRE")
+
+        body = response.get_json()
+        self.assertEqual((body["id"], body["statut_cnaps"]), (dossier_id, "INSTRUCTION"))
+
+    def test_batch_lookup_matches_single_lookup_semantics(self):
+        unique_id = self._insert_dossier("Dùpont", "Jean-Pierre")
+        unique_request = self._insert_request(unique_id, "jean@example.com")
+        for email in ("a@example.com", "b@example.com"):
+            self._insert_request(self._insert_dossier("Martin", "Paul"), email)
+
+        identities = [
+            {"first_name": " jean pierre ", "last_name": "du'pont", "email": " JEAN@EXAMPLE.COM "},
+            {"first_name": "Paul", "last_name": "Martin"},
+            {"first_name": "Paul", "last_name": "Martin", "email": "b@example.com"},
+            {"first_name": "Inconnu", "last_name": "Personne"},
+            {"first_name": "", "last_name": "Martin"},
+            {"first_name": "Jean-Pierre", "last_name": "Dupont"},
+        ]
+
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            response = self.client.post(
+                "/integrations/gestionstagiaire/cnaps/lookup/batch",
+                headers=self._auth_headers(),
+                json={"identities": identities},
+            )
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual([result["status"] for result in results], [
+            "MATCH", "AMBIGUOUS", "MATCH", "NOT_FOUND", "INVALID_PAYLOAD", "MATCH",
+        ])
+        self.assertEqual([result["index"] for result in results], list(range(len(identities))))
+        self.assertEqual(results[0]["request_id"], str(unique_request))
+        self.assertEqual(results[1]["count"], 2)
+        self.assertEqual(len([sql for sql in statements if "json_each" in sql]), 1)
+
+        for identity, result in zip(identities, results):
+            if result["status"] == "INVALID_PAYLOAD":
+                continue
+            single = self.client.post(
+                "/integrations/gestionstagiaire/cnaps/lookup",
+                headers=self._auth_headers(),
+                json=identity,
+            )
+            expected = dict(result)
+            del expected["index"], expected["status"]
+            self.assertEqual(single.get_json(), expected)
+
+    def test_batch_lookup_rejects_invalid_payloads(self):
+        url = "/integrations/gestionstagiaire/cnaps/lookup/batch"
+        self.assertEqual(self.client.post(url, json={"identities": []}).status_code, 401)
+        self.assertEqual(
+            self.client.post(url, headers=self._auth_headers(), json={"identities": {}}).status_code,
+            400,
+        )
+
+        original_max = cnaps_app.INTEGRATION_BATCH_MAX_ITEMS
+        cnaps_app.INTEGRATION_BATCH_MAX_ITEMS = 2
+        try:
+            too_many = self.client.post(
+                url,
+                headers=self._auth_headers(),
+                json={"identities": [{"first_name": "A", "last_name": "B"}] * 3},
+            )
+        finally:
+            cnaps_app.INTEGRATION_BATCH_MAX_ITEMS = original_max
+        self.assertEqual(too_many.status_code, 400)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,268 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app as cnaps_app
+
+
+class _FakeBrevoHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        server = self.server
+        with server.lock:
+            versions = payload.get("messageVersions") or [payload]
+            if server.rejected_email and server.rejected_email in [version.get("to", [{}])[0].get("email") for version in versions]:
+                status, response = 400, {"code": "invalid_parameter"}
+            elif server.failures_left:
+                server.failures_left -= 1
+                status, response = server.failure_status, {}
+            else:
+                status = 201
+                server.received.append((self.path, payload))
+                recipients = [version["to"][0]["email"] for version in payload.get("messageVersions", [])]
+                if recipients:
+                    response = {"messageIds": [f"<{email}>" for email in recipients]}
+                else:
+                    response = {"messageId": f"<{len(server.received)}>"}
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OutboxTests(unittest.TestCase):
+    """La file outbox, vidée vers un faux serveur Brevo local."""
+
+    PATCHED_SETTINGS = (
+        "SMTP_HOST",
+        "SMS_WEBHOOK_URL",
+        "BREVO_API_KEY",
+        "BREVO_API_BASE_URL",
+        "BREVO_SENDER_EMAIL",
+        "BREVO_SMS_SENDER",
+        "OUTBOX_MAX_ATTEMPTS",
+        "BREVO_BATCH_SIZE",
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeBrevoHandler)
+        self.server.lock = threading.Lock()
+        self.server.received = []
+        self.server.failures_left = 0
+        self.server.failure_status = 503
+        self.server.rejected_email = None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self._saved_settings = {name: getattr(cnaps_app, name) for name in self.PATCHED_SETTINGS}
+        cnaps_app.SMTP_HOST = ""
+        cnaps_app.SMS_WEBHOOK_URL = ""
+        cnaps_app.BREVO_API_KEY = "test-key"
+        cnaps_app.BREVO_API_BASE_URL = f"http://127.0.0.1:{self.server.server_port}"
+        cnaps_app.BREVO_SENDER_EMAIL = "noreply@example.com"
+        cnaps_app.BREVO_SMS_SENDER = "Integrale"
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        for name, value in self._saved_settings.items():
+            setattr(cnaps_app, name, value)
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def _enqueue(self, count=1, channel="email", subject="Sujet"):
+        with sqlite3.connect(self.db_path) as conn:
+            for index in range(count):
+                if channel == "email":
+                    cnaps_app._enqueue_email(conn, f"user{index}@example.com", subject, f"<p>Bonjour {index}</p>")
+                else:
+                    cnaps_app._enqueue_sms(conn, "0612345678", f"Message {index}")
+
+    def _email_recipients(self):
+        recipients = []
+        for _, payload in self.server.received:
+            for version in payload.get("messageVersions") or [payload]:
+                recipients.append(version["to"][0]["email"])
+        return recipients
+
+    def _outbox_rows(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return conn.execute("SELECT * FROM outbox ORDER BY id").fetchall()
+
+    def test_espace_cnaps_creation_only_enqueues(self):
+        with sqlite3.connect(self.db_path) as conn:
+            request_id = conn.execute(
+                """
+                INSERT INTO public_requests (nom, prenom, email, date_naissance, telephone, formation)
+                VALUES ('Dupont', 'Jean', 'jean@example.com', '01/01/1990', '0612345678', 'APS')
+                """
+            ).lastrowid
+
+        response = self.client.post(f"/a-traiter/{request_id}/espace-cnaps", json={"espace_cnaps": "Créé"})
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.server.received, [])
+        rows = self._outbox_rows()
+        self.assertEqual([(row["channel"], row["status"]) for row in rows], [("email", "pending"), ("sms", "pending")])
+        self.assertEqual({row["request_id"] for row in rows}, {request_id})
+
+        self.assertEqual(cnaps_app.drain_outbox("test-worker"), 2)
+
+        paths = sorted(path for path, _ in self.server.received)
+        self.assertEqual(paths, ["/v3/smtp/email", "/v3/transactionalSMS/sms"])
+        self.assertEqual([row["status"] for row in self._outbox_rows()], ["sent", "sent"])
+
+    def test_transient_failure_is_retried_with_backoff(self):
+        self._enqueue()
+        self.server.failures_left = 1
+
+        cnaps_app.drain_outbox("test-worker")
+
+        row = self._outbox_rows()[0]
+        self.assertEqual(row["status"], "pending")
+        self.assertEqual(row["attempts"], 1)
+        self.assertIn("503", row["last_error"])
+        self.assertGreater(row["next_attempt_at"], cnaps_app.time.time() + cnaps_app.OUTBOX_RETRY_BASE_SECONDS - 5)
+
+        # Rien n'est retenté avant l'échéance du délai exponentiel.
+        self.assertEqual(cnaps_app.drain_outbox("test-worker"), 0)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE outbox SET next_attempt_at = 0")
+        cnaps_app.drain_outbox("test-worker")
+
+        row = self._outbox_rows()[0]
+        self.assertEqual((row["status"], row["attempts"]), ("sent", 2))
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_message_is_dead_lettered_after_max_attempts(self):
+        cnaps_app.OUTBOX_MAX_ATTEMPTS = 2
+        self._enqueue(channel="sms")
+        self.server.failures_left = 10
+        self.server.failure_status = 500
+
+        for _ in range(3):
+            cnaps_app.drain_outbox("test-worker")
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("UPDATE outbox SET next_attempt_at = 0")
+
+        row = self._outbox_rows()[0]
+        self.assertEqual((row["status"], row["attempts"]), ("dead", 2))
+        self.assertEqual(self.server.failures_left, 8)
+
+    def test_stale_claim_is_taken_over(self):
+        self._enqueue()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE outbox SET status = 'sending', locked_by = 'crashed', locked_until = 0, attempts = 1")
+
+        cnaps_app.drain_outbox("test-worker")
+
+        row = self._outbox_rows()[0]
+        self.assertEqual((row["status"], row["attempts"]), ("sent", 2))
+
+    def test_claim_lease_covers_sending_the_whole_batch(self):
+        self._enqueue(count=3)
+        before = cnaps_app.time.time()
+
+        with closing(cnaps_app._connect_db()) as conn:
+            claimed = cnaps_app._claim_outbox_messages(conn, "slow-worker", limit=50)
+            # Un second worker ne reprend rien tant que le lot peut encore être en cours d'envoi.
+            self.assertEqual(cnaps_app._claim_outbox_messages(conn, "other-worker", limit=50), [])
+
+        self.assertEqual(len(claimed), 3)
+        for row in claimed:
+            self.assertGreaterEqual(row["locked_until"], before + 50 * cnaps_app.OUTBOX_SEND_TIMEOUT_SECONDS)
+
+    def test_worker_pool_sends_each_message_once(self):
+        self._enqueue(count=40)
+
+        workers = [
+            threading.Thread(target=cnaps_app.drain_outbox, args=(f"worker-{index}",))
+            for index in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(self._email_recipients()), sorted(f"user{index}@example.com" for index in range(40)))
+        self.assertEqual({row["status"] for row in self._outbox_rows()}, {"sent"})
+
+    def test_emails_sharing_a_template_are_sent_in_batches(self):
+        cnaps_app.BREVO_BATCH_SIZE = 3
+        self._enqueue(count=5, subject="Rappel 4h")
+        self._enqueue(count=2, subject="Rappel 2h")
+
+        self.assertEqual(cnaps_app.drain_outbox("test-worker"), 7)
+
+        # Lots réservés par 3 : [4h x3], [4h x2 + 2h x1], [2h x1].
+        batch_sizes = [len(payload.get("messageVersions") or [payload]) for _, payload in self.server.received]
+        self.assertEqual(sorted(batch_sizes), [1, 1, 2, 3])
+        self.assertEqual(sorted(self._email_recipients()), sorted(
+            [f"user{index}@example.com" for index in range(5)] + [f"user{index}@example.com" for index in range(2)]
+        ))
+        first_batch = self.server.received[0][1]
+        html_by_version = [version.get("htmlContent", first_batch["htmlContent"]) for version in first_batch["messageVersions"]]
+        self.assertEqual(html_by_version, [f"<p>Bonjour {index}</p>" for index in range(3)])
+
+        rows = self._outbox_rows()
+        self.assertEqual({row["status"] for row in rows}, {"sent"})
+        batched = [row for row in rows if row["provider_message_id"] == f"<{row['recipient']}>"]
+        self.assertEqual(len(batched), 5)
+
+    def test_failed_batch_only_fails_its_own_messages(self):
+        cnaps_app.BREVO_BATCH_SIZE = 2
+        self._enqueue(count=4)
+        self.server.failures_left = 1
+
+        cnaps_app.drain_outbox("test-worker")
+
+        statuses = [row["status"] for row in self._outbox_rows()]
+        self.assertEqual(sorted(statuses), ["pending", "pending", "sent", "sent"])
+
+    def test_rejected_batch_is_resent_message_by_message(self):
+        cnaps_app.BREVO_BATCH_SIZE = 3
+        self._enqueue(count=3)
+        self.server.rejected_email = "user1@example.com"
+
+        cnaps_app.drain_outbox("test-worker")
+
+        rows = self._outbox_rows()
+        self.assertEqual([row["status"] for row in rows], ["sent", "pending", "sent"])
+        self.assertIn("status=400", rows[1]["last_error"])
+        self.assertEqual(sorted(self._email_recipients()), ["user0@example.com", "user2@example.com"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+import app as cnaps_app
+
+
+class PdfRenderServiceTests(unittest.TestCase):
+    """Pool de rendu WeasyPrint chauffé : soumission avec délai et banc d'essai."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        self._saved = (cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.PDF_RENDER_WORKERS, cnaps_app.PDF_RENDER_TIMEOUT_SECONDS)
+        cnaps_app.ATTESTATION_CACHE_DIR = os.path.join(self.tmpdir.name, "attestations")
+        cnaps_app.PDF_RENDER_WORKERS = 1
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            self.dossier_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, formation, session) VALUES ('Martin', 'Jean', 'A3P', '12/03/2026')"
+            ).lastrowid
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.PDF_RENDER_WORKERS, cnaps_app.PDF_RENDER_TIMEOUT_SECONDS = self._saved
+        self.tmpdir.cleanup()
+
+    def test_attestation_is_rendered_by_the_pool(self):
+        self.assertNotEqual(cnaps_app._submit_pdf_job(cnaps_app._pdf_worker_ready).result(timeout=30), os.getpid())
+
+        original_html = cnaps_app.HTML
+        cnaps_app.HTML = None
+        try:
+            response = self.client.get(f"/attestation/{self.dossier_id}")
+        finally:
+            cnaps_app.HTML = original_html
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_data().startswith(b"%PDF"))
+
+    def test_pool_created_after_startup_does_not_fork_threads(self):
+        saved_pool = (cnaps_app._pdf_render_executor, cnaps_app._pdf_render_pid)
+        try:
+            pool = cnaps_app._pdf_render_pool(reset=True)
+            self.assertEqual(pool._mp_context.get_start_method(), "forkserver")
+            self.assertNotEqual(cnaps_app._submit_pdf_job(cnaps_app._pdf_worker_ready).result(timeout=60), os.getpid())
+            pool.shutdown()
+
+            # Seul le démarrage du worker, avant ses threads, forke.
+            cnaps_app._pdf_render_pid = None
+            cnaps_app.start_pdf_render_pool()
+            self.assertEqual(cnaps_app._pdf_render_executor._mp_context.get_start_method(), "fork")
+            cnaps_app._pdf_render_executor.shutdown()
+        finally:
+            cnaps_app._pdf_render_executor, cnaps_app._pdf_render_pid = saved_pool
+
+    def test_worker_init_warms_templates_and_keeps_render_options(self):
+        rendered = []
+        original_html = cnaps_app.HTML
+
+        class RecordingHTML:
+            def __init__(self, string=None, base_url=None, **kwargs):
+                self.string = string
+
+            def write_pdf(self, target=None, **kwargs):
+                rendered.append((self.string, sorted(kwargs)))
+                return b"%PDF-1.4"
+
+        cnaps_app.HTML = RecordingHTML
+        try:
+            cnaps_app._pdf_worker_init()
+            cnaps_app._write_pdf("<p>après chauffe</p>")
+        finally:
+            cnaps_app.HTML = original_html
+            cnaps_app._pdf_render_options.clear()
+
+        self.assertEqual(len(rendered), len(cnaps_app.ATTESTATION_TEMPLATES) + 1)
+        self.assertIn("cache", rendered[-1][1])
+        self.assertEqual(rendered[-1][0], "<p>après chauffe</p>")
+
+    def test_slow_render_times_out_with_503(self):
+        pending = Future()
+        original_submit = cnaps_app._submit_pdf_job
+        cnaps_app._submit_pdf_job = lambda *args: pending
+        cnaps_app.PDF_RENDER_TIMEOUT_SECONDS = 0.01
+        try:
+            response = self.client.get(f"/attestation/{self.dossier_id}")
+        finally:
+            cnaps_app._submit_pdf_job = original_submit
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "5")
+
+    def test_benchmark_reports_cold_and_warm_percentiles(self):
+        result = cnaps_app.app.test_cli_runner().invoke(args=["pdf-render-benchmark", "--runs", "3"])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        lines = result.output.strip().splitlines()
+        self.assertEqual([line.split(":")[0] for line in lines], [
+            "attestation_aps.html froid",
+            "attestation_aps.html chaud",
+            "attestation_aps.html chaud (soumission)",
+        ])
+        self.assertTrue(all("p50=" in line and "p95=" in line for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
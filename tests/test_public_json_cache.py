@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import app as cnaps_app
+
+
+class PublicJsonCacheTests(unittest.TestCase):
+    """Cache TTL des JSON publics : invalidation, ETag et recalcul unique."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        self._saved_ttl = cnaps_app.PUBLIC_JSON_CACHE_TTL_SECONDS
+        self._original_read_counters = cnaps_app._read_dashboard_counters
+        cnaps_app.PUBLIC_JSON_CACHE_TTL_SECONDS = 60
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            self.request_id = conn.execute(
+                """
+                INSERT INTO public_requests (nom, prenom, email, date_naissance, telephone, formation)
+                VALUES ('Dupont', 'Jean', 'jean@example.com', '01/01/1990', '0612345678', 'APS')
+                """
+            ).lastrowid
+
+        self.client = cnaps_app.app.test_client()
+        self.stats_before = cnaps_app.public_json_cache_stats()
+
+    def tearDown(self):
+        cnaps_app.PUBLIC_JSON_CACHE_TTL_SECONDS = self._saved_ttl
+        cnaps_app._read_dashboard_counters = self._original_read_counters
+        cnaps_app._invalidate_public_json_cache()
+        self.tmpdir.cleanup()
+
+    def _stats_delta(self):
+        after = cnaps_app.public_json_cache_stats()
+        return {name: after[name] - self.stats_before[name] for name in ("hits", "misses", "coalesced", "not_modified")}
+
+    def _count_counter_reads(self, delay=0.0):
+        calls = []
+
+        def counting_read(conn):
+            calls.append(1)
+            time.sleep(delay)
+            return self._original_read_counters(conn)
+
+        cnaps_app._read_dashboard_counters = counting_read
+        return calls
+
+    def test_second_poll_is_served_from_cache_with_etag(self):
+        calls = self._count_counter_reads()
+
+        first = self.client.get("/data.json")
+        second = self.client.get("/data.json")
+        revalidated = self.client.get("/data.json", headers={"If-None-Match": first.headers["ETag"]})
+
+        self.assertEqual((first.headers["X-Cache"], second.headers["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(first.get_json(), second.get_json())
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+        self.assertTrue(first.headers["Cache-Control"].startswith("public, max-age="))
+        self.assertEqual(first.headers["Access-Control-Allow-Origin"], "*")
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self._stats_delta(), {"hits": 2, "misses": 1, "coalesced": 0, "not_modified": 1})
+
+    def test_mutating_route_invalidates_cache(self):
+        before = self.client.get("/data.json").get_json()
+        self.assertEqual(before["comptes_cnaps_a_creer"], 1)
+
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+        response = self.client.post(f"/a-traiter/{self.request_id}/espace-cnaps", json={"espace_cnaps": "Créé"})
+        self.assertEqual(response.status_code, 204)
+
+        after = self.client.get("/data.json")
+        self.assertEqual(after.headers["X-Cache"], "MISS")
+        self.assertEqual(after.get_json()["comptes_cnaps_a_creer"], 0)
+        notifications = self.client.get("/notifications_espace_cnaps_a_valider.json").get_json()
+        self.assertEqual(notifications["count"], 1)
+
+    def test_write_from_another_worker_invalidates_cache(self):
+        self.assertEqual(self.client.get("/data.json").get_json()["comptes_cnaps_a_creer"], 1)
+
+        # Autre worker gunicorn : son cache local est hors d'atteinte, seule la base est partagée.
+        other_worker = cnaps_app._connect_db()
+        try:
+            with other_worker:
+                other_worker.execute("UPDATE public_requests SET espace_cnaps = 'Créé' WHERE id = ?", (self.request_id,))
+            cnaps_app._publish_public_json_invalidation(other_worker)
+        finally:
+            other_worker.close()
+
+        after = self.client.get("/data.json")
+        self.assertEqual(after.headers["X-Cache"], "MISS")
+        self.assertEqual(after.get_json()["comptes_cnaps_a_creer"], 0)
+        self.assertEqual(self.client.get("/data.json").headers["X-Cache"], "HIT")
+
+    def test_expired_entry_is_recomputed(self):
+        cnaps_app.PUBLIC_JSON_CACHE_TTL_SECONDS = 0.05
+        self.client.get("/summary.json")
+        time.sleep(0.1)
+
+        self.assertEqual(self.client.get("/summary.json").headers["X-Cache"], "MISS")
+
+    def test_concurrent_pollers_share_one_computation(self):
+        calls = self._count_counter_reads(delay=0.2)
+        results = []
+
+        def poll():
+            response = cnaps_app.app.test_client().get("/data.json")
+            results.append((response.headers["X-Cache"], response.get_json()["comptes_cnaps_a_creer"]))
+
+        pollers = [threading.Thread(target=poll) for _ in range(6)]
+        for poller in pollers:
+            poller.start()
+        for poller in pollers:
+            poller.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(status for status, _ in results), ["COALESCED"] * 5 + ["MISS"])
+        self.assertEqual({value for _, value in results}, {1})
+
+    def test_result_computed_across_an_invalidation_is_not_cached(self):
+        original_read = self._original_read_counters
+
+        def read_then_write(conn):
+            counters = original_read(conn)
+            # Écriture committée pendant le calcul, par une autre requête.
+            cnaps_app._invalidate_public_json_cache()
+            return counters
+
+        cnaps_app._read_dashboard_counters = read_then_write
+        self.client.get("/data.json")
+        cnaps_app._read_dashboard_counters = original_read
+
+        self.assertEqual(self.client.get("/data.json").headers["X-Cache"], "MISS")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import re
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)")
+
+
+class QueryPlanTests(unittest.TestCase):
+    """Garde-fou : les requêtes chaudes ne doivent pas retomber en SCAN complet."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _full_scans(self, sql, params=(), allowed=()):
+        plan = self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        scans = []
+        for row in plan:
+            match = FULL_SCAN_RE.match(row["detail"])
+            if match and match.group(1) not in allowed:
+                scans.append(row["detail"])
+        return scans
+
+    def _traced_statements(self, func):
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        try:
+            func(self.conn)
+        finally:
+            self.conn.set_trace_callback(None)
+        return [sql for sql in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+
+    def test_a_traiter_dataset_only_scans_driving_table(self):
+        statements = self._traced_statements(cnaps_app._load_a_traiter_dataset)
+        statements += self._traced_statements(cnaps_app._compute_demandes_a_faire)
+        statements += self._traced_statements(cnaps_app._compute_dashboard_counters)
+
+        self.assertTrue(statements)
+        for sql in statements:
+            # r : agrégat d'une ligne calculé par la sous-requête des compteurs.
+            self.assertEqual(self._full_scans(sql, allowed=("pr", "page", "r")), [], sql)
+
+    def test_lookup_queries_use_indexes(self):
+        queries = {
+            "request_documents": (
+                "SELECT * FROM request_documents WHERE request_id = ? AND is_active = 1 ORDER BY doc_type, id DESC",
+                (1,),
+            ),
+            "notify_non_conformities": (
+                """
+                SELECT * FROM request_documents
+                WHERE request_id = ? AND is_active = 1 AND review_status = 'non_conforme'
+                """,
+                (1,),
+            ),
+            "documents_a_controler": (
+                "SELECT COUNT(DISTINCT rd.request_id) FROM request_documents rd WHERE rd.is_active = 1 AND rd.is_conforme IS NULL",
+                (),
+            ),
+            "validate_espace_cnaps": (
+                "SELECT id, prenom, espace_cnaps FROM public_requests WHERE espace_cnaps_validation_token = ?",
+                ("token",),
+            ),
+            "update_statut_cnaps": (
+                """
+                SELECT d.*, pr.email AS request_email
+                FROM dossiers d
+                LEFT JOIN public_requests pr ON pr.dossier_id = d.id
+                WHERE d.id = ?
+                ORDER BY pr.id DESC
+                LIMIT 1
+                """,
+                (1,),
+            ),
+            "statut_cnaps_history": (
+                "DELETE FROM statut_cnaps_history WHERE dossier_id = ?",
+                (1,),
+            ),
+            "instruction": (
+                "SELECT COUNT(*) FROM dossiers WHERE statut_cnaps = 'INSTRUCTION'",
+                (),
+            ),
+            "notifications_espace_cnaps_a_valider": (
+                f"""
+                SELECT pr.id FROM public_requests pr
+                LEFT JOIN dossiers d ON d.id = pr.dossier_id
+                WHERE {cnaps_app._espace_cnaps_notification_expr()} = 'cree'
+                  AND LOWER(TRIM(REPLACE(REPLACE(COALESCE(d.statut_cnaps, ''), 'é', 'e'), 'É', 'E'))) != 'valide'
+                ORDER BY pr.id DESC
+                """,
+                (),
+            ),
+        }
+
+        for name, (sql, params) in queries.items():
+            with self.subTest(query=name):
+                self.assertEqual(self._full_scans(sql, params), [])
+
+        statements = self._traced_statements(lambda conn: cnaps_app._get_statuts_dates(conn, 1))
+        statements += self._traced_statements(
+            lambda conn: cnaps_app._find_dossiers_by_identity(conn, "dupont", "jean", "jean@example.com")
+        )
+        statements += self._traced_statements(cnaps_app._backfill_lookup_norms)
+        for sql in statements:
+            self.assertEqual(self._full_scans(sql), [], sql)
+
+    def test_validation_token_is_unique(self):
+        self.conn.execute(
+            """
+            INSERT INTO public_requests (nom, prenom, email, date_naissance, espace_cnaps_validation_token)
+            VALUES ('A', 'B', 'a@example.com', '1990-01-01', 'same-token')
+            """
+        )
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.conn.execute(
+                """
+                INSERT INTO public_requests (nom, prenom, email, date_naissance, espace_cnaps_validation_token)
+                VALUES ('C', 'D', 'c@example.com', '1990-01-01', 'same-token')
+                """
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
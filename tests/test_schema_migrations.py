@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class SchemaMigrationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        cnaps_app.DB_NAME = self.db_path
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _applied_versions(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+    def test_migrations_are_recorded_once(self):
+        cnaps_app.init_db()
+        cnaps_app.init_db()
+
+        expected = [version for version, _ in cnaps_app.SCHEMA_MIGRATIONS]
+        self.assertEqual(self._applied_versions(), expected)
+
+    def test_second_boot_skips_backfills(self):
+        cnaps_app.init_db()
+
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            cnaps_app.init_db()
+        finally:
+            cnaps_app._connect_db = original_connect
+
+        writes = [sql for sql in statements if sql.lstrip().upper().startswith(("UPDATE", "INSERT", "ALTER", "BEGIN"))]
+        self.assertEqual(writes, [])
+
+    def test_legacy_database_is_migrated(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE public_requests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dossier_id INTEGER,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    date_naissance TEXT NOT NULL,
+                    heberge INTEGER NOT NULL DEFAULT 0,
+                    non_francais INTEGER NOT NULL DEFAULT 0,
+                    formation TEXT,
+                    session_date TEXT,
+                    created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+                    updated_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+                )
+                """
+            )
+            conn.execute(
+                "INSERT INTO public_requests (nom, prenom, email, date_naissance) VALUES (?, ?, ?, ?)",
+                ("Dupont", "Jean", "jean@example.com", "1990-01-01"),
+            )
+
+        cnaps_app.init_db()
+
+        with sqlite3.connect(self.db_path) as conn:
+            espace_cnaps, token = conn.execute(
+                "SELECT espace_cnaps, espace_cnaps_validation_token FROM public_requests"
+            ).fetchone()
+            sessions_count = conn.execute("SELECT COUNT(*) FROM formation_sessions").fetchone()[0]
+
+        self.assertEqual(espace_cnaps, "A créer")
+        self.assertTrue(token)
+        self.assertGreater(sessions_count, 0)
+
+    def test_schema_cache_is_filled_after_migrations_and_skips_pragma(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE dossiers (id INTEGER PRIMARY KEY, nom TEXT, prenom TEXT, telephone TEXT)")
+        cnaps_app.init_db()
+
+        statements = []
+        with sqlite3.connect(self.db_path) as conn:
+            conn.set_trace_callback(statements.append)
+            self.assertTrue(cnaps_app._table_has_column(conn, "public_requests", "telephone"))
+            cnaps_app._request_phone_select_expr(conn)
+
+        self.assertEqual([sql for sql in statements if "PRAGMA" in sql.upper()], [])
+
+    def test_init_db_invalidates_schema_cache(self):
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("ALTER TABLE public_requests ADD COLUMN action_cnaps TEXT")
+            self.assertFalse(cnaps_app._table_has_column(conn, "public_requests", "action_cnaps"))
+
+        cnaps_app.init_db()
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertTrue(cnaps_app._table_has_column(conn, "public_requests", "action_cnaps"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app as cnaps_app
+
+
+class SearchIndexTests(unittest.TestCase):
+    """Recherche plein texte FTS5 sur dossiers et demandes."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+
+        self._saved_api_token = cnaps_app.CNAPSV3_API_TOKEN
+        cnaps_app.CNAPSV3_API_TOKEN = "api-token"
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+            # Ligne antérieure à la migration : elle doit être indexée par le rebuild initial.
+            conn.execute(
+                "INSERT INTO dossiers (nom, prenom, formation, statut_cnaps) VALUES ('Lefèvre', 'Élodie', 'APS', 'INSTRUCTION')"
+            )
+        cnaps_app.init_db()
+
+        with sqlite3.connect(self.db_path) as conn:
+            self.dossier_id = conn.execute(
+                "INSERT INTO dossiers (nom, prenom, formation, commentaire) VALUES ('Martin', 'Jean-Pierre', 'A3P', 'NUB-4242')"
+            ).lastrowid
+            self.request_id = conn.execute(
+                """
+                INSERT INTO public_requests (dossier_id, nom, prenom, email, date_naissance, telephone, formation)
+                VALUES (?, 'Martin', 'Jean-Pierre', 'jp.martin@example.com', '01/01/1990', '06 12 34 56 78', 'A3P')
+                """,
+                (self.dossier_id,),
+            ).lastrowid
+            conn.execute(
+                """
+                INSERT INTO public_requests (nom, prenom, email, date_naissance, formation)
+                VALUES ('Durand', 'Paul', 'martine.durand@example.com', '01/01/1990', 'APS')
+                """
+            )
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        cnaps_app.CNAPSV3_API_TOKEN = self._saved_api_token
+        self.tmpdir.cleanup()
+
+    def _search(self, query, **params):
+        response = self.client.get("/search.json", query_string={"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row["type"], row["nom"]) for row in response.get_json()["results"]]
+
+    def _index_snapshot(self, conn):
+        return conn.execute("SELECT rowid, * FROM search_index ORDER BY rowid").fetchall()
+
+    def test_prefix_and_accent_insensitive_matching(self):
+        self.assertEqual(self._search("elo LEFE"), [("dossier", "Lefèvre")])
+        self.assertEqual(self._search("lefevre élodie"), [("dossier", "Lefèvre")])
+        # Termes collés comme _normalize : "jean-pierre" -> "jeanpierre", téléphone sans espaces.
+        self.assertEqual(len(self._search("jeanpierre")), 2)
+        self.assertEqual(self._search("0612345", type="request"), [("request", "Martin")])
+        self.assertEqual(self._search("nub4242 martin", type="request"), [("request", "Martin")])
+        self.assertEqual(self._search("  -- "), [])
+
+    def test_results_are_ranked_and_linked(self):
+        response = self.client.get("/search.json", query_string={"q": "martin"}).get_json()
+
+        # Le nom pèse plus que l'email ("martine.durand@…").
+        self.assertEqual([row["nom"] for row in response["results"]][-1], "Durand")
+        request_hit = next(row for row in response["results"] if row["type"] == "request" and row["nom"] == "Martin")
+        self.assertEqual((request_hit["id"], request_hit["dossier_id"]), (self.request_id, self.dossier_id))
+        self.assertEqual(request_hit["nub"], "NUB-4242")
+
+        bad = self.client.get("/search.json", query_string={"q": "martin", "type": "autre"})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_triggers_keep_the_index_in_sync(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE public_requests SET nom = 'Bernard' WHERE id = ?", (self.request_id,))
+            conn.execute("UPDATE dossiers SET commentaire = 'NUB-777' WHERE id = ?", (self.dossier_id,))
+            conn.execute("DELETE FROM dossiers WHERE nom = 'Lefèvre'")
+            conn.execute("DELETE FROM public_requests WHERE nom = 'Durand'")
+            snapshot = self._index_snapshot(conn)
+            cnaps_app._rebuild_search_index(conn)
+            self.assertEqual(self._index_snapshot(conn), snapshot)
+
+        self.assertEqual(self._search("bernard"), [("request", "Bernard")])
+        self.assertEqual(self._search("nub777", type="request"), [("request", "Bernard")])
+        self.assertEqual(self._search("nub4242"), [])
+        self.assertEqual(self._search("lefevre"), [])
+        self.assertEqual(self._search("durand"), [])
+
+    def test_api_a_traiter_filters_on_q(self):
+        response = self.client.get(
+            "/api/a-traiter",
+            query_string={"q": "jean pier"},
+            headers={"Authorization": "Bearer api-token"},
+        )
+
+        body = response.get_json()
+        self.assertEqual(body["total"], 1)
+        self.assertEqual([row["id"] for row in body["requests"]], [self.request_id])
+
+    def test_searches_only_read_and_startup_indexes_a_late_dossiers_table(self):
+        # Base dont la table historique dossiers est créée après la migration.
+        db_path = os.path.join(self.tmpdir.name, "late.db")
+        cnaps_app.DB_NAME = db_path
+        cnaps_app.init_db()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+            conn.execute("INSERT INTO dossiers (nom, prenom) VALUES ('Lefèvre', 'Élodie')")
+        cnaps_app._invalidate_schema_cache()
+
+        statements = []
+        original_connect = cnaps_app._connect_db
+
+        def traced_connect():
+            conn = original_connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        cnaps_app._connect_db = traced_connect
+        try:
+            self.assertEqual(self._search("lefevre"), [])
+            for path in ("/", "/a-traiter/rows.json"):
+                self.assertEqual(self.client.get(path, query_string={"q": "lefevre"}).status_code, 200)
+        finally:
+            cnaps_app._connect_db = original_connect
+        writes = [sql for sql in statements if sql.lstrip().upper().startswith(("BEGIN", "INSERT", "DELETE", "CREATE", "DROP"))]
+        self.assertEqual(writes, [])
+
+        cnaps_app.init_db()
+        self.assertEqual(self._search("lefevre"), [("dossier", "Lefèvre")])
+
+    def test_match_uses_the_fts_index(self):
+        with sqlite3.connect(self.db_path) as conn:
+            plan = " ".join(
+                row[3] for row in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT rowid FROM search_index WHERE search_index MATCH ? ORDER BY rank",
+                    (cnaps_app._search_match_expression("martin"),),
+                )
+            )
+        self.assertIn("VIRTUAL TABLE INDEX", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
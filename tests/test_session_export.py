@@ -0,0 +1,176 @@
+import csv
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import Future
+from unittest import mock
+
+import app as cnaps_app
+
+
+class SessionExportTests(unittest.TestCase):
+    """Export groupé d'une session : un dossier par stagiaire, par parties avec reprise."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+        self.upload_dir = os.path.join(self.tmpdir.name, "uploads")
+
+        cnaps_app.app.config["TESTING"] = True
+        cnaps_app.DB_NAME = self.db_path
+        self._saved = (
+            cnaps_app.UPLOAD_DIR, cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.PDF_RENDER_WORKERS,
+            cnaps_app.SESSION_EXPORT_BATCH_SIZE, cnaps_app.PDF_RENDER_TIMEOUT_SECONDS,
+        )
+        cnaps_app.UPLOAD_DIR = self.upload_dir
+        cnaps_app.ATTESTATION_CACHE_DIR = os.path.join(self.tmpdir.name, "attestations")
+        cnaps_app.PDF_RENDER_WORKERS = 1
+        cnaps_app.SESSION_EXPORT_BATCH_SIZE = 2
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dossiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nom TEXT NOT NULL,
+                    prenom TEXT NOT NULL,
+                    formation TEXT,
+                    session TEXT,
+                    statut_cnaps TEXT,
+                    commentaire TEXT
+                )
+                """
+            )
+        cnaps_app.init_db()
+
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.request_ids = []
+        with sqlite3.connect(self.db_path) as conn:
+            trainees = [("Martin", "Jean", "12/03/2026", 1), ("Durand", "Léa", "12/03/2026", 0),
+                        ("Petit", "Marc", "04/05/2026", 1), ("Bernard", "Zoé", "12/03/2026", 1)]
+            for nom, prenom, session_date, conforme in trainees:
+                dossier_id = conn.execute(
+                    "INSERT INTO dossiers (nom, prenom, formation, session) VALUES (?, ?, 'APS', ?)",
+                    (nom, prenom, session_date),
+                ).lastrowid
+                request_id = conn.execute(
+                    """
+                    INSERT INTO public_requests (dossier_id, nom, prenom, email, date_naissance, formation, session_date)
+                    VALUES (?, ?, ?, 'stagiaire@example.com', '01/01/1990', 'APS', ?)
+                    """,
+                    (dossier_id, nom, prenom, session_date),
+                ).lastrowid
+                name = f"identite_{request_id}.pdf"
+                with open(os.path.join(self.upload_dir, name), "wb") as handle:
+                    handle.write(f"piece {nom}".encode("utf-8"))
+                conn.execute(
+                    """
+                    INSERT INTO request_documents
+                        (request_id, doc_type, original_name, stored_name, storage_path, is_active, is_conforme)
+                    VALUES (?, 'identity', ?, ?, ?, 1, ?)
+                    """,
+                    (request_id, name, name, name, conforme),
+                )
+                self.request_ids.append(request_id)
+
+        self.client = cnaps_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user"] = "admin@example.com"
+
+    def tearDown(self):
+        (
+            cnaps_app.UPLOAD_DIR, cnaps_app.ATTESTATION_CACHE_DIR, cnaps_app.PDF_RENDER_WORKERS,
+            cnaps_app.SESSION_EXPORT_BATCH_SIZE, cnaps_app.PDF_RENDER_TIMEOUT_SECONDS,
+        ) = self._saved
+        self.tmpdir.cleanup()
+
+    def _export(self, **params):
+        response = self.client.get("/a-traiter/export", query_string=params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+        self.assertIsNone(archive.testzip())
+        manifest = list(csv.DictReader(io.StringIO(archive.read("manifeste.csv").decode("utf-8"))))
+        return response, archive, manifest
+
+    def test_session_is_exported_in_resumable_parts(self):
+        martin, durand, _petit, bernard = self.request_ids
+
+        first, archive, manifest = self._export(formation="APS", session_date="12/03/2026")
+        self.assertEqual((first.headers["X-Export-Total"], first.headers["X-Export-Done"]), ("3", "2"))
+        self.assertIn("export_cnaps_APS_12-03-2026_partie1.zip", first.headers["Content-Disposition"])
+        self.assertEqual([int(row["request_id"]) for row in manifest], [martin, durand])
+        self.assertEqual(manifest[0]["statut"], "exporté")
+        self.assertIn("conformes", manifest[1]["statut"])
+        self.assertEqual(archive.namelist()[:2], ["manifeste.csv", "reprise.txt"])
+        self.assertEqual(
+            sorted(archive.namelist()[2:]),
+            [
+                f"Jean_Martin_{martin}/01_Pièce_d'identité_(recto-verso)_ou_passeport_Jean_Martin.pdf",
+                f"Jean_Martin_{martin}/attestation_preinscription_Jean_Martin.pdf",
+            ],
+        )
+        self.assertTrue(archive.read(f"Jean_Martin_{martin}/attestation_preinscription_Jean_Martin.pdf").startswith(b"%PDF"))
+
+        resume = first.headers["X-Export-Resume-Token"]
+        self.assertIn(resume, archive.read("reprise.txt").decode("utf-8"))
+        last, archive, manifest = self._export(formation="APS", session_date="12/03/2026", resume=resume)
+        self.assertEqual((last.headers["X-Export-Total"], last.headers["X-Export-Done"]), ("3", "3"))
+        self.assertNotIn("X-Export-Resume-Token", last.headers)
+        self.assertIn("partie2", last.headers["Content-Disposition"])
+        self.assertEqual([int(row["request_id"]) for row in manifest], [bernard])
+        self.assertNotIn("reprise.txt", archive.namelist())
+
+    def test_explicit_request_ids_report_unknown_ones(self):
+        martin, _durand, petit, _bernard = self.request_ids
+
+        response, archive, manifest = self._export(request_id=[petit, 9999, martin][::-1])
+
+        self.assertEqual(response.headers["X-Export-Total"], "3")
+        self.assertEqual([int(row["request_id"]) for row in manifest], [martin, petit])
+        resume = response.headers["X-Export-Resume-Token"]
+        _response, _archive, manifest = self._export(request_id=[martin, petit, 9999], resume=resume)
+        self.assertEqual(manifest, [{"request_id": "9999", "nom": "", "prenom": "", "dossier": "", "statut": "Demande introuvable"}])
+
+        # Un jeton ne vaut que pour la sélection qui l'a produit.
+        mismatch = self.client.get("/a-traiter/export", query_string={"request_id": martin, "resume": resume})
+        self.assertEqual(mismatch.status_code, 400)
+
+    def test_attestation_failures_are_reported_in_the_manifest(self):
+        martin, _durand, _petit, bernard = self.request_ids
+        cnaps_app.SESSION_EXPORT_BATCH_SIZE = 10
+        cnaps_app.PDF_RENDER_TIMEOUT_SECONDS = 0.01
+        failed, pending = Future(), Future()
+        failed.set_exception(RuntimeError("weasyprint"))
+        submitted = []
+
+        def submit(template_name, html):
+            submitted.append(template_name)
+            return [failed, pending][len(submitted) - 1]
+
+        with mock.patch.object(cnaps_app, "_submit_attestation_render", side_effect=submit):
+            response, archive, manifest = self._export(formation="APS", session_date="12/03/2026")
+
+        # Les deux rendus de la partie sont demandés avant toute attente.
+        self.assertEqual(len(submitted), 2)
+        statuts = {int(row["request_id"]): row["statut"] for row in manifest}
+        self.assertEqual(statuts[martin], "exporté sans attestation : échec de génération")
+        self.assertIn("génération en cours", statuts[bernard])
+        self.assertEqual(response.headers["X-Export-Done"], "3")
+        self.assertIn(f"Zoé_Bernard_{bernard}/01_Pièce_d'identité_(recto-verso)_ou_passeport_Zoé_Bernard.pdf", archive.namelist())
+        self.assertFalse([name for name in archive.namelist() if "attestation_preinscription" in name])
+
+    def test_invalid_selections_are_rejected(self):
+        self.assertEqual(self.client.get("/a-traiter/export").status_code, 400)
+        self.assertEqual(self.client.get("/a-traiter/export?formation=APS").status_code, 400)
+        self.assertEqual(self.client.get("/a-traiter/export?request_id=abc").status_code, 400)
+        self.assertEqual(
+            self.client.get("/a-traiter/export?formation=APS&session_date=12/03/2026&resume=pas-un-jeton").status_code, 400,
+        )
+        self.assertEqual(self.client.get("/a-traiter/export?formation=APS&session_date=01/01/2030").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import json
+import smtplib
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app as cnaps_app
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.received.append((self.path, json.loads(body)))
+        self.server.client_ports.add(self.client_address[1])
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+        if self.server.close_after_response:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakeSMTP:
+    instances = []
+    fail_next_send = False
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.noops = 0
+        _FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        self.noops += 1
+        return (250, b"OK")
+
+    def send_message(self, msg):
+        if _FakeSMTP.fail_next_send:
+            _FakeSMTP.fail_next_send = False
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TransportPoolTests(unittest.TestCase):
+    PATCHED_SETTINGS = (
+        "SMTP_HOST",
+        "SMTP_USER",
+        "SMTP_PASSWORD",
+        "SMS_WEBHOOK_URL",
+        "BREVO_API_KEY",
+        "BREVO_API_BASE_URL",
+        "BREVO_SMS_SENDER",
+        "SMTP_IDLE_CHECK_SECONDS",
+    )
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        self.server.received = []
+        self.server.client_ports = set()
+        self.server.close_after_response = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self._saved_settings = {name: getattr(cnaps_app, name) for name in self.PATCHED_SETTINGS}
+        self._original_smtp = cnaps_app.smtplib.SMTP
+        cnaps_app.SMTP_HOST = ""
+        cnaps_app.SMS_WEBHOOK_URL = ""
+        cnaps_app.BREVO_API_KEY = "test-key"
+        cnaps_app.BREVO_API_BASE_URL = f"http://127.0.0.1:{self.server.server_port}"
+        cnaps_app.BREVO_SMS_SENDER = "Integrale"
+        cnaps_app.close_transport_pools()
+        self.stats_before = cnaps_app.transport_stats()
+
+    def tearDown(self):
+        cnaps_app.close_transport_pools()
+        cnaps_app.smtplib.SMTP = self._original_smtp
+        for name, value in self._saved_settings.items():
+            setattr(cnaps_app, name, value)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _stats_delta(self):
+        after = cnaps_app.transport_stats()
+        return {name: after[name] - self.stats_before[name] for name in after}
+
+    def _use_fake_smtp(self):
+        _FakeSMTP.instances = []
+        _FakeSMTP.fail_next_send = False
+        cnaps_app.smtplib.SMTP = _FakeSMTP
+        cnaps_app.SMTP_HOST = "smtp.example.com"
+        cnaps_app.SMTP_USER = "user"
+        cnaps_app.SMTP_PASSWORD = "secret"
+
+    def test_sms_burst_reuses_one_http_connection(self):
+        for index in range(5):
+            cnaps_app._send_sms("0612345678", f"Message {index}")
+
+        self.assertEqual(len(self.server.received), 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+        delta = self._stats_delta()
+        self.assertEqual((delta["http_handshakes"], delta["http_reuses"]), (1, 4))
+
+    def test_connection_closed_by_server_is_reopened(self):
+        cnaps_app._send_sms("0612345678", "Premier")
+        self.server.close_after_response = True
+        cnaps_app._send_sms("0612345678", "Deuxième")
+        cnaps_app._send_sms("0612345678", "Troisième")
+
+        self.assertEqual([payload["content"] for _, payload in self.server.received], ["Premier", "Deuxième", "Troisième"])
+
+    def test_smtp_session_is_kept_open_between_emails(self):
+        self._use_fake_smtp()
+
+        for index in range(3):
+            cnaps_app._send_email_html(f"user{index}@example.com", "Sujet", "<p>Bonjour</p>")
+
+        self.assertEqual(len(_FakeSMTP.instances), 1)
+        self.assertEqual(_FakeSMTP.instances[0].sent, [f"user{index}@example.com" for index in range(3)])
+        delta = self._stats_delta()
+        self.assertEqual((delta["smtp_handshakes"], delta["smtp_reuses"]), (1, 2))
+
+    def test_stale_smtp_session_reconnects(self):
+        self._use_fake_smtp()
+        cnaps_app._send_email_html("first@example.com", "Sujet", "<p>Bonjour</p>")
+
+        _FakeSMTP.fail_next_send = True
+        cnaps_app._send_email_html("second@example.com", "Sujet", "<p>Bonjour</p>")
+
+        self.assertEqual(len(_FakeSMTP.instances), 2)
+        self.assertEqual(_FakeSMTP.instances[1].sent, ["second@example.com"])
+
+    def test_idle_smtp_session_is_probed_with_noop(self):
+        self._use_fake_smtp()
+        cnaps_app.SMTP_IDLE_CHECK_SECONDS = 0
+        cnaps_app._send_email_html("first@example.com", "Sujet", "<p>Bonjour</p>")
+        cnaps_app._send_email_html("second@example.com", "Sujet", "<p>Bonjour</p>")
+
+        self.assertEqual(len(_FakeSMTP.instances), 1)
+        self.assertEqual(_FakeSMTP.instances[0].noops, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()